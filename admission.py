@@ -0,0 +1,164 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Caps how many answer pipelines run at once; excess requests wait in a bounded queue and are
+# shed (429) when the queue is full or they waited too long, instead of all timing out together
+class AdmissionController:
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 64, queue_timeout: float = 10):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self):
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Too many requests in progress", retry_after=self.queue_timeout)
+        self.queued += 1
+        try:
+            # Acquired in this task, not one wrapped by wait_for: a timeout or cancellation racing a granted
+            # permit is then handled by Semaphore.acquire, which hands the permit on instead of leaking it
+            async with asyncio.timeout(self.queue_timeout):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"No capacity within {self.queue_timeout}s", retry_after=self.queue_timeout)
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+# One pipeline run whose events are replayed to every subscriber, including ones that join late.
+# The run is cancelled only when its last subscriber goes away.
+class _Broadcast:
+    def __init__(self, events, on_done):
+        self.events = []
+        self.finished = False
+        self.subscribers = 0
+        self._updated = asyncio.Event()
+        self._on_done = on_done
+        self.task = asyncio.create_task(self._run(events))
+        # A done callback, not a finally: a task cancelled before its first step never runs its body
+        self.task.add_done_callback(self._finish)
+
+    async def _run(self, events):
+        try:
+            async for event in events:
+                self.events.append(event)
+                self._notify()
+        finally:
+            # Runs the pipeline's own cleanup (follow-up cancellation, tracing) on cancel too
+            await events.aclose()
+
+    def _finish(self, task):
+        self.finished = True
+        self._notify()
+        self._on_done()
+
+    def _notify(self):
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    def subscribe(self):
+        # Counted immediately so a subscriber leaving cannot cancel a run another one is about to read
+        self.subscribers += 1
+        return _Subscription(self)
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.finished:
+            logger.info("Last subscriber left, cancelling the shared pipeline run")
+            self.task.cancel()
+
+    async def _read(self):
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await self._updated.wait()
+
+
+# One subscriber's view of a broadcast. aclose() unsubscribes even if iteration never started
+# (an async generator's finally would not run then), and only once.
+class _Subscription:
+    def __init__(self, broadcast):
+        self._broadcast = broadcast
+        self._reader = broadcast._read()
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        return await self._reader.__anext__()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._reader.aclose()
+        finally:
+            self._broadcast._unsubscribe()
+
+
+# Identical questions that arrive while one is already being answered share its pipeline run
+class RequestCoalescer:
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def join(self, key):
+        broadcast = self._inflight.get(key)
+        if broadcast is None:
+            return None
+        self.coalesced += 1
+        return broadcast.subscribe()
+
+    def start(self, key, events, on_done=None):
+        def done():
+            self._inflight.pop(key, None)
+            if on_done is not None:
+                on_done()
+
+        broadcast = _Broadcast(events, done)
+        self._inflight[key] = broadcast
+        self.started += 1
+        return broadcast.subscribe()
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
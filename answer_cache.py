@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# The collection version is a small file the ingestion script rewrites after every run,
+# so cached answers never outlive the documents they were generated from
+def read_collection_version(path: str) -> str:
+    try:
+        with open(path, 'r') as file:
+            return file.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_collection_version(path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    version = str(time.time_ns())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        file.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+# Answers keyed by query embedding; a lookup hits when the nearest cached query is within
+# the cosine threshold. Brute-force search over a preallocated float32 matrix is plenty
+# for a few thousand entries and keeps the cache dependency-free beyond NumPy.
+class SemanticAnswerCache:
+    def __init__(self, maxsize: int = 500, threshold: float = 0.95, ttl: float = 0, version_path: str = None):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version_path = version_path
+        self._vectors = None
+        self._entries = [None] * maxsize
+        self._last_used = np.zeros(maxsize, dtype=np.float64)
+        self._valid = np.zeros(maxsize, dtype=bool)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def collection_version(self) -> str:
+        if not self.version_path:
+            return "0"
+        try:
+            mtime = os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._version_mtime or self._version is None:
+            self._version = read_collection_version(self.version_path)
+            self._version_mtime = mtime
+        return self._version
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_vector):
+        vector = self._normalize(query_vector)
+        version = self.collection_version()
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or not self._valid.any() or self._vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+            scores = self._vectors @ vector
+            scores[~self._valid] = -np.inf
+            # Every entry above the threshold, best first: a stale nearest entry must not hide a fresh one behind it
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                slot = int(slot)
+                entry = self._entries[slot]
+                if entry["version"] != version or (self.ttl and now - entry["created_at"] > self.ttl):
+                    self._valid[slot] = False
+                    self._entries[slot] = None
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                logger.info(f"Answer cache hit (similarity {scores[slot]:.4f}) for cached query: {entry['query']}")
+                return entry
+            self.misses += 1
+            return None
+
+    def store(self, query: str, query_vector, answer: str, sources: str, follow_up_questions):
+        vector = self._normalize(query_vector)
+        entry = {
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            "follow_up_questions": list(follow_up_questions),
+            "version": self.collection_version(),
+            "created_at": time.time(),
+        }
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+                self._valid[:] = False
+                self._entries = [None] * self.maxsize
+            free = np.flatnonzero(~self._valid)
+            if len(free):
+                slot = int(free[0])
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._entries[slot] = entry
+            self._valid[slot] = True
+            self._last_used[slot] = entry["created_at"]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": int(self._valid.sum()),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,18 +1,43 @@
-from flask import Flask, render_template, request, jsonify,send_from_directory,current_app,send_file
+import time
+_import_started = time.perf_counter()
+
+from quart import Quart, render_template, request, jsonify, send_file, Response
 from dotenv import load_dotenv
 import os
+import json
 import asyncio
-from functools import wraps
+import hmac
+import importlib
 import logging
-import weaviate
-from openai import AsyncOpenAI
-from config import COLLECTION_NAME
-import re
+from config import (COLLECTION_NAME, SEARCH_COLLECTIONS, FOLLOW_UP_POLICY, FOLLOW_UP_POLICIES, FOLLOW_UP_CONTEXT_CHARS,
+                    EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, VECTOR_RESCORE_FACTOR, EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, EMBEDDING_CACHE_PATH,
+                    EMBEDDING_CACHE_MAX_ROWS, ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD,
+                    ANSWER_CACHE_TTL, COLLECTION_VERSION_PATH, BLOB_STORE_DIR, RETRIEVAL_BACKEND, LOCAL_INDEX_DIR,
+                    LOCAL_INDEX_NPROBE, LOCAL_INDEX_ANN_THRESHOLD, CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_CHUNK_TOKENS,
+                    CONTEXT_DEDUP_THRESHOLD, CONTEXT_RERANK, CONTEXT_MMR_LAMBDA, CONTEXT_CROSS_ENCODER_MODEL,
+                    WEAVIATE_HEALTH_INTERVAL, WEAVIATE_QUERY_TIMEOUT, WEAVIATE_POOL_CONNECTIONS, WEAVIATE_POOL_MAXSIZE,
+                    WEAVIATE_CIRCUIT_FAILURES, WEAVIATE_CIRCUIT_RESET_TIMEOUT, ASK_TIMEOUT, TRACE_SAMPLE_RATE,
+                    ASK_MAX_CONCURRENT, ASK_MAX_QUEUE, ASK_QUEUE_TIMEOUT, ASK_COALESCE, DATA_DIR,
+                    DATA_CACHE_MAX_AGE, PAGE_CACHE_DIR, PAGE_PREVIEWS, WARMUP_QUERIES_PATH, WARMUP_QUERY_LIMIT,
+                    WARMUP_TIMEOUT, STARTUP_TARGET_SECONDS, INGEST_JOBS_PATH, INGEST_APP_JOB_WORKERS,
+                    INGEST_ADMIN_TOKEN)
+from embedding_cache import create_embedding_cache, cached_embedding, normalize_query
+from embedding_batches import embedding_signature
+from answer_cache import SemanticAnswerCache
+from blob_store import BlobStore
+from retrieval import SearchFilters, create_retrieval_backend
+from context_builder import ContextBuilder
+from metrics import (registry, span, timed, record_tokens, current_trace, start_trace, finish_trace,
+                     cache_collector, stats_collector)
+from admission import AdmissionController, RequestCoalescer, Overloaded
+from static_assets import DataAssets, PageRenderingUnavailable, cited_pages
+from warmup import StartupState, load_warmup_queries, prime_embeddings
 
 # Get the absolute path of the directory containing app.py
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-app = Flask(__name__)
+app = Quart(__name__)
+app.config['RESPONSE_TIMEOUT'] = ASK_TIMEOUT + 5
 
 # Load environment variables
 load_dotenv()
@@ -21,85 +46,105 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Set up AsyncOpenAI client
-openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-# Initialize Weaviate client
-client = None
-
-# Global variable to track connection status
-connection_status = {"status": "Disconnected", "color": "red"}
-
-# Function to initialize the Weaviate client
-async def initialize_weaviate_client(max_retries=3, retry_delay=5):
-    global client, connection_status
-    retries = 0
-    while retries < max_retries:
-        connection_status = {"status": "Connecting...", "color": "orange"}
-        try:
-            logger.info(f"Attempting to connect to Weaviate (Attempt {retries + 1}/{max_retries})")
-            client = weaviate.Client(
-                url=os.getenv('WCS_URL'),
-                auth_client_secret=weaviate.auth.AuthApiKey(os.getenv('WCS_API_KEY')),
-                additional_headers={
-                    "X-OpenAI-Api-Key": os.getenv('OPENAI_API_KEY')
-                }
-            )
-            # Test the connection
-            await asyncio.to_thread(client.schema.get)
-            connection_status = {"status": "Connected", "color": "green"}
-            logger.info("Successfully connected to Weaviate")
-            return connection_status
-        except Exception as e:
-            logger.error(f"Error connecting to Weaviate: {str(e)}")
-            connection_status = {"status": f"Error: {str(e)}", "color": "red"}
-            retries += 1
-            if retries < max_retries:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                await asyncio.sleep(retry_delay)
-            else:
-                logger.error("Max retries reached. Could not connect to Weaviate.")
-    return connection_status
-
-# Async-compatible caching decorator
-def async_lru_cache(maxsize=1024):
-    cache = {}
-
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            key = str(args) + str(kwargs)
-            if key not in cache:
-                if len(cache) >= maxsize:
-                    cache.pop(next(iter(cache)))
-                cache[key] = await func(*args, **kwargs)
-            return cache[key]
-        return wrapper
-    return decorator
-
-@async_lru_cache(maxsize=1000)
+startup_state = StartupState(_import_started, STARTUP_TARGET_SECONDS)
+
+# The OpenAI client (and SDK) is created on first use or by warm-up, not at import, and then
+# lives for the whole worker so requests share one pooled HTTP connection set
+openai_client = None
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        from openai import AsyncOpenAI
+        openai_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return openai_client
+
+# Ingestion job queue shared with the ingestion workers, opened on first use
+job_store = None
+ingest_runner = None
+
+def get_job_store():
+    global job_store
+    if job_store is None:
+        from ingest_jobs import IngestJobStore
+        job_store = IngestJobStore(INGEST_JOBS_PATH)
+    return job_store
+
+blob_store = BlobStore(BLOB_STORE_DIR)
+data_assets = DataAssets(os.path.join(basedir, DATA_DIR), PAGE_CACHE_DIR)
+background_tasks = set()
+
+# Retrieval goes through a pluggable backend: the Weaviate cluster or a local in-process index.
+# The Weaviate client is managed in the background (connect, health checks, reconnect, circuit
+# breaking) and is started by the before_serving hook under any ASGI server, not only app.run.
+retrieval_backend = create_retrieval_backend(
+    RETRIEVAL_BACKEND,
+    collection_name=SEARCH_COLLECTIONS or COLLECTION_NAME,
+    local_index_dir=LOCAL_INDEX_DIR,
+    weaviate_options={
+        "health_interval": WEAVIATE_HEALTH_INTERVAL,
+        "query_timeout": WEAVIATE_QUERY_TIMEOUT,
+        "pool_connections": WEAVIATE_POOL_CONNECTIONS,
+        "pool_maxsize": WEAVIATE_POOL_MAXSIZE,
+        "failure_threshold": WEAVIATE_CIRCUIT_FAILURES,
+        "reset_timeout": WEAVIATE_CIRCUIT_RESET_TIMEOUT
+    },
+    nprobe=LOCAL_INDEX_NPROBE,
+    ann_threshold=LOCAL_INDEX_ANN_THRESHOLD,
+    rescore_factor=VECTOR_RESCORE_FACTOR
+)
+
+# Query embeddings are cached in-process (LRU + TTL) and optionally on disk, shared across workers
+embedding_cache = create_embedding_cache(
+    embedding_signature(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS),
+    maxsize=EMBEDDING_CACHE_SIZE,
+    ttl=EMBEDDING_CACHE_TTL,
+    path=EMBEDDING_CACHE_PATH,
+    max_rows=EMBEDDING_CACHE_MAX_ROWS
+)
+
+# Answers to near-duplicate questions are served from a semantic cache until the collection changes
+answer_cache = SemanticAnswerCache(
+    maxsize=ANSWER_CACHE_SIZE,
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL,
+    version_path=COLLECTION_VERSION_PATH
+) if ANSWER_CACHE_ENABLED else None
+
+# Bounded concurrency for answer pipelines, and sharing of one run between identical in-flight questions
+admission = AdmissionController(ASK_MAX_CONCURRENT, ASK_MAX_QUEUE, ASK_QUEUE_TIMEOUT)
+coalescer = RequestCoalescer()
+
+# Cache hit rates are exported on /metrics alongside the stage latencies
+registry.add_collector(cache_collector("embedding", embedding_cache))
+if answer_cache is not None:
+    registry.add_collector(cache_collector("answer", answer_cache))
+registry.add_collector(stats_collector("rag_admission", "endpoint", "ask", admission, counters=("admitted", "rejected")))
+registry.add_collector(stats_collector("rag_coalescing", "endpoint", "ask", coalescer, counters=("started", "coalesced")))
+registry.add_collector(stats_collector("rag_startup", "worker", str(os.getpid()), startup_state))
+
+@timed("embedding")
+@cached_embedding(embedding_cache)
 async def get_embedding(text):
-    response = await openai_client.embeddings.create(
+    response = await get_openai_client().embeddings.create(
         input=text,
-        model="text-embedding-3-large"
+        model=EMBEDDING_MODEL,
+        **({"dimensions": EMBEDDING_DIMENSIONS} if EMBEDDING_DIMENSIONS else {})
     )
+    record_tokens(EMBEDDING_MODEL, response.usage)
     return response.data[0].embedding
 
-async def search_multimodal(query: str, limit: int = 30, alpha: float = 0.6):
-    logger.info(f"Starting multimodal search for query: {query}")
+# filters are metadata prefilters (SearchFilters); collections restricts the search to some of the configured routes
+async def search_multimodal(query: str, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None,
+                            collections=None):
+    logger.info(f"Starting multimodal search for query: {query}" + (f" with {filters!r}" if filters and not filters.is_empty() else ""))
     try:
         query_vector = await get_embedding(query)
         logger.info(f"Generated query embedding of length {len(query_vector)}")
         
-        response = await asyncio.to_thread(
-            client.query.get(COLLECTION_NAME, ["content_type", "source_document", "page_number",
-                                               "paragraph_number", "text", "image_path", "description", "table_content"])
-            .with_hybrid(query=query, vector=query_vector, alpha=alpha)
-            .with_limit(limit)
-            .do
-        )
-        
-        results = response['data']['Get'][COLLECTION_NAME]
+        with span("retrieval"):
+            results = await retrieval_backend.search(query, query_vector, limit=limit, alpha=alpha, filters=filters,
+                                                     collections=collections)
         logger.info(f"Search completed. Found {len(results)} results.")
         return results
     except Exception as e:
@@ -141,7 +186,11 @@ Based on the above context and your extensive knowledge of the semiconductor ind
 rewrite the prommpt put the prompt in the similar way but add a strcit rulke where top 5 sources where most of the asnwers lies make it strict
     """
 
-    async for chunk in await openai_client.chat.completions.create(
+    # Time to first token and total generation time are recorded separately
+    trace = current_trace()
+    started = time.perf_counter()
+    first_token = True
+    async for chunk in await get_openai_client().chat.completions.create(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are an expert Semi Conductor industry analyst"},
@@ -149,28 +198,41 @@ rewrite the prommpt put the prompt in the similar way but add a strcit rulke whe
         ],
         temperature=0,
         max_tokens=500,
-        stream=True
+        stream=True,
+        stream_options={"include_usage": True}
     ):
+        # The final chunk carries only the token usage
+        if not chunk.choices:
+            record_tokens("gpt-4o", chunk.usage)
+            continue
         content = chunk.choices[0].delta.content
         if content is not None:
+            if first_token and trace is not None:
+                trace.record("first_token", time.perf_counter() - started)
+                first_token = False
             yield content
+    if trace is not None:
+        trace.record("generation", time.perf_counter() - started)
 
 def process_search_result(item):
+    section = f" [{item['section']}]" if item.get('section') else ""
     if item['content_type'] == 'text':
-        return f"Text from {item['source_document']} (Page {item['page_number']}, Paragraph {item['paragraph_number']}): {item['text']}\n\n"
+        # Chunks may run onto later pages; the citation keeps the page the chunk starts on
+        through = f", through page {item['page_end']}" if (item.get('page_end') or 0) > (item['page_number'] or 0) else ""
+        return f"Text from {item['source_document']} (Page {item['page_number']}, Paragraph {item['paragraph_number']}{through}){section}: {item['text']}\n\n"
     elif item['content_type'] == 'image':
         return f"Image Description from {item['source_document']} (Page {item['page_number']}, Path: {item['image_path']}): {item['description']}\n\n"
     elif item['content_type'] == 'table':
-        return f"Table Description from {item['source_document']} (Page {item['page_number']}): {item['description']}\n\n"
+        # Tables from the text layer carry their rows; older objects only have a vision description
+        return f"Table from {item['source_document']} (Page {item['page_number']}){section}:\n{item.get('table_content') or item.get('description')}\n\n"
     return ""
 
-# New function to generate follow-up questions
-async def generate_follow_up_questions(answer):
-    prompt = f"""
-    Based on the following response, generate exactly 2 follow-up questions:\n\n{answer}\n\nFollow-up questions:
-    """
+def _parse_follow_up_questions(content):
+    follow_up_questions = content.strip().split("\n")
+    return [q.strip() for q in follow_up_questions[:2] if q.strip()]
 
-    response = await openai_client.chat.completions.create(
+async def _complete_follow_up_prompt(prompt):
+    response = await get_openai_client().chat.completions.create(
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": "You are a helpful assistant generating follow-up questions."},
@@ -180,100 +242,514 @@ async def generate_follow_up_questions(answer):
         n=1,
         temperature=0.2
     )
-    
-    follow_up_questions = response.choices[0].message.content.strip().split("\n")
-    return [q.strip() for q in follow_up_questions[:2] if q.strip()]
+    record_tokens("gpt-4o-mini", response.usage)
+    return _parse_follow_up_questions(response.choices[0].message.content)
 
-import re
-
-import re
-import asyncio
-from typing import List, Dict, Any
+# New function to generate follow-up questions
+@timed("follow_ups")
+async def generate_follow_up_questions(answer):
+    prompt = f"""
+    Based on the following response, generate exactly 2 follow-up questions:\n\n{answer}\n\nFollow-up questions:
+    """
+    return await _complete_follow_up_prompt(prompt)
 
-async def esg_analysis_stream(user_query: str):
+# Speculative variant that only needs the question and the retrieved context, so it can run alongside the answer
+@timed("follow_ups")
+async def generate_follow_up_questions_from_context(query, context):
+    prompt = f"""
+    A user asked the following question about the semiconductor documents below. Generate exactly 2 follow-up questions the user is likely to ask next, answerable from the same documents.\n\nQuestion: {query}\n\nDocuments:\n{context[:FOLLOW_UP_CONTEXT_CHARS]}\n\nFollow-up questions:
+    """
+    return await _complete_follow_up_prompt(prompt)
+
+context_builder = ContextBuilder(
+    process_search_result,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    max_chunk_tokens=CONTEXT_MAX_CHUNK_TOKENS,
+    dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+    rerank=CONTEXT_RERANK,
+    mmr_lambda=CONTEXT_MMR_LAMBDA,
+    cross_encoder_model=CONTEXT_CROSS_ENCODER_MODEL
+)
+
+SOURCES_MARKER = "Top 5 most relevant sources used to generate the response:"
+
+def split_response(full_response: str):
+    parts = full_response.split(SOURCES_MARKER, 1)
+    main_response = parts[0].strip() if parts else full_response
+    sources = parts[1].strip() if len(parts) > 1 else ""
+    return main_response, sources
+
+# Length of the longest suffix of text that could be the start of the sources marker
+def _marker_prefix_len(text: str, marker: str = SOURCES_MARKER) -> int:
+    for size in range(min(len(text), len(marker) - 1), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
+
+# Returns the prompt context and whether retrieval found anything (a failed search yields an empty context)
+async def build_context(user_query: str, filters: SearchFilters = None, collections=None):
+    # Step 1: Search for relevant information
+    search_results = await search_multimodal(user_query, filters=filters, collections=collections) or []
+    logger.info(f"Found {len(search_results)} search results")
+
+    # Step 2: Deduplicate, rerank and pack the results into the prompt token budget
+    with span("context"):
+        context = await asyncio.to_thread(context_builder.build, user_query, search_results)
+    logger.info(f"Processed search results into context of length {len(context)}")
+    return context, bool(search_results)
+
+async def esg_analysis_stream(user_query: str, filters: SearchFilters = None, collections=None):
     try:
-        logger.info(f"Processing query: {user_query}")
-        
-        # Step 1: Search for relevant information
-        search_results = await search_multimodal(user_query)
-        logger.info(f"Found {len(search_results)} search results")
-        
-        # Step 2: Process search results
-        context_parts = await asyncio.gather(*[asyncio.to_thread(process_search_result, item) for item in search_results])
-        context = "".join(context_parts)
-        logger.info(f"Processed search results into context of length {len(context)}")
-
-        # Step 3: Generate response
-        response_generator = generate_response_stream(user_query, context)
-        full_response = ""
-        async for response_chunk in response_generator:
-            full_response += response_chunk
-        logger.info(f"Generated full response of length {len(full_response)}")
-
-        # Step 4: Split the response into main content and sources
-        parts = full_response.split("Top 5 most relevant sources used to generate the response:", 1)
-        main_response = parts[0].strip() if parts else full_response
-        sources = parts[1].strip() if len(parts) > 1 else ""
-
+        main_response = ""
+        sources = ""
+        follow_up_questions = []
+        events = await answer_events(user_query, route="/ask", filters=filters, collections=collections)
+        try:
+            async for event in events:
+                if event["type"] == "token":
+                    main_response += event["content"]
+                elif event["type"] == "sources":
+                    sources = event["sources"]
+                elif event["type"] == "follow_up_questions":
+                    follow_up_questions = event["follow_up_questions"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["error"])
+        finally:
+            await events.aclose()
+
+        main_response = main_response.strip()
         logger.info(f"Main response length: {len(main_response)}, Sources length: {len(sources)}")
-
-        # Step 5: Generate follow-up questions
-        follow_up_questions = await generate_follow_up_questions(main_response)
-        logger.info(f"Generated {len(follow_up_questions)} follow-up questions")
-
         return main_response, sources, follow_up_questions
 
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error in esg_analysis_stream: {str(e)}", exc_info=True)
         raise  # Re-raise the exception after logging it
 
+# Decides when follow-up question generation starts relative to the answer stream:
+#   after_answer    - from the finished answer (one extra serial round trip)
+#   first_paragraph - from the answer's first paragraph, while the rest is still streaming
+#   speculative     - from the query and retrieved context, in parallel with the whole answer
+class FollowUpScheduler:
+    def __init__(self, policy: str, user_query: str, context: str):
+        if policy not in FOLLOW_UP_POLICIES:
+            logger.warning(f"Unknown follow-up policy {policy!r}, falling back to 'after_answer'")
+            policy = "after_answer"
+        self.policy = policy
+        self.task = None
+        if policy == "speculative":
+            self.task = asyncio.create_task(generate_follow_up_questions_from_context(user_query, context))
+
+    # complete=True means the answer text has ended (the sources marker was seen), which also
+    # completes a single-paragraph answer
+    def on_answer_text(self, main_text: str, complete: bool = False):
+        if self.task is None and self.policy == "first_paragraph":
+            first_paragraph = main_text.strip().split("\n\n", 1)
+            if len(first_paragraph) > 1 or (complete and first_paragraph[0]):
+                self.task = asyncio.create_task(generate_follow_up_questions(first_paragraph[0]))
+
+    async def result(self, main_response: str):
+        if self.task is None:
+            self.task = asyncio.create_task(generate_follow_up_questions(main_response))
+        return await self.task
+
+    async def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                logger.info("Cancelled pending follow-up question generation")
+            except Exception:
+                pass
+
+# Yields answer tokens as they arrive, then the sources block and follow-up questions as trailing events
+async def esg_analysis_events(user_query: str, follow_up_policy: str = None, route: str = "/ask/stream",
+                              filters: SearchFilters = None, collections=None):
+    follow_ups = None
+    trace = start_trace(route)
+    outcome = "cancelled"
+    # Cached answers were produced from the whole corpus, so filtered or routed questions bypass the cache
+    use_answer_cache = answer_cache is not None and (filters is None or filters.is_empty()) and not collections
+    try:
+        logger.info(f"Processing streaming query: {user_query}")
+        query_vector = None
+        if use_answer_cache:
+            query_vector = await get_embedding(user_query)
+            cached = answer_cache.lookup(query_vector)
+            trace.set("answer_cache", "miss" if cached is None else "hit")
+            if cached is not None:
+                outcome = "cached"
+                yield {"type": "token", "content": cached["answer"]}
+                yield {"type": "sources", "sources": cached["sources"]}
+                yield {"type": "follow_up_questions", "follow_up_questions": cached["follow_up_questions"][:2]}
+                yield {"type": "done", "cached": True}
+                return
+
+        context, retrieved = await build_context(user_query, filters, collections)
+        follow_ups = FollowUpScheduler(follow_up_policy or FOLLOW_UP_POLICY, user_query, context)
+        trace.set("follow_up_policy", follow_ups.policy)
+        trace.set("context_chars", len(context))
+
+        full_response = ""
+        main_text = ""
+        pending = ""
+        in_sources = False
+        async for response_chunk in generate_response_stream(user_query, context):
+            full_response += response_chunk
+            if in_sources:
+                continue
+            pending += response_chunk
+            marker_index = pending.find(SOURCES_MARKER)
+            if marker_index != -1:
+                if pending[:marker_index]:
+                    main_text += pending[:marker_index]
+                    yield {"type": "token", "content": pending[:marker_index]}
+                pending = ""
+                in_sources = True
+                follow_ups.on_answer_text(main_text, complete=True)
+                continue
+            # Hold back anything that might be the beginning of the sources marker
+            held = _marker_prefix_len(pending)
+            if len(pending) > held:
+                main_text += pending[:len(pending) - held]
+                yield {"type": "token", "content": pending[:len(pending) - held]}
+                pending = pending[len(pending) - held:]
+                follow_ups.on_answer_text(main_text)
+        if pending and not in_sources:
+            main_text += pending
+            yield {"type": "token", "content": pending}
+        logger.info(f"Streamed full response of length {len(full_response)}")
+
+        main_response, sources = split_response(full_response)
+        yield {"type": "sources", "sources": sources}
+        if PAGE_PREVIEWS and sources:
+            warm_cited_pages(sources)
+
+        follow_up_questions = await follow_ups.result(main_response)
+        logger.info(f"Generated {len(follow_up_questions)} follow-up questions ({follow_ups.policy})")
+        yield {"type": "follow_up_questions", "follow_up_questions": follow_up_questions[:2]}
+        # An answer written without retrieved context (e.g. during a retrieval outage) must not be served again
+        if use_answer_cache and main_response and retrieved and sources:
+            answer_cache.store(user_query, query_vector, main_response, sources, follow_up_questions)
+        trace.set("response_chars", len(main_response))
+        outcome = "ok"
+        yield {"type": "done"}
+    except Exception as e:
+        logger.error(f"Error in esg_analysis_events: {str(e)}", exc_info=True)
+        outcome = "error"
+        yield {"type": "error", "error": "An error occurred while processing your request"}
+    finally:
+        # Runs on normal completion and when the client disconnects mid-stream
+        if follow_ups is not None:
+            await follow_ups.cancel()
+        finish_trace(trace, outcome, TRACE_SAMPLE_RATE)
+
+# Prerender thumbnails and page slices for the pages an answer cites, off the request path
+def warm_cited_pages(sources: str):
+    task = asyncio.create_task(asyncio.to_thread(data_assets.warm, cited_pages(sources)))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+# Entry point for both /ask routes. Joins an identical question that is already being answered;
+# otherwise waits for an admission slot (raising Overloaded when shedding) and starts a new run
+# that holds the slot until it finishes.
+async def answer_events(user_query: str, route: str, filters: SearchFilters = None, collections=None):
+    # Without coalescing every request gets a key of its own; only identically scoped questions are joined
+    scope = (filters.key() if filters is not None else None, collections)
+    key = (normalize_query(user_query), scope) if ASK_COALESCE else object()
+    events = coalescer.join(key)
+    if events is not None:
+        logger.info(f"Joined in-flight answer for query: {user_query}")
+        return events
+    await admission.acquire()
+    # Another request may have started the same question while this one was queued
+    events = coalescer.join(key)
+    if events is not None:
+        admission.release()
+        return events
+    return coalescer.start(key, esg_analysis_events(user_query, route=route, filters=filters, collections=collections),
+                           on_done=admission.release)
+
+# The question plus the optional "filters" and "collections" of an /ask request body;
+# raises ValueError on bad input
+def parse_ask_request(body):
+    if not isinstance(body, dict) or not isinstance(body.get('question'), str) or not body['question'].strip():
+        raise ValueError("question is required")
+    filters = SearchFilters.from_request(body.get('filters'))
+    collections = body.get('collections') or None
+    if collections is not None:
+        if isinstance(collections, str):
+            collections = [collections]
+        if not isinstance(collections, list) or not all(isinstance(name, str) for name in collections):
+            raise ValueError("collections must be a string or a list of strings")
+        retrieval_backend.select(collections)
+        collections = tuple(sorted(set(collections)))
+    return body['question'], filters, collections
+
+def overloaded_response(error: Overloaded):
+    logger.warning(f"Shedding request: {str(error)}")
+    response = jsonify({'error': 'The service is busy, please try again shortly'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(error.retry_after)))
+    return response
+
+# Connects to the retrieval backend (or loads the local index) and primes the query embedding cache
+# with frequent questions; the worker already serves requests meanwhile but reports ready on /ready
+# only once this is done
+async def warm_up():
+    primed = 0
+    try:
+        await retrieval_backend.start()
+        if not await retrieval_backend.wait_ready(WARMUP_TIMEOUT):
+            logger.warning(f"Retrieval backend not ready after {WARMUP_TIMEOUT}s, continuing warm-up")
+        async with asyncio.timeout(WARMUP_TIMEOUT):
+            primed = await prime_embeddings(get_embedding, load_warmup_queries(WARMUP_QUERIES_PATH, WARMUP_QUERY_LIMIT))
+    except TimeoutError:
+        logger.warning(f"Embedding cache warm-up did not finish within {WARMUP_TIMEOUT}s")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {str(e)}", exc_info=True)
+    startup_state.mark_ready(primed)
+
+# Runs queued ingestion jobs inside this worker (INGEST_APP_JOB_WORKERS > 0); otherwise they are run by
+# `python process_PDF_and_ingest.py --worker`, which keeps partitioning and embedding off the serving processes
+async def run_ingest_jobs():
+    try:
+        ingest = await asyncio.to_thread(importlib.import_module, "process_PDF_and_ingest")
+        await ingest.run_jobs(get_job_store(), workers=INGEST_APP_JOB_WORKERS)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Ingestion job runner stopped: {str(e)}", exc_info=True)
+
+@app.before_serving
+async def startup():
+    global ingest_runner
+    get_openai_client()
+    task = asyncio.create_task(warm_up())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    if INGEST_APP_JOB_WORKERS > 0:
+        ingest_runner = asyncio.create_task(run_ingest_jobs())
+
+@app.after_serving
+async def shutdown():
+    if ingest_runner is not None:
+        # A job interrupted here goes back to the queue and resumes from its checkpoints
+        ingest_runner.cancel()
+        await asyncio.gather(ingest_runner, return_exceptions=True)
+    await retrieval_backend.close()
+    if openai_client is not None:
+        await openai_client.close()
+
+@app.route('/ready')
+async def ready():
+    return jsonify(startup_state.stats()), 200 if startup_state.ready else 503
+
 @app.route('/')
-def index():
-    return render_template('index.html')
+async def index():
+    return await render_template('index.html')
 
 @app.route('/ask', methods=['POST'])
 async def ask():
     try:
-        user_question = request.json['question']
-        main_response, sources, follow_up_questions = await esg_analysis_stream(user_question)
+        try:
+            user_question, filters, collections = parse_ask_request(await request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        async with asyncio.timeout(ASK_TIMEOUT):
+            main_response, sources, follow_up_questions = await esg_analysis_stream(user_question, filters, collections)
         response_data = {
             'response': main_response,
             'sources': sources,
             'follow_up_questions': follow_up_questions[:2]  # Limit to 2 follow-up questions
         }
-        print("Sending response:", response_data)
         return jsonify(response_data)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except TimeoutError:
+        logger.error(f"Request timed out after {ASK_TIMEOUT}s")
+        return jsonify({'error': 'The request timed out'}), 504
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
         return jsonify({'error': 'An error occurred while processing your request'}), 500
+
+# Response body for /ask/stream. Quart calls aclose() when the response ends or the client goes
+# away, even if the generator never started, so the subscription is released either way.
+class StreamBody:
+    def __init__(self, chunks, events):
+        self._chunks = chunks
+        self._events = events
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._chunks.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._chunks.aclose()
+        finally:
+            await self._events.aclose()
+
+
+@app.route('/ask/stream', methods=['POST'])
+async def ask_stream():
+    try:
+        user_question, filters, collections = parse_ask_request(await request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        events = await answer_events(user_question, route="/ask/stream", filters=filters, collections=collections)
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    # If the client disconnects, Quart closes the response body; the shared pipeline run is
+    # cancelled (and its cleanup runs) once no other request is subscribed to it
+    async def generate():
+        try:
+            async with asyncio.timeout(ASK_TIMEOUT):
+                async for event in events:
+                    yield json.dumps(event) + "\n"
+        except TimeoutError:
+            logger.error(f"Streaming request timed out after {ASK_TIMEOUT}s")
+            yield json.dumps({"type": "error", "error": "The request timed out"}) + "\n"
+
+    try:
+        response = Response(
+            StreamBody(generate(), events),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except BaseException:
+        await events.aclose()
+        raise
+    response.timeout = ASK_TIMEOUT + 5
+    return response
     
 
+# Strong content-hash ETag plus Range support, so PDF viewers fetch only the pages they show
+# and revisits are answered with 304 instead of the whole datasheet
+async def send_data_file(path, max_age=DATA_CACHE_MAX_AGE):
+    etag = await asyncio.to_thread(data_assets.etag_for, path)
+    response = await send_file(path, add_etags=False)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    response.headers['Accept-Ranges'] = 'bytes'
+    return await response.make_conditional(request, accept_ranges=True, complete_length=os.path.getsize(path))
+
+# Kept for links of the form /data/..., nothing outside the data directory is served
 @app.route('/<path:filename>')
-def serve_pdf(filename):
-    try:
-        return send_file(filename)
-    except Exception as e:
-        app.logger.error(f"Error serving PDF {filename}: {str(e)}")
-        return f"Error: Could not serve file {filename}", 404
+async def serve_pdf(filename):
+    if filename.startswith('data/'):
+        return await data_serve_pdf(filename[len('data/'):])
+    return f"Error: Could not serve file {filename}", 404
 
 @app.route('/data/<path:filename>')
-def data_serve_pdf(filename):
-    try:
-        return send_from_directory('data', filename)
-    except FileNotFoundError:
+async def data_serve_pdf(filename):
+    path = data_assets.resolve(filename)
+    if path is None:
+        return f"Error: File {filename} not found", 404
+    return await send_data_file(path)
+
+async def send_rendered_page(render, filename, page, *args):
+    pdf_path = data_assets.resolve(filename)
+    if pdf_path is None or not pdf_path.lower().endswith('.pdf'):
         return f"Error: File {filename} not found", 404
+    try:
+        path = await asyncio.to_thread(render, pdf_path, page, *args)
+    except PageRenderingUnavailable as e:
+        return f"Error: {str(e)}", 501
+    except IndexError:
+        return f"Error: Page {page} not found in {filename}", 404
+    return await send_data_file(path)
+
+@app.route('/thumbnails/<int:page>/<path:filename>')
+async def page_thumbnail(page, filename):
+    width = min(max(request.args.get('width', 320, type=int), 64), 1024)
+    return await send_rendered_page(data_assets.page_thumbnail, filename, page, width)
+
+@app.route('/page-slices/<int:page>/<path:filename>')
+async def page_slice(page, filename):
+    return await send_rendered_page(data_assets.page_slice, filename, page)
+
+# Content-addressed image blobs never change, so they can be cached forever
+@app.route('/blobs/<blob_id>')
+async def serve_blob(blob_id):
+    if not blob_store.exists(blob_id):
+        return f"Error: Blob {blob_id} not found", 404
+    response = await send_file(
+        os.path.abspath(blob_store.path_for(blob_id)),
+        add_etags=False
+    )
+    response.set_etag(blob_id.split('.')[0])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return await response.make_conditional(request)
 
 @app.route('/status')
 async def status():
-    return jsonify(connection_status)
+    return jsonify(retrieval_backend.status())
+
+# Queued, running and recently finished ingestion jobs with their progress, shown next to the status indicator
+@app.route('/ingest/status')
+async def ingest_status():
+    return jsonify(await asyncio.to_thread(get_job_store().summary))
+
+# Queueing ingestion (and especially a forced re-ingest) spends vision and embedding calls, so it is
+# an admin action: disabled unless INGEST_ADMIN_TOKEN is set, and then only with that bearer token
+def ingest_admin_authorized():
+    if not INGEST_ADMIN_TOKEN:
+        return False
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), INGEST_ADMIN_TOKEN.encode())
+
+# Queues a directory of PDFs under DATA_DIR for ingestion as a durable job; submitting the same
+# directory again while its job is unfinished returns that job
+@app.route('/ingest/jobs', methods=['POST'])
+async def submit_ingest_job():
+    if not INGEST_ADMIN_TOKEN:
+        return jsonify({'error': 'Submitting ingestion jobs over HTTP is disabled'}), 404
+    if not ingest_admin_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    body = await request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    pdf_dir = body.get('pdf_dir')
+    category = body.get('category')
+    if not isinstance(pdf_dir, str) or os.path.isabs(pdf_dir) or os.path.normpath(pdf_dir).startswith('..'):
+        return jsonify({'error': 'pdf_dir must be a directory inside the data directory'}), 400
+    if category is not None and not isinstance(category, str):
+        return jsonify({'error': 'category must be a string'}), 400
+    # Built the way the ingestion script names its paths, since object IDs derive from the document path
+    pdf_dir = os.path.join(DATA_DIR, os.path.normpath(pdf_dir))
+    if not os.path.isdir(pdf_dir):
+        return jsonify({'error': f'Directory {pdf_dir} not found'}), 400
+    job_id, created = await asyncio.to_thread(
+        get_job_store().submit, pdf_dir, os.path.join(DATA_DIR, "images"), COLLECTION_NAME or "RAGESGDocuments3",
+        "./image_prompt.txt", category, bool(body.get('force')))
+    return jsonify({'job_id': job_id, 'created': created}), 202 if created else 200
+
+@app.route('/metrics')
+async def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache-stats')
+async def cache_stats():
+    stats = {'embedding_cache': embedding_cache.stats()}
+    if answer_cache is not None:
+        stats['answer_cache'] = answer_cache.stats()
+    return jsonify(stats)
 
 @app.route('/test-pdf')
-def test_pdf():
+async def test_pdf():
     return '''
     <h1>PDF Test</h1>
     <iframe src="./data/DS950 - Versal Architecture and Product Data Sheet - Overview - v2.2 - 240604.pdf" width="100%" height="500px"></iframe>
     '''
 
+startup_state.imported()
+
 if __name__ == '__main__':
-    asyncio.run(initialize_weaviate_client())
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
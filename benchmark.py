@@ -0,0 +1,454 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import aiohttp
+import numpy as np
+
+from synthetic_corpus import generate_corpus, paragraph, partition_synthetic, DOCUMENT_TOPICS
+
+logger = logging.getLogger(__name__)
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+
+# Offline benchmarks: the app and the ingestion pipeline run against fake OpenAI/Anthropic servers
+# (fake_services.py) and a local stand-in for Weaviate, so latency and throughput can be compared
+# between commits without live services.
+#   python benchmark.py ask --requests 200 --concurrency 16 --stream
+#   python benchmark.py ingest --documents 20 --pages 10
+#   python benchmark.py startup --target 5
+# --output writes the results as JSON; --baseline compares against an earlier file and exits
+# non-zero when a metric regressed by more than --tolerance.
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+async def _wait_until_ready(url: str, timeout: float = 60, poll_interval: float = 0.2):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(poll_interval)
+    raise TimeoutError(f"{url} did not become ready within {timeout}s")
+
+
+@contextmanager
+def fake_services(args):
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(basedir, "fake_services.py"), "--port", str(port),
+        "--embedding-dim", str(args.embedding_dim),
+        "--embedding-latency", str(args.embedding_latency),
+        "--first-token-latency", str(args.first_token_latency),
+        "--token-interval", str(args.token_interval),
+        "--completion-latency", str(args.completion_latency),
+        "--vision-latency", str(args.vision_latency),
+        "--error-rate", str(args.error_rate)
+    ])
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def fetch_service_stats(services_url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{services_url}/stats") as response:
+            return await response.json()
+
+
+# Synthetic text objects embedded with the same function the fake embeddings server uses
+def build_local_index(path: str, objects: int, dim: int, seed: int = 0):
+    from fake_services import fake_embedding
+    from local_index import LocalIndexWriter
+
+    rng = random.Random(seed)
+    writer = LocalIndexWriter(path, dim)
+    for i in range(objects):
+        text = paragraph(rng)
+        properties = {
+            "content_type": "text",
+            "source_document": f"./data/pdfs/{i % 50:04d} - {DOCUMENT_TOPICS[i % len(DOCUMENT_TOPICS)]} - Data Sheet.pdf",
+            "page_number": 1 + i % 40,
+            "paragraph_number": i,
+            "text": text
+        }
+        writer.add(properties, fake_embedding(text, dim))
+    writer.finish(build_ivf=objects >= 50000)
+
+
+async def _ask_once(session, url: str, question: str, stream: bool):
+    started = time.perf_counter()
+    first_token = None
+    if stream:
+        async with session.post(f"{url}/ask/stream", json={"question": question}) as response:
+            if response.status == 429:
+                return "shed", None, None
+            ok = response.status == 200
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+                elif event["type"] == "error":
+                    ok = False
+    else:
+        async with session.post(f"{url}/ask", json={"question": question}) as response:
+            await response.read()
+            if response.status == 429:
+                return "shed", None, None
+            ok = response.status == 200
+    return ok, time.perf_counter() - started, first_token
+
+
+# Closed-loop load: `concurrency` clients each send their next question as soon as the previous one finishes
+async def drive_ask(url: str, questions, concurrency: int, stream: bool, timeout: float = 300):
+    latencies, ttfts = [], []
+    errors = 0
+    shed = 0
+    pending = iter(questions)
+
+    async def client(session):
+        nonlocal errors, shed
+        for question in pending:
+            try:
+                ok, latency, first_token = await _ask_once(session, url, question, stream)
+            except Exception as e:
+                logger.warning(f"Request failed: {str(e)}")
+                ok, latency, first_token = False, None, None
+            if ok == "shed":
+                # Rejected by admission control (429)
+                shed += 1
+                continue
+            if not ok:
+                errors += 1
+                continue
+            latencies.append(latency)
+            if first_token is not None:
+                ttfts.append(first_token)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    result = {
+        "requests": len(latencies) + errors + shed,
+        "errors": errors,
+        "shed": shed,
+        "wall_seconds": round(wall, 2),
+        "requests_per_second": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        "latency_ms": percentiles(latencies)
+    }
+    if stream:
+        result["ttft_ms"] = percentiles(ttfts)
+    return result
+
+
+# Environment for an app process served by the fake services and a local index, writing only under workdir
+def _app_env(workdir: str, services_url: str, index_dir: str, **overrides):
+    env = dict(os.environ,
+               OPENAI_BASE_URL=f"{services_url}/v1",
+               OPENAI_API_KEY="benchmark",
+               RETRIEVAL_BACKEND="local",
+               LOCAL_INDEX_DIR=index_dir,
+               EMBEDDING_CACHE_PATH="",
+               COLLECTION_VERSION_PATH=os.path.join(workdir, "collection_version"),
+               BLOB_STORE_DIR=os.path.join(workdir, "blobs"),
+               INGEST_MANIFEST_PATH=os.path.join(workdir, "ingest_manifest.json"),
+               IMAGE_DESCRIPTION_CACHE_PATH="",
+               WARMUP_QUERIES_PATH="",
+               TRACE_SAMPLE_RATE="0")
+    env.update(overrides)
+    return env
+
+
+async def run_ask(args):
+    rng = random.Random(args.seed)
+    distinct = [paragraph(rng, 6, 14) for _ in range(args.distinct_questions or args.requests)]
+    questions = [distinct[i % len(distinct)] for i in range(args.requests)]
+
+    if args.url:
+        await _wait_until_ready(f"{args.url}/status")
+        return await drive_ask(args.url, questions, args.concurrency, args.stream)
+
+    with tempfile.TemporaryDirectory() as workdir, fake_services(args) as services_url:
+        index_dir = os.path.join(workdir, "local_index")
+        build_local_index(index_dir, args.objects, args.embedding_dim, args.seed)
+        port = _free_port()
+        env = _app_env(workdir, services_url, index_dir, ANSWER_CACHE_ENABLED="true" if args.answer_cache else "false")
+        server = subprocess.Popen([sys.executable, "-m", "hypercorn", "app:app", "--bind", f"127.0.0.1:{port}",
+                                   "--workers", str(args.workers)], cwd=basedir, env=env)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            await _wait_until_ready(f"{services_url}/stats")
+            await _wait_until_ready(f"{url}/status")
+            # Warm up connections and lazily created state before measuring
+            await drive_ask(url, distinct[:args.concurrency], args.concurrency, args.stream)
+            result = await drive_ask(url, questions, args.concurrency, args.stream)
+            result["upstream_calls"] = await fetch_service_stats(services_url)
+            return result
+        finally:
+            server.terminate()
+            server.wait()
+
+
+# Import time of a module in a fresh interpreter (median of several), so nothing is imported already
+def measure_import(module: str, env, repeats: int = 5):
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", f"import time; started = time.perf_counter(); import {module}; "
+                                   f"print(time.perf_counter() - started)"],
+            cwd=basedir, env=env, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return round(1000 * float(np.median(samples)), 1)
+
+
+# Start-up: import time of both entry points, then the time from launching a hypercorn worker until
+# /ready reports it warmed up (local index loaded, warm-up questions primed into the embedding cache)
+async def run_startup(args):
+    with tempfile.TemporaryDirectory() as workdir, fake_services(args) as services_url:
+        index_dir = os.path.join(workdir, "local_index")
+        build_local_index(index_dir, args.objects, args.embedding_dim, args.seed)
+        rng = random.Random(args.seed)
+        warmup_path = os.path.join(workdir, "warmup_queries.txt")
+        with open(warmup_path, 'w') as file:
+            file.write("\n".join(paragraph(rng, 6, 14) for _ in range(args.warmup_queries)))
+        env = _app_env(workdir, services_url, index_dir, WARMUP_QUERIES_PATH=warmup_path)
+
+        result = {
+            "import_app_ms": measure_import("app", env, args.repeats),
+            "import_ingest_ms": measure_import("process_PDF_and_ingest", env, args.repeats),
+        }
+        await _wait_until_ready(f"{services_url}/stats")
+
+        port = _free_port()
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, "-m", "hypercorn", "app:app", "--bind", f"127.0.0.1:{port}"],
+                                  cwd=basedir, env=env)
+        try:
+            await _wait_until_ready(f"http://127.0.0.1:{port}/status", poll_interval=0.02)
+            result["time_to_serving_ms"] = round(1000 * (time.perf_counter() - started), 1)
+            async with aiohttp.ClientSession() as session:
+                while True:
+                    async with session.get(f"http://127.0.0.1:{port}/ready") as response:
+                        state = await response.json()
+                        if response.status == 200:
+                            break
+                    await asyncio.sleep(0.02)
+            result["time_to_ready_ms"] = round(1000 * (time.perf_counter() - started), 1)
+            result["worker"] = {key: state[key] for key in ("import_seconds", "ready_seconds", "primed_queries")}
+        finally:
+            server.terminate()
+            server.wait()
+        return result
+
+
+# Minimal stand-in for the parts of a Weaviate collection the ingestion pipeline uses
+class StandInCollection:
+    def __init__(self):
+        self.objects = {}
+        self.batch = self._Batch(self)
+        self.data = self._Data(self)
+
+    class _Batch:
+        def __init__(self, collection):
+            self.collection = collection
+
+        @contextmanager
+        def dynamic(self):
+            yield self
+
+        def add_object(self, properties, uuid, vector):
+            self.collection.objects[uuid] = (properties, vector)
+
+    class _Data:
+        def __init__(self, collection):
+            self.collection = collection
+
+        def delete_many(self, where):
+            pass
+
+
+async def run_ingest(args):
+    with tempfile.TemporaryDirectory() as workdir, fake_services(args) as services_url:
+        os.environ.update(
+            OPENAI_BASE_URL=f"{services_url}/v1",
+            OPENAI_API_KEY="benchmark",
+            ANTHROPIC_BASE_URL=services_url,
+            ANTHROPIC_API_KEY="benchmark",
+            IMAGE_DESCRIPTION_CACHE_PATH="",
+            BLOB_STORE_DIR=os.path.join(workdir, "blobs"),
+            COLLECTION_VERSION_PATH=os.path.join(workdir, "collection_version"),
+            INGEST_MANIFEST_PATH=os.path.join(workdir, "ingest_manifest.json")
+        )
+        if not args.provider_limits:
+            # Measure the pipeline itself rather than the configured vision API rate limits
+            os.environ.update(IMAGE_SUMMARY_REQUESTS_PER_MINUTE="1000000", IMAGE_SUMMARY_INPUT_TOKENS_PER_MINUTE="1000000000")
+        # Imported only now: the module reads its configuration from the environment at import time
+        import process_PDF_and_ingest as ingest
+        from ingest_manifest import IngestManifest
+
+        pdf_dir = os.path.join(workdir, "pdfs")
+        started = time.perf_counter()
+        paths = generate_corpus(pdf_dir, args.documents, args.pages, figures_per_page=args.figures_per_page,
+                                seed=args.seed)
+        logger.info(f"Generated {len(paths)} synthetic PDFs in {time.perf_counter() - started:.1f}s")
+        await _wait_until_ready(f"{services_url}/stats")
+
+        if args.partitioner == "unstructured":
+            from pdf_partition import partition_document as partition
+        else:
+            partition = partition_synthetic
+        collection = StandInCollection()
+        manifest = IngestManifest(os.environ["INGEST_MANIFEST_PATH"])
+        image_prompt = ingest.load_prompt(os.path.join(basedir, "image_prompt.txt"))
+        output_dir = os.path.join(workdir, "images")
+
+        started = time.perf_counter()
+        await ingest.process_pdf_directory(pdf_dir, output_dir, image_prompt, collection, manifest,
+                                           partition=partition)
+        wall = time.perf_counter() - started
+        result = {
+            "documents": len(paths),
+            "elements": len(collection.objects),
+            "wall_seconds": round(wall, 2),
+            "documents_per_second": round(len(paths) / wall, 2),
+            "elements_per_second": round(len(collection.objects) / wall, 2),
+        }
+
+        # A second run over the same corpus measures the unchanged-document fast path
+        started = time.perf_counter()
+        await ingest.process_pdf_directory(pdf_dir, output_dir, image_prompt, collection, manifest,
+                                           partition=partition)
+        result["incremental_wall_seconds"] = round(time.perf_counter() - started, 3)
+        result["upstream_calls"] = await fetch_service_stats(services_url)
+        await ingest.close_clients()
+        return result
+
+
+# Metrics where bigger is better; every other compared metric is a latency or duration
+_HIGHER_IS_BETTER = ("requests_per_second", "documents_per_second", "elements_per_second")
+
+
+def _flatten(result, prefix=""):
+    flat = {}
+    for key, value in result.items():
+        if key == "upstream_calls":
+            continue
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(result, baseline, tolerance: float):
+    regressions = []
+    current = _flatten(result)
+    for key, before in _flatten(baseline).items():
+        after = current.get(key)
+        if after is None or not before or key.endswith(("requests", "errors", "shed", "documents", "elements")):
+            continue
+        change = (after - before) / before
+        worse = change < -tolerance if key.split(".")[-1] in _HIGHER_IS_BETTER else change > tolerance
+        if worse:
+            regressions.append(f"{key}: {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Offline latency and throughput benchmarks")
+    parser.add_argument("mode", choices=("ask", "ingest", "startup"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+
+    services = parser.add_argument_group("fake services")
+    services.add_argument("--embedding-dim", type=int, default=256)
+    services.add_argument("--embedding-latency", type=float, default=0.05)
+    services.add_argument("--first-token-latency", type=float, default=0.4)
+    services.add_argument("--token-interval", type=float, default=0.02)
+    services.add_argument("--completion-latency", type=float, default=0.5)
+    services.add_argument("--vision-latency", type=float, default=1.5)
+    services.add_argument("--error-rate", type=float, default=0.0)
+
+    ask = parser.add_argument_group("ask")
+    ask.add_argument("--url", help="Benchmark an already running app instead of starting one")
+    ask.add_argument("--requests", type=int, default=200)
+    ask.add_argument("--concurrency", type=int, default=16)
+    ask.add_argument("--distinct-questions", type=int, default=0, help="Defaults to one per request")
+    ask.add_argument("--stream", action="store_true", help="Use /ask/stream and report time to first token")
+    ask.add_argument("--answer-cache", action="store_true")
+    ask.add_argument("--objects", type=int, default=20000, help="Objects in the stand-in local index (also used by startup)")
+    ask.add_argument("--workers", type=int, default=1, help="hypercorn worker processes")
+
+    ingest = parser.add_argument_group("ingest")
+    ingest.add_argument("--documents", type=int, default=20)
+    ingest.add_argument("--pages", type=int, default=10)
+    ingest.add_argument("--figures-per-page", type=float, default=0.5)
+    ingest.add_argument("--partitioner", choices=("synthetic", "unstructured"), default="synthetic")
+    ingest.add_argument("--provider-limits", action="store_true",
+                        help="Keep the configured image summary rate limits instead of lifting them")
+
+    startup = parser.add_argument_group("startup")
+    startup.add_argument("--repeats", type=int, default=5, help="Fresh-interpreter imports per entry point")
+    startup.add_argument("--warmup-queries", type=int, default=20)
+    startup.add_argument("--target", type=float, help="Fail when a worker takes longer than this many seconds "
+                                                      "to become ready (defaults to STARTUP_TARGET_SECONDS)")
+    args = parser.parse_args()
+
+    runs = {"ask": run_ask, "ingest": run_ingest, "startup": run_startup}
+    result = asyncio.run(runs[args.mode](args))
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(result, json.load(file), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+    if args.mode == "startup":
+        from config import STARTUP_TARGET_SECONDS
+        target = args.target or STARTUP_TARGET_SECONDS
+        if result["time_to_ready_ms"] > target * 1000:
+            logger.error(f"Worker took {result['time_to_ready_ms']:.0f}ms to become ready, target is {target}s")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
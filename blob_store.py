@@ -0,0 +1,52 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+BLOB_ID_PATTERN = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]{1,5})?$')
+
+
+# Content-addressed files under root/ab/cd/<sha256><ext>; identical images are stored once
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def is_valid_id(blob_id: str) -> bool:
+        return bool(BLOB_ID_PATTERN.match(blob_id or ""))
+
+    def path_for(self, blob_id: str) -> str:
+        if not self.is_valid_id(blob_id):
+            raise ValueError(f"Invalid blob id: {blob_id!r}")
+        return os.path.join(self.root, blob_id[:2], blob_id[2:4], blob_id)
+
+    def exists(self, blob_id: str) -> bool:
+        return self.is_valid_id(blob_id) and os.path.exists(self.path_for(blob_id))
+
+    def put_bytes(self, data: bytes, extension: str = "") -> str:
+        blob_id = hashlib.sha256(data).hexdigest() + extension.lower()
+        path = self.path_for(blob_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so concurrent writers never expose a partial blob
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        return blob_id
+
+    def put_file(self, source_path: str, content_hash: str = None) -> str:
+        extension = os.path.splitext(source_path)[1].lower()
+        if content_hash is None:
+            with open(source_path, 'rb') as file:
+                return self.put_bytes(file.read(), extension)
+        blob_id = content_hash + extension
+        path = self.path_for(blob_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            os.close(fd)
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, path)
+        return blob_id
@@ -0,0 +1,129 @@
+from html.parser import HTMLParser
+
+from embedding_batches import count_tokens
+
+# Bump when chunk boundaries or record contents change, so the ingest manifest re-ingests documents
+CHUNKER_VERSION = "sections-v1"
+
+# Element categories (unstructured's element.category) that are merged into text chunks
+TEXT_CATEGORIES = {"NarrativeText", "ListItem", "UncategorizedText", "Text", "FigureCaption", "Formula",
+                   "Address", "EmailAddress", "CodeSnippet"}
+# Running headers/footers and page furniture repeat on every page and only add noise
+SKIPPED_CATEGORIES = {"Header", "Footer", "PageBreak", "PageNumber"}
+
+
+class _TableParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if any(self._row):
+                self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+# One line per row with " | " between cells, which embeds and reads far better than the flattened cell text
+def table_to_text(html: str = None, text: str = None) -> str:
+    if html:
+        parser = _TableParser()
+        parser.feed(html)
+        if parser.rows:
+            return "\n".join(" | ".join(row) for row in parser.rows)
+    return (text or "").strip()
+
+
+def _split_oversized(text: str, max_tokens: int):
+    words = text.split()
+    # Words per piece from the element's own token density
+    per_piece = max(1, int(len(words) * max_tokens / max(count_tokens(text), 1)))
+    return [" ".join(words[i:i + per_piece]) for i in range(0, len(words), per_piece)]
+
+
+# Merges partitioned elements into section-aware chunks of at most max_tokens. A title starts a new
+# chunk (and becomes the section of the chunks after it); chunks may span pages and record both ends.
+# Tables with a text layer become structured table records; tables without one and images are
+# passed on as image records for the vision model.
+#   element: {"category", "text", "page_number", "image_path", "table_html"}
+#   record:  {"kind": "text"|"table"|"image", "index", "text", "page_number", "page_end", "section", "image_path"}
+def chunk_elements(elements, max_tokens: int = 400):
+    records = []
+    section = None
+    parts, tokens, first_page, last_page = [], 0, None, None
+
+    def emit(kind, text, page_number, page_end=None, image_path=None):
+        records.append({
+            "kind": kind,
+            "index": len(records),
+            "text": text,
+            "page_number": page_number,
+            "page_end": page_end if page_end is not None else page_number,
+            "section": section,
+            "image_path": image_path,
+        })
+
+    def flush():
+        nonlocal parts, tokens, first_page, last_page
+        if parts:
+            emit("text", "\n".join(parts), first_page, last_page)
+        parts, tokens, first_page, last_page = [], 0, None, None
+
+    def add(text, page_number):
+        nonlocal tokens, first_page, last_page
+        size = count_tokens(text)
+        # A title is never left alone in a chunk; it stays with the text that follows it
+        if parts and tokens + size > max_tokens and parts != [section]:
+            flush()
+        parts.append(text)
+        tokens += size
+        first_page = page_number if first_page is None else first_page
+        last_page = page_number if page_number is not None else last_page
+
+    for element in elements:
+        category = element.get("category")
+        text = (element.get("text") or "").strip()
+        page_number = element.get("page_number")
+        if category in SKIPPED_CATEGORIES:
+            continue
+        if category == "Title":
+            if not text:
+                continue
+            flush()
+            section = text
+            add(text, page_number)
+        elif category == "Table":
+            flush()
+            table_text = table_to_text(element.get("table_html"), text)
+            if table_text:
+                emit("table", table_text, page_number)
+            elif element.get("image_path"):
+                emit("image", "", page_number, image_path=element["image_path"])
+        elif category == "Image":
+            if element.get("image_path"):
+                emit("image", text, page_number, image_path=element["image_path"])
+        elif text and (category in TEXT_CATEGORIES or category is None):
+            if category == "ListItem":
+                text = f"- {text}"
+            if count_tokens(text) > max_tokens:
+                for piece in _split_oversized(text, max_tokens):
+                    add(piece, page_number)
+            else:
+                add(text, page_number)
+    flush()
+    return records
@@ -1,3 +1,131 @@
 import os
+from dotenv import load_dotenv
 
-COLLECTION_NAME = os.getenv('WEAVIATE_COLLECTION_NAME')
\ No newline at end of file
+# Load .env before reading settings so every entry point sees the same configuration
+load_dotenv()
+
+COLLECTION_NAME = os.getenv('WEAVIATE_COLLECTION_NAME')
+# Collections searched by the app, comma-separated "Collection" or "Collection/tenant" entries whose results are
+# merged by score; defaults to COLLECTION_NAME. Requests can restrict the search to some of them.
+SEARCH_COLLECTIONS = os.getenv('SEARCH_COLLECTIONS', '')
+
+# When follow-up questions are generated: "after_answer", "first_paragraph" or "speculative"
+FOLLOW_UP_POLICIES = ("after_answer", "first_paragraph", "speculative")
+FOLLOW_UP_POLICY = os.getenv('FOLLOW_UP_POLICY', 'first_paragraph')
+FOLLOW_UP_CONTEXT_CHARS = int(os.getenv('FOLLOW_UP_CONTEXT_CHARS', '6000'))
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-large')
+# Shortened (Matryoshka) embeddings, e.g. 256 or 1024; unset keeps the model's full 3072 dimensions.
+# Ingestion and queries must agree, so changing it re-embeds every document on the next ingest.
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '0')) or None
+
+# Quantized vectors for the first-pass search, "none", "int8" or "binary", applied when a Weaviate collection
+# is created (scalar/binary quantization) or a local index is exported; the top candidates are re-scored
+# with full-precision vectors, VECTOR_RESCORE_FACTOR times as many as requested (0 disables re-scoring)
+VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none')
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', '4'))
+
+# Query embedding cache; set EMBEDDING_CACHE_PATH to share entries across workers and restarts
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '1000'))
+EMBEDDING_CACHE_TTL = float(os.getenv('EMBEDDING_CACHE_TTL', str(7 * 24 * 3600)))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', '')
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv('EMBEDDING_CACHE_MAX_ROWS', '200000'))
+
+# Semantic answer cache for repeated and near-duplicate questions
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '500'))
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', str(24 * 3600)))
+COLLECTION_VERSION_PATH = os.getenv('COLLECTION_VERSION_PATH', './data/collection_version')
+
+# Ingestion embedding batches: items written per Weaviate batch, inputs/tokens per embeddings request
+INGEST_WRITE_BATCH_SIZE = int(os.getenv('INGEST_WRITE_BATCH_SIZE', '1000'))
+INGEST_EMBEDDING_BATCH_TOKENS = int(os.getenv('INGEST_EMBEDDING_BATCH_TOKENS', '100000'))
+INGEST_EMBEDDING_BATCH_SIZE = int(os.getenv('INGEST_EMBEDDING_BATCH_SIZE', '256'))
+INGEST_EMBEDDING_CONCURRENCY = int(os.getenv('INGEST_EMBEDDING_CONCURRENCY', '4'))
+INGEST_EMBEDDING_MAX_RETRIES = int(os.getenv('INGEST_EMBEDDING_MAX_RETRIES', '6'))
+
+# Per-document record of what has been ingested, used to skip unchanged PDFs
+INGEST_MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', './data/ingest_manifest.json')
+
+# Durable ingestion jobs: the SQLite queue holding jobs, their progress and per-element checkpoints, jobs run
+# at once per worker process, attempts before a job is marked failed, and how long a running job may go without
+# a heartbeat before another worker resumes it. INGEST_APP_JOB_WORKERS > 0 also runs queued jobs inside the app.
+INGEST_JOBS_PATH = os.getenv('INGEST_JOBS_PATH', './data/ingest_jobs.sqlite3')
+INGEST_JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', '1'))
+INGEST_JOB_MAX_ATTEMPTS = int(os.getenv('INGEST_JOB_MAX_ATTEMPTS', '3'))
+INGEST_JOB_STALE_SECONDS = float(os.getenv('INGEST_JOB_STALE_SECONDS', '60'))
+INGEST_APP_JOB_WORKERS = int(os.getenv('INGEST_APP_JOB_WORKERS', '0'))
+
+# Bearer token required by POST /ingest/jobs; when unset, jobs can only be queued from the command line
+INGEST_ADMIN_TOKEN = os.getenv('INGEST_ADMIN_TOKEN', '')
+
+# Staged ingestion pipeline: partitioning processes, concurrent element batches and records per batch, queue bound
+INGEST_PARTITION_WORKERS = int(os.getenv('INGEST_PARTITION_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+INGEST_PROCESS_CONCURRENCY = int(os.getenv('INGEST_PROCESS_CONCURRENCY', '8'))
+INGEST_PROCESS_BATCH_SIZE = int(os.getenv('INGEST_PROCESS_BATCH_SIZE', '64'))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '1000'))
+
+# Partitioned elements are merged into section-aware chunks of at most this many tokens
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '400'))
+
+# Image summarization: concurrency, provider rate limits and the persistent description cache
+IMAGE_SUMMARY_MODEL = os.getenv('IMAGE_SUMMARY_MODEL', 'claude-3-sonnet-20240229')
+IMAGE_SUMMARY_CONCURRENCY = int(os.getenv('IMAGE_SUMMARY_CONCURRENCY', '4'))
+IMAGE_SUMMARY_REQUESTS_PER_MINUTE = float(os.getenv('IMAGE_SUMMARY_REQUESTS_PER_MINUTE', '50'))
+IMAGE_SUMMARY_INPUT_TOKENS_PER_MINUTE = float(os.getenv('IMAGE_SUMMARY_INPUT_TOKENS_PER_MINUTE', '40000'))
+IMAGE_SUMMARY_MAX_RETRIES = int(os.getenv('IMAGE_SUMMARY_MAX_RETRIES', '6'))
+IMAGE_DESCRIPTION_CACHE_PATH = os.getenv('IMAGE_DESCRIPTION_CACHE_PATH', './data/cache/image_descriptions.sqlite3')
+
+# Content-addressed store for extracted images, referenced from the collection by blob id
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', './data/blobs')
+
+# Retrieval backend: "weaviate" (remote cluster) or "local" (memory-mapped index exported by local_index.py;
+# LOCAL_INDEX_DIR may list several comma-separated indexes, searched like several collections)
+RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'weaviate')
+LOCAL_INDEX_DIR = os.getenv('LOCAL_INDEX_DIR', './data/local_index')
+LOCAL_INDEX_NPROBE = int(os.getenv('LOCAL_INDEX_NPROBE', '8'))
+LOCAL_INDEX_ANN_THRESHOLD = int(os.getenv('LOCAL_INDEX_ANN_THRESHOLD', '50000'))
+
+# Prompt context assembly: token budget, near-duplicate threshold and reranking ("mmr", "cross_encoder" or "none")
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+CONTEXT_MAX_CHUNK_TOKENS = int(os.getenv('CONTEXT_MAX_CHUNK_TOKENS', '800'))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.8'))
+CONTEXT_RERANK = os.getenv('CONTEXT_RERANK', 'mmr')
+CONTEXT_MMR_LAMBDA = float(os.getenv('CONTEXT_MMR_LAMBDA', '0.7'))
+CONTEXT_CROSS_ENCODER_MODEL = os.getenv('CONTEXT_CROSS_ENCODER_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+
+# Managed Weaviate client: health checks, timeouts, HTTP pool size and circuit breaker
+WEAVIATE_HEALTH_INTERVAL = float(os.getenv('WEAVIATE_HEALTH_INTERVAL', '15'))
+WEAVIATE_QUERY_TIMEOUT = float(os.getenv('WEAVIATE_QUERY_TIMEOUT', '10'))
+WEAVIATE_POOL_CONNECTIONS = int(os.getenv('WEAVIATE_POOL_CONNECTIONS', '20'))
+WEAVIATE_POOL_MAXSIZE = int(os.getenv('WEAVIATE_POOL_MAXSIZE', '100'))
+WEAVIATE_CIRCUIT_FAILURES = int(os.getenv('WEAVIATE_CIRCUIT_FAILURES', '5'))
+WEAVIATE_CIRCUIT_RESET_TIMEOUT = float(os.getenv('WEAVIATE_CIRCUIT_RESET_TIMEOUT', '30'))
+
+# Worker start-up: frequent questions (one per line) whose embeddings are primed before the worker reports
+# ready on /ready, how long warm-up may take, and the import-to-ready time above which a warning is logged
+WARMUP_QUERIES_PATH = os.getenv('WARMUP_QUERIES_PATH', './data/warmup_queries.txt')
+WARMUP_QUERY_LIMIT = int(os.getenv('WARMUP_QUERY_LIMIT', '100'))
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '20'))
+STARTUP_TARGET_SECONDS = float(os.getenv('STARTUP_TARGET_SECONDS', '5'))
+
+# Upper bound on a single /ask request, including streaming
+ASK_TIMEOUT = float(os.getenv('ASK_TIMEOUT', '120'))
+
+# Fraction of requests whose per-stage timing trace is logged (failed requests are always logged)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+
+# Admission control for /ask: pipelines running at once, requests allowed to wait, and how long they wait
+# before being shed with 429. Identical in-flight questions share one pipeline run when ASK_COALESCE is on.
+ASK_MAX_CONCURRENT = int(os.getenv('ASK_MAX_CONCURRENT', '32'))
+ASK_MAX_QUEUE = int(os.getenv('ASK_MAX_QUEUE', '64'))
+ASK_QUEUE_TIMEOUT = float(os.getenv('ASK_QUEUE_TIMEOUT', '10'))
+ASK_COALESCE = os.getenv('ASK_COALESCE', 'true').lower() == 'true'
+
+# Documents and images served from DATA_DIR (with ETags and Range support) and how long browsers may cache them;
+# cited pages get prerendered thumbnails and single-page PDFs in PAGE_CACHE_DIR (requires PyMuPDF)
+DATA_DIR = os.getenv('DATA_DIR', './data')
+DATA_CACHE_MAX_AGE = int(os.getenv('DATA_CACHE_MAX_AGE', '3600'))
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', './data/cache/pages')
+PAGE_PREVIEWS = os.getenv('PAGE_PREVIEWS', 'true').lower() == 'true'
@@ -0,0 +1,119 @@
+import logging
+import re
+import zlib
+
+import numpy as np
+
+from embedding_batches import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+# Smallest prime above 2**32, the range of the crc32 shingle hashes
+_PRIME = 4294967311
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+# MinHash signatures over word shingles; the fraction of equal slots estimates Jaccard similarity
+class MinHasher:
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str):
+        words = _WORD_PATTERN.findall(text.lower())
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # One universal hash (a*h + b) mod p per permutation
+        permuted = (np.outer(hashes, self.a) + self.b) % _PRIME
+        return permuted.min(axis=0)
+
+    @staticmethod
+    def similarity(first, second) -> float:
+        return float(np.mean(first == second))
+
+
+class _CrossEncoderReranker:
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def scores(self, query, texts):
+        return [float(score) for score in self.model.predict([(query, text) for text in texts])]
+
+
+# Turns raw search hits into a prompt context that fits a token budget:
+# format -> truncate oversized chunks -> drop near-duplicates -> rerank -> greedy pack
+class ContextBuilder:
+    def __init__(self, format_item, token_budget: int = 6000, max_chunk_tokens: int = 800,
+                 dedup_threshold: float = 0.8, rerank: str = "mmr", mmr_lambda: float = 0.7,
+                 cross_encoder_model: str = None):
+        self.format_item = format_item
+        self.token_budget = token_budget
+        self.max_chunk_tokens = max_chunk_tokens
+        self.dedup_threshold = dedup_threshold
+        self.rerank = rerank
+        self.mmr_lambda = mmr_lambda
+        self.minhasher = MinHasher()
+        self._cross_encoder = None
+        if rerank == "cross_encoder":
+            try:
+                self._cross_encoder = _CrossEncoderReranker(cross_encoder_model)
+            except Exception as e:
+                logger.warning(f"Cross-encoder reranker unavailable, falling back to MMR: {str(e)}")
+                self.rerank = "mmr"
+
+    def _relevance(self, query, chunks):
+        if self._cross_encoder is not None:
+            return self._cross_encoder.scores(query, [chunk["text"] for chunk in chunks])
+        # Fused retrieval score when the backend provides one, otherwise the retrieval rank
+        return [chunk["item"].get("_score", 1.0 / (1 + chunk["rank"])) for chunk in chunks]
+
+    # Maximal marginal relevance: trade relevance against similarity to chunks already chosen
+    def _mmr_order(self, chunks, relevance):
+        relevance = np.asarray(relevance, dtype=np.float32)
+        if len(relevance) and relevance.max() > relevance.min():
+            relevance = (relevance - relevance.min()) / (relevance.max() - relevance.min())
+        remaining = list(range(len(chunks)))
+        order = []
+        while remaining:
+            best = max(remaining, key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max(
+                (MinHasher.similarity(chunks[i]["signature"], chunks[j]["signature"]) for j in order), default=0.0))
+            order.append(best)
+            remaining.remove(best)
+        return [chunks[i] for i in order]
+
+    def build(self, query: str, search_results) -> str:
+        chunks = []
+        duplicates = 0
+        for rank, item in enumerate(search_results):
+            text = self.format_item(item)
+            if not text:
+                continue
+            tokens = count_tokens(text)
+            if tokens > self.max_chunk_tokens:
+                text = truncate_to_tokens(text, self.max_chunk_tokens).rstrip() + " ...\n\n"
+                tokens = self.max_chunk_tokens
+            # Compare the content itself, not the shared "Text from <document> (Page ...)" header
+            signature = self.minhasher.signature(item.get('text') or item.get('description') or text)
+            if any(MinHasher.similarity(signature, kept["signature"]) >= self.dedup_threshold for kept in chunks):
+                duplicates += 1
+                continue
+            chunks.append({"item": item, "rank": rank, "text": text, "tokens": tokens, "signature": signature})
+
+        if self.rerank in ("mmr", "cross_encoder"):
+            chunks = self._mmr_order(chunks, self._relevance(query, chunks))
+
+        packed = []
+        used = 0
+        for chunk in chunks:
+            if used + chunk["tokens"] > self.token_budget:
+                continue
+            packed.append(chunk["text"])
+            used += chunk["tokens"]
+
+        logger.info(f"Context: {len(packed)}/{len(search_results)} chunks, {used} tokens "
+                    f"(budget {self.token_budget}), {duplicates} near-duplicates dropped")
+        return "".join(packed)
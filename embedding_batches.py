@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# Limits of the embeddings endpoint for the text-embedding-3 family
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_INPUT = 8191
+
+# The openai SDK is slow to import and only needed once a request has actually failed
+def retryable_errors():
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+_encoding = None
+_encoding_loaded = False
+
+
+# tiktoken is optional and may need to download its BPE file, so fall back to an estimate
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, estimating token counts from length: {str(e)}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Rough fallback of ~4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int = MAX_TOKENS_PER_INPUT) -> str:
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+    return text[:max_tokens * 4]
+
+
+# Group input indices into requests bounded by both input count and total tokens
+def make_batches(texts, max_batch_tokens: int, max_batch_size: int = MAX_INPUTS_PER_REQUEST):
+    batches = []
+    current = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = min(count_tokens(text), MAX_TOKENS_PER_INPUT)
+        if current and (current_tokens + tokens > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Identifies the vectors a model produces: text-embedding-3 vectors shortened with `dimensions`
+# are not interchangeable with full-length ones, so caches and manifests key on both
+def embedding_signature(model: str, dimensions: int = None) -> str:
+    return f"{model}@{dimensions}" if dimensions else model
+
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+async def embed_batch(client, texts, model: str, max_retries: int = 6, base_delay: float = 1.0, dimensions: int = None):
+    # The API rejects empty strings and inputs over the per-input token limit
+    inputs = [truncate_to_tokens(text) if text and text.strip() else " " for text in texts]
+    # Matryoshka-style shortened vectors, computed server-side (text-embedding-3 models only)
+    options = {"dimensions": dimensions} if dimensions else {}
+    attempt = 0
+    while True:
+        try:
+            response = await client.embeddings.create(input=inputs, model=model, **options)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except retryable_errors() as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            # Exponential backoff with full jitter, never shorter than the server's Retry-After
+            delay = max(_retry_after(e), random.uniform(0, base_delay * 2 ** attempt))
+            logger.warning(f"Embedding request failed ({type(e).__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+# Embed many texts with token-aware batching and bounded concurrency; results keep input order
+async def embed_texts(client, texts, model: str, max_batch_tokens: int = 100000, max_batch_size: int = 256,
+                      concurrency: int = 4, max_retries: int = 6, dimensions: int = None):
+    texts = list(texts)
+    vectors = [None] * len(texts)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(indices):
+        async with semaphore:
+            batch_vectors = await embed_batch(client, [texts[i] for i in indices], model,
+                                              max_retries=max_retries, dimensions=dimensions)
+        for index, vector in zip(indices, batch_vectors):
+            vectors[index] = vector
+
+    batches = make_batches(texts, max_batch_tokens, min(max_batch_size, MAX_INPUTS_PER_REQUEST))
+    await asyncio.gather(*[run(indices) for indices in batches])
+    return vectors
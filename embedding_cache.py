@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+
+# Queries that differ only in case, unicode form or whitespace share one cache entry
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+# On-disk backend shared by every worker on the host; vectors are stored as packed float32
+class SQLiteEmbeddingStore:
+    def __init__(self, path: str, ttl: float, max_rows: int = 200000):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connect().execute(
+            "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        vector, created_at = row
+        if self.ttl and time.time() - created_at > self.ttl:
+            return None
+        values = array("f")
+        values.frombytes(vector)
+        return values.tolist()
+
+    def set(self, key: str, model: str, vector):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                (key, model, array("f", vector).tobytes(), time.time()),
+            )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self.prune()
+
+    def prune(self):
+        conn = self._connect()
+        with conn:
+            if self.ttl:
+                conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl,))
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,),
+            )
+
+
+# In-process LRU with TTL, optional disk backend and single-flight for concurrent misses
+class EmbeddingCache:
+    def __init__(self, model: str, maxsize: int = 1000, ttl: float = 0, store: SQLiteEmbeddingStore = None):
+        self.model = model
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _get_memory(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return vector
+
+    def _set_memory(self, key: str, vector):
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            self._entries[key] = (expires_at, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_compute(self, text: str, compute):
+        key = cache_key(text, self.model)
+
+        vector = self._get_memory(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(key)
+        # Futures are bound to their event loop, so only coalesce callers sharing one
+        while inflight is not None and inflight.get_loop() is loop:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+            # The leading request was cancelled (e.g. its client went away), not this one: the first
+            # waiter to get here computes the embedding itself and the others join it
+            inflight = self._inflight.get(key)
+
+        future = loop.create_future()
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            vector = None
+            if self.store is not None:
+                try:
+                    vector = await asyncio.to_thread(self.store.get, key)
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache store read failed: {str(e)}")
+                if vector is not None:
+                    self.disk_hits += 1
+
+            if vector is None:
+                self.misses += 1
+                vector = await compute(text)
+                if self.store is not None:
+                    try:
+                        await asyncio.to_thread(self.store.set, key, self.model, vector)
+                    except sqlite3.Error as e:
+                        logger.warning(f"Embedding cache store write failed: {str(e)}")
+
+            self._set_memory(key, vector)
+            future.set_result(vector)
+            return vector
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
+
+
+def cached_embedding(cache: EmbeddingCache):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(text):
+            return await cache.get_or_compute(text, func)
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def create_embedding_cache(model: str, maxsize: int, ttl: float, path: str = None, max_rows: int = 200000):
+    store = SQLiteEmbeddingStore(path, ttl, max_rows) if path else None
+    return EmbeddingCache(model, maxsize=maxsize, ttl=ttl, store=store)
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from local_index import LocalIndex, LocalIndexWriter, QUANTIZATIONS
+
+logger = logging.getLogger(__name__)
+
+# Measures what shortened and quantized vectors cost in recall on our own corpus. Every variant is
+# built as a real local index from a full-precision export and searched through LocalIndex, so the
+# numbers match what the app would serve; recall@k is measured against exact full-precision search.
+#   python local_index.py --out ./data/local_index
+#   python embedding_recall.py --index ./data/local_index --queries questions.txt \
+#       --dimensions 256 1024 3072 --quantization none int8 binary --rescore-factors 0 4
+# Without --queries, stored vectors of randomly sampled objects are used as queries (excluding the object itself).
+
+
+async def embed_questions(path: str, model: str):
+    from openai import AsyncOpenAI
+    from embedding_batches import embed_texts
+
+    with open(path, 'r') as file:
+        questions = [line.strip() for line in file if line.strip()]
+    client = AsyncOpenAI()
+    try:
+        # Full-length vectors; each variant truncates them to its own dimensions
+        return np.asarray(await embed_texts(client, questions, model), dtype=np.float32)
+    finally:
+        await client.close()
+
+
+def build_variant(source: LocalIndex, path: str, dimensions: int, quantization: str):
+    writer = LocalIndexWriter(path, source.dim, dimensions)
+    for doc_id in range(source.count):
+        writer.add(source.objects[doc_id], source.vectors[doc_id])
+    writer.finish(quantization=quantization)
+
+
+def ranked_ids(index: LocalIndex, query_vector, k: int, exclude=None):
+    hits = index.vector_search(query_vector, k + (exclude is not None))
+    ranked = sorted(hits.items(), key=lambda hit: hit[1], reverse=True)
+    return [doc_id for doc_id, _ in ranked if doc_id != exclude][:k]
+
+
+def measure(index: LocalIndex, queries, exclude, truth, k: int):
+    recalls = []
+    started = time.perf_counter()
+    for query_vector, own, expected in zip(queries, exclude, truth):
+        found = ranked_ids(index, query_vector, k, own)
+        recalls.append(len(set(found) & set(expected)) / max(len(expected), 1))
+    elapsed = time.perf_counter() - started
+    first_pass_bytes = index.quantized.nbytes() if index.quantized is not None else index.count * index.dim * 4
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "ms_per_query": round(1000 * elapsed / max(len(queries), 1), 3),
+        "first_pass_bytes_per_vector": round(first_pass_bytes / max(index.count, 1), 1),
+        "first_pass_mb": round(first_pass_bytes / 2 ** 20, 2),
+    }
+
+
+async def run(args):
+    # Exact search over every full-precision vector, whatever the exported index was built with
+    baseline = LocalIndex(args.index, ann_threshold=float("inf"))
+    baseline.quantized = None
+
+    if args.queries:
+        queries = await embed_questions(args.queries, args.model)
+        exclude = [None] * len(queries)
+    else:
+        rng = np.random.default_rng(args.seed)
+        sample = rng.choice(baseline.count, size=min(args.sample, baseline.count), replace=False)
+        queries = np.asarray(baseline.vectors[np.sort(sample)])
+        exclude = [int(doc_id) for doc_id in np.sort(sample)]
+    truth = [ranked_ids(baseline, query_vector, args.k, own) for query_vector, own in zip(queries, exclude)]
+    logger.info(f"Measuring {len(queries)} queries against {baseline.count} objects ({baseline.dim} dimensions)")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for dimensions in args.dimensions or [baseline.dim]:
+            for quantization in args.quantization:
+                path = os.path.join(workdir, f"{dimensions}-{quantization}")
+                build_variant(baseline, path, dimensions, quantization)
+                for rescore_factor in (args.rescore_factors if quantization != "none" else [0]):
+                    index = LocalIndex(path, ann_threshold=float("inf"), rescore_factor=rescore_factor)
+                    result = {"dimensions": index.dim, "quantization": quantization, "rescore_factor": rescore_factor}
+                    result.update(measure(index, queries, exclude, truth, args.k))
+                    logger.info(json.dumps(result))
+                    results.append(result)
+    return {"objects": baseline.count, "queries": len(queries), "k": args.k, "results": results}
+
+
+def main():
+    from config import EMBEDDING_MODEL, LOCAL_INDEX_DIR
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Recall of shortened and quantized embeddings against full precision")
+    parser.add_argument("--index", default=LOCAL_INDEX_DIR, help="Local index exported with full-precision vectors")
+    parser.add_argument("--queries", help="Questions to embed, one per line")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--sample", type=int, default=200, help="Stored vectors used as queries without --queries")
+    parser.add_argument("--dimensions", type=int, nargs="+")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, nargs="+", default=list(QUANTIZATIONS))
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[0, 4])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import time
+import zlib
+
+import numpy as np
+from aiohttp import web
+
+from local_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Local stand-ins for the OpenAI embeddings/chat and Anthropic messages APIs, for benchmarks.
+# Point the SDKs at them with OPENAI_BASE_URL=http://host:port/v1 and ANTHROPIC_BASE_URL=http://host:port.
+
+ANSWER_TEMPLATE = (
+    "The {topic} integrates programmable logic, processing cores and high-speed transceivers, which lets designers "
+    "trade latency against throughput per workload. Its memory subsystem and network on chip keep data movement "
+    "off the critical path.\n\nPower and thermal behaviour depend on the process node and the configured clocks, "
+    "so the datasheet figures should be read together with the operating conditions.\n\n"
+    "Top 5 most relevant sources used to generate the response:\n"
+    "1. Text from {document} (Page 1, Paragraph 0)\n2. Text from {document} (Page 2, Paragraph 5)\n"
+    "3. Image Description from {document} (Page 3, Path: ./data/images/figure-3.png)\n"
+    "4. Text from {document} (Page 4, Paragraph 12)\n5. Text from {document} (Page 5, Paragraph 17)"
+)
+
+FOLLOW_UPS = "1. How does the power envelope change at higher clock rates?\n2. Which interfaces share the transceiver lanes?"
+
+
+# Hashed bag-of-words vectors: deterministic, and texts sharing words land close together, so a
+# local index built from them gives retrieval results that behave like real ones
+def fake_embedding(text: str, dim: int = 256):
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(text):
+        rng = np.random.default_rng(zlib.crc32(token.encode('utf-8')))
+        vector += rng.standard_normal(dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+def _rough_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeServices:
+    def __init__(self, embedding_dim: int = 256, embedding_latency: float = 0.05, embedding_latency_per_input: float = 0.001,
+                 chat_first_token_latency: float = 0.4, chat_token_interval: float = 0.02, completion_latency: float = 0.5,
+                 vision_latency: float = 1.5, error_rate: float = 0.0, seed: int = 0):
+        self.embedding_dim = embedding_dim
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_input = embedding_latency_per_input
+        self.chat_first_token_latency = chat_first_token_latency
+        self.chat_token_interval = chat_token_interval
+        self.completion_latency = completion_latency
+        self.vision_latency = vision_latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = {"embeddings": 0, "embedding_inputs": 0, "chat_stream": 0, "chat": 0, "vision": 0,
+                         "rate_limited": 0}
+
+    def app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    # Simulated provider throttling, so client retry/backoff paths are part of the measurement
+    def _rate_limited(self):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.requests["rate_limited"] += 1
+            return web.json_response({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                                     status=429, headers={"retry-after": "0.2"})
+        return None
+
+    async def embeddings(self, request):
+        if (limited := self._rate_limited()) is not None:
+            return limited
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.requests["embeddings"] += 1
+        self.requests["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(self.embedding_latency + self.embedding_latency_per_input * len(inputs))
+        dim = body.get("dimensions") or self.embedding_dim
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text if isinstance(text, str) else " ".join(map(str, text)), dim)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode('ascii')
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(_rough_tokens(text) if isinstance(text, str) else len(text) for text in inputs)
+        return web.json_response({"object": "list", "data": data, "model": body.get("model"),
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def chat_completions(self, request):
+        if (limited := self._rate_limited()) is not None:
+            return limited
+        body = await request.json()
+        prompt_tokens = sum(_rough_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+        created = int(time.time())
+        if not body.get("stream"):
+            self.requests["chat"] += 1
+            await asyncio.sleep(self.completion_latency)
+            return web.json_response({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": FOLLOW_UPS}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _rough_tokens(FOLLOW_UPS),
+                          "total_tokens": prompt_tokens + _rough_tokens(FOLLOW_UPS)}
+            })
+
+        self.requests["chat_stream"] += 1
+        answer = ANSWER_TEMPLATE.format(topic="Versal Adaptive SoC", document="0000 - Versal Adaptive SoC - Data Sheet.pdf")
+        # Roughly one token per word, like the real stream's cadence
+        pieces = [word + " " for word in answer.split(" ")]
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        def chunk(delta, finish_reason=None):
+            return {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        async def send(payload):
+            await response.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+
+        await asyncio.sleep(self.chat_first_token_latency)
+        await send(chunk({"role": "assistant", "content": ""}))
+        for piece in pieces:
+            await send(chunk({"content": piece}))
+            await asyncio.sleep(self.chat_token_interval)
+        await send(chunk({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                        "model": body.get("model"), "choices": [],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                                  "total_tokens": prompt_tokens + len(pieces)}})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def messages(self, request):
+        if (limited := self._rate_limited()) is not None:
+            return limited
+        body = await request.json()
+        self.requests["vision"] += 1
+        await asyncio.sleep(self.vision_latency)
+        text = ("Bar chart comparing throughput of several FPGA and SoC configurations across process nodes; "
+                "the tallest bar corresponds to the configuration with the widest memory interface.")
+        return web.json_response({
+            "id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model"),
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 1600, "output_tokens": _rough_tokens(text)}
+        })
+
+    async def stats(self, request):
+        return web.json_response(self.requests)
+
+
+async def start_fake_services(host: str = "127.0.0.1", port: int = 0, **options):
+    services = FakeServices(**options)
+    runner = web.AppRunner(services.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    logger.info(f"Fake OpenAI/Anthropic services listening on http://{host}:{port}")
+    return services, runner, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve fake OpenAI and Anthropic endpoints for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--first-token-latency", type=float, default=0.4)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    parser.add_argument("--completion-latency", type=float, default=0.5)
+    parser.add_argument("--vision-latency", type=float, default=1.5)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    async def serve():
+        await start_fake_services(
+            args.host, args.port,
+            embedding_dim=args.embedding_dim,
+            embedding_latency=args.embedding_latency,
+            chat_first_token_latency=args.first_token_latency,
+            chat_token_interval=args.token_interval,
+            completion_latency=args.completion_latency,
+            vision_latency=args.vision_latency,
+            error_rate=args.error_rate
+        )
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
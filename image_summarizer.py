@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import random
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rough input-token cost of one datasheet figure, used only for client-side rate limiting
+ESTIMATED_IMAGE_TOKENS = 1600
+
+
+# Async token bucket: refills continuously at `rate` per second up to `capacity`
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+# Descriptions keyed by image content hash, model and prompt, so re-runs never pay twice for a figure
+class DescriptionCache:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                "key TEXT PRIMARY KEY, description TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connect().execute("SELECT description FROM descriptions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, description: str):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, description, created_at) VALUES (?, ?, ?)",
+                (key, description, time.time()),
+            )
+
+
+def media_type_for(image_path: str) -> str:
+    media_type, _ = mimetypes.guess_type(image_path or "")
+    return media_type if media_type in ("image/jpeg", "image/png", "image/gif", "image/webp") else "image/jpeg"
+
+
+class ImageSummarizer:
+    def __init__(self, client, model: str, max_tokens: int = 1000, concurrency: int = 4,
+                 requests_per_minute: float = 50, input_tokens_per_minute: float = 40000, max_retries: int = 6,
+                 cache: DescriptionCache = None):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._requests = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute / 60))
+        self._input_tokens = TokenBucket(input_tokens_per_minute / 60, input_tokens_per_minute / 60 * 5)
+        self.cache_hits = 0
+        self.calls = 0
+
+    def cache_key(self, image_hash: str, prompt: str) -> str:
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{self.model}\x00{prompt_hash}\x00{image_hash}".encode('utf-8')).hexdigest()
+
+    async def summarize(self, img_base64: str, prompt: str, image_hash: str = None, media_type: str = "image/jpeg"):
+        image_hash = image_hash or hashlib.sha256(img_base64.encode('ascii')).hexdigest()
+        key = self.cache_key(image_hash, prompt)
+        if self.cache is not None:
+            description = await asyncio.to_thread(self.cache.get, key)
+            if description is not None:
+                self.cache_hits += 1
+                return description
+
+        async with self._semaphore:
+            description = await self._create_with_retries(img_base64, prompt, media_type)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, description)
+        return description
+
+    async def _create_with_retries(self, img_base64, prompt, media_type):
+        # Imported on first use, so importing the ingestion module does not pay for the SDK
+        import anthropic
+
+        attempt = 0
+        while True:
+            await self._requests.acquire()
+            await self._input_tokens.acquire(ESTIMATED_IMAGE_TOKENS + len(prompt) // 4)
+            try:
+                self.calls += 1
+                message = await self.client.messages.create(
+                    model=self.model,
+                    max_tokens=self.max_tokens,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {
+                                    "type": "image",
+                                    "source": {
+                                        "type": "base64",
+                                        "media_type": media_type,
+                                        "data": img_base64
+                                    }
+                                }
+                            ]
+                        }
+                    ]
+                )
+                return message.content[0].text
+            except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
+                # Retry connection problems, rate limits and 5xx/overloaded responses only
+                if isinstance(e, anthropic.APIStatusError) and e.status_code != 429 and e.status_code < 500:
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                delay = random.uniform(0, min(60, 2 ** attempt))
+                response = getattr(e, "response", None)
+                if response is not None and response.headers.get("retry-after"):
+                    try:
+                        delay = max(delay, float(response.headers["retry-after"]))
+                    except ValueError:
+                        pass
+                logger.warning(f"Image summarization failed ({type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
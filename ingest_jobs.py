@@ -0,0 +1,293 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pdf_dir TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    prompt_file TEXT NOT NULL,
+    category TEXT,
+    force INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    documents_total INTEGER NOT NULL DEFAULT 0,
+    documents_done INTEGER NOT NULL DEFAULT 0,
+    documents_failed INTEGER NOT NULL DEFAULT 0,
+    elements_processed INTEGER NOT NULL DEFAULT 0,
+    elements_written INTEGER NOT NULL DEFAULT 0,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_documents (
+    job_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    upserted INTEGER NOT NULL DEFAULT 0,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, path)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (job_id, uuid)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_by_document ON checkpoints (job_id, path);
+"""
+
+UNFINISHED = ("pending", "running")
+
+
+# Durable queue of ingestion runs. Besides the job itself it keeps, per job, every element written to
+# the collection (by UUID and content hash) and every finished document, so a job interrupted after
+# hours of vision summarization resumes where it stopped instead of starting over. Several processes
+# (the app and standalone workers) can share one database; claiming a job is a single write transaction.
+class IngestJobStore:
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        # The pipeline writes checkpoints from its writer thread, so the connection is shared under a lock
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _write(self, sql, params=()):
+        with self._lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    # Submitting the same work again while it is still queued or running returns the existing job;
+    # returns (job_id, created)
+    def submit(self, pdf_dir, output_dir, collection, prompt_file, category=None, force=False):
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE pdf_dir = ? AND output_dir = ? AND collection = ? AND prompt_file = ? "
+                "AND category IS ? AND force = ? AND status IN ('pending', 'running') ORDER BY id LIMIT 1",
+                (pdf_dir, output_dir, collection, prompt_file, category, int(force))).fetchone()
+            if row is not None:
+                return row["id"], False
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (pdf_dir, output_dir, collection, prompt_file, category, force, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (pdf_dir, output_dir, collection, prompt_file, category, int(force), time.time()))
+            return cursor.lastrowid, True
+
+    def get(self, job_id):
+        rows = self._read("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+    # Takes the oldest pending job, or a running one whose worker stopped sending heartbeats (it crashed
+    # or was killed) so that it resumes from its checkpoints. Jobs out of attempts are marked failed.
+    def claim(self, stale_after: float = 60, max_attempts: int = 3):
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self.conn.execute(
+                        "SELECT * FROM jobs WHERE status = 'pending' OR (status = 'running' AND heartbeat_at < ?) "
+                        "ORDER BY id LIMIT 1", (now - stale_after,)).fetchone()
+                    if row is None or row["attempts"] < max_attempts:
+                        break
+                    self.conn.execute("UPDATE jobs SET status = 'failed', error = COALESCE(error, ?), finished_at = ? "
+                                      "WHERE id = ?", (f"Gave up after {row['attempts']} attempts", now, row["id"]))
+                if row is not None:
+                    if row["status"] == "running":
+                        logger.warning(f"Ingestion job {row['id']} stopped sending heartbeats, resuming it")
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                        "heartbeat_at = ? WHERE id = ?", (now, now, row["id"]))
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_id):
+        self._write("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id))
+
+    # Back to the queue without counting the attempt, e.g. when the worker shuts down
+    def release(self, job_id):
+        self._write("UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = 'running'",
+                    (job_id,))
+
+    # The manifest now records everything, so the job's checkpoints are no longer needed
+    def complete(self, job_id):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE jobs SET status = 'done', error = NULL, finished_at = ? WHERE id = ?", (time.time(), job_id))
+            self.conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    # A retried job keeps its checkpoints and picks up from them
+    def fail(self, job_id, error, retry=True):
+        self._write("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                    ("pending" if retry else "failed", error[:500], None if retry else time.time(), job_id))
+
+    def has_unfinished(self) -> bool:
+        return bool(self._read("SELECT 1 FROM jobs WHERE status IN ('pending', 'running') LIMIT 1"))
+
+    def progress(self, job_id):
+        return JobProgress(self, job_id)
+
+    # Unfinished jobs and the most recent finished ones, for the status endpoint
+    def summary(self, recent: int = 5):
+        counts = dict(self._read("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        rows = self._read(
+            "SELECT * FROM jobs WHERE status IN ('pending', 'running') "
+            "UNION ALL SELECT * FROM (SELECT * FROM jobs WHERE status NOT IN ('pending', 'running') ORDER BY id DESC LIMIT ?) "
+            "ORDER BY id DESC", (recent,))
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["percent"] = round(100 * job["documents_done"] / job["documents_total"], 1) if job["documents_total"] else None
+            jobs.append(job)
+        return {"active": sum(counts.get(status, 0) for status in UNFINISHED), "counts": counts, "jobs": jobs}
+
+    def close(self):
+        self.conn.close()
+
+
+# Checkpoints and progress counters of one running job, as used by process_pdf_directory
+class JobProgress:
+    def __init__(self, store: IngestJobStore, job_id: int):
+        self.store = store
+        self.job_id = job_id
+
+    # Documents that need processing; on a resumed job the ones already known keep their status
+    def start(self, paths):
+        with self.store._lock, self.store.conn:
+            self.store.conn.executemany("INSERT OR IGNORE INTO job_documents (job_id, path) VALUES (?, ?)",
+                                        [(self.job_id, path) for path in paths])
+            self.store.conn.execute(
+                "UPDATE jobs SET documents_total = (SELECT COUNT(*) FROM job_documents WHERE job_id = ?) WHERE id = ?",
+                (self.job_id, self.job_id))
+
+    def completed_documents(self):
+        rows = self.store._read("SELECT path FROM job_documents WHERE job_id = ? AND status = 'done'", (self.job_id,))
+        return {row["path"] for row in rows}
+
+    # Elements of a document already written by this job, as {uuid: content_hash}
+    def written(self, path):
+        rows = self.store._read("SELECT uuid, content_hash FROM checkpoints WHERE job_id = ? AND path = ?",
+                                (self.job_id, path))
+        return {row["uuid"]: row["content_hash"] for row in rows}
+
+    def processed(self, count):
+        self.store._write("UPDATE jobs SET elements_processed = elements_processed + ? WHERE id = ?", (count, self.job_id))
+
+    # Called once a batch of items is in the collection
+    def record_written(self, items):
+        with self.store._lock, self.store.conn:
+            self.store.conn.executemany(
+                "INSERT OR REPLACE INTO checkpoints (job_id, path, uuid, content_hash) VALUES (?, ?, ?, ?)",
+                [(self.job_id, item["data"]["source_document"], item["uuid"], item["content_hash"]) for item in items])
+            self.store.conn.execute("UPDATE jobs SET elements_written = elements_written + ? WHERE id = ?",
+                                    (len(items), self.job_id))
+
+    def document_done(self, path, upserted=0, unchanged=0, removed=0):
+        with self.store._lock, self.store.conn:
+            cursor = self.store.conn.execute(
+                "UPDATE job_documents SET status = 'done', upserted = ?, unchanged = ?, removed = ? "
+                "WHERE job_id = ? AND path = ? AND status != 'done'", (upserted, unchanged, removed, self.job_id, path))
+            if cursor.rowcount:
+                self.store.conn.execute("UPDATE jobs SET documents_done = documents_done + 1 WHERE id = ?", (self.job_id,))
+                self._count_failed()
+
+    # A document the pipeline had to skip (e.g. a corrupt PDF); the next attempt or run tries it again
+    def document_failed(self, path, error):
+        with self.store._lock, self.store.conn:
+            self.store.conn.execute(
+                "UPDATE job_documents SET status = 'failed', error = ? WHERE job_id = ? AND path = ? AND status != 'done'",
+                (str(error), self.job_id, path))
+            self._count_failed()
+
+    def _count_failed(self):
+        self.store.conn.execute(
+            "UPDATE jobs SET documents_failed = "
+            "(SELECT COUNT(*) FROM job_documents WHERE job_id = ? AND status = 'failed') WHERE id = ?",
+            (self.job_id, self.job_id))
+
+
+# Runs queued jobs, at most `workers` at a time in this process. While a job runs its heartbeat is
+# refreshed; a failed job goes back to the queue until it has used max_attempts.
+#   run_job(job, progress)   (async; job is the row as a dict, progress its JobProgress)
+class IngestJobRunner:
+    def __init__(self, store: IngestJobStore, run_job, workers: int = 1, poll_interval: float = 5,
+                 heartbeat_interval: float = 15, stale_after: float = 60, max_attempts: int = 3):
+        self.store = store
+        self.run_job = run_job
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await asyncio.to_thread(self.store.heartbeat, job_id)
+
+    # Returns whether the job succeeded
+    async def _run(self, job):
+        logger.info(f"Starting ingestion job {job['id']} for {job['pdf_dir']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            await self.run_job(job, await asyncio.to_thread(self.store.progress, job["id"]))
+        except asyncio.CancelledError:
+            # Shutting down: the job is resumed from its checkpoints by the next worker
+            logger.info(f"Ingestion job {job['id']} interrupted, releasing it")
+            # Synchronous on purpose: an await here could be cancelled again before the job is released
+            self.store.release(job["id"])
+            raise
+        except Exception as e:
+            retry = job["attempts"] < self.max_attempts
+            logger.error(f"Ingestion job {job['id']} failed{', will retry' if retry else ''}: {str(e)}", exc_info=True)
+            await asyncio.to_thread(self.store.fail, job["id"], str(e), retry=retry)
+            return False
+        else:
+            await asyncio.to_thread(self.store.complete, job["id"])
+            logger.info(f"Ingestion job {job['id']} finished")
+            return True
+        finally:
+            heartbeat.cancel()
+
+    # until_idle returns once no job is queued or running anywhere, otherwise the runner polls forever
+    async def run(self, until_idle: bool = False):
+        async def worker():
+            while True:
+                job = await asyncio.to_thread(self.store.claim, self.stale_after, self.max_attempts)
+                if job is not None:
+                    # Back off before the next claim after a failure, which may be the same job again
+                    if not await self._run(job):
+                        await asyncio.sleep(self.poll_interval)
+                    continue
+                if until_idle and not await asyncio.to_thread(self.store.has_unfinished):
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, self.workers))))
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(value) -> str:
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return hashlib.sha256(value).hexdigest()
+
+
+# Records what has already been ingested for every PDF: file hash and stat, the embedding
+# model and chunking settings used, and the content hash of every object written to the collection (by UUID).
+# Concurrent ingestion jobs share one instance and call it from worker threads, so changes and saves
+# are serialized under a lock.
+class IngestManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.documents = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data.get("version") == MANIFEST_VERSION:
+                self.documents = data.get("documents", {})
+            else:
+                logger.warning(f"Ignoring manifest {path} with unsupported version {data.get('version')}")
+
+    def get(self, pdf_path: str):
+        return self.documents.get(pdf_path)
+
+    # Cheap check first (size + mtime), then the content hash; returns (unchanged, sha256)
+    def check(self, pdf_path: str, embedding_model: str, chunking: str = None):
+        entry = self.documents.get(pdf_path)
+        stat = os.stat(pdf_path)
+        if not self._compatible(entry, embedding_model, chunking):
+            return False, None
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            return True, entry["sha256"]
+        sha256 = file_sha256(pdf_path)
+        if sha256 == entry.get("sha256"):
+            # Touched but not modified; remember the new mtime so the next run stays cheap
+            with self._lock:
+                entry["mtime"] = stat.st_mtime
+            return True, sha256
+        return False, sha256
+
+    # A different embedding model or chunker means none of the recorded objects can be reused
+    def _compatible(self, entry, embedding_model: str, chunking: str = None):
+        return (entry is not None and entry.get("embedding_model") == embedding_model
+                and entry.get("chunking") == chunking)
+
+    def previous_elements(self, pdf_path: str, embedding_model: str, chunking: str = None):
+        entry = self.documents.get(pdf_path)
+        if not self._compatible(entry, embedding_model, chunking):
+            return {}
+        return dict(entry.get("elements", {}))
+
+    def update(self, pdf_path: str, sha256: str, embedding_model: str, elements, chunking: str = None):
+        stat = os.stat(pdf_path)
+        entry = {
+            "sha256": sha256 or file_sha256(pdf_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "embedding_model": embedding_model,
+            "chunking": chunking,
+            "elements": dict(elements),
+        }
+        with self._lock:
+            self.documents[pdf_path] = entry
+
+    def remove(self, pdf_path: str):
+        with self._lock:
+            return self.documents.pop(pdf_path, None)
+
+    # A snapshot of (pdf_path, entry) pairs that is safe to iterate while other jobs update the manifest
+    def items(self):
+        with self._lock:
+            return list(self.documents.items())
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w') as file:
+                json.dump({"version": MANIFEST_VERSION, "documents": self.documents}, file)
+            os.replace(tmp_path, self.path)
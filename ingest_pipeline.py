@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def record(self, items, elapsed):
+        self.items += items
+        self.busy_seconds += elapsed
+
+    def summary(self):
+        wall = time.monotonic() - self.started_at
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "items_per_second": round(self.items / wall, 2) if wall > 0 else 0.0,
+        }
+
+
+# Tracks one PDF through the pipeline; it is finalized once every element has been
+# either skipped as unchanged or written to the collection
+class DocumentState:
+    def __init__(self, path, sha256=None, previous_elements=None):
+        self.path = path
+        self.sha256 = sha256
+        self.previous_elements = previous_elements or {}
+        self.element_hashes = {}
+        self.upserted = 0
+        self.unchanged = 0
+        self.pending = 0
+        self.partitioned = False
+        self.finalized = False
+
+    def ready(self):
+        return self.partitioned and self.pending == 0 and not self.finalized
+
+
+# partition -> process -> embed -> write, connected by bounded queues so a slow stage
+# applies backpressure upstream instead of letting elements pile up in memory.
+#   partition(path) -> list of records          (sync, runs in a process pool)
+#   process(doc, records) -> list of items      (async, one batch of a document's records at a time;
+#                                                an item has type/uuid/content_hash/data, or is None)
+#   embed(items) -> list of vectors             (async)
+#   write(items, vectors)                       (sync, runs in a thread)
+#   finalize(doc)                               (async, once per document)
+#   on_error(doc, error)                        (async, optional; a document that failed to partition,
+#                                                which is skipped and never finalized)
+class IngestPipeline:
+    def __init__(self, partition, process, embed, write, finalize, partition_workers=2, process_concurrency=8,
+                 process_batch_size=64, embed_concurrency=2, queue_size=1000, batch_size=500, batch_wait=0.5, progress_interval=30,
+                 on_error=None):
+        self.partition = partition
+        self.process = process
+        self.embed = embed
+        self.write = write
+        self.finalize = finalize
+        self.on_error = on_error
+        self.failed = []
+        self.partition_workers = partition_workers
+        self.process_concurrency = process_concurrency
+        self.process_batch_size = process_batch_size
+        self.embed_concurrency = embed_concurrency
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.progress_interval = progress_interval
+        self.stats = {name: StageStats(name) for name in ("partition", "process", "embed", "write")}
+
+    async def _complete(self, doc, count=1):
+        doc.pending -= count
+        if doc.ready():
+            doc.finalized = True
+            await self.finalize(doc)
+
+    async def _partition_worker(self, pool, documents, elements):
+        loop = asyncio.get_running_loop()
+        while True:
+            doc = await documents.get()
+            if doc is _DONE:
+                return
+            started = time.monotonic()
+            try:
+                records = await loop.run_in_executor(pool, self.partition, doc.path)
+            except Exception as e:
+                # One corrupt PDF must not abort the run; it stays out of the manifest and is retried next time
+                logger.error(f"Failed to partition {doc.path}, skipping it: {str(e)}")
+                self.failed.append(doc.path)
+                if self.on_error is not None:
+                    await self.on_error(doc, e)
+                continue
+            self.stats["partition"].record(1, time.monotonic() - started)
+            logger.info(f"Partitioned {doc.path} into {len(records)} elements")
+            doc.pending += len(records)
+            for start in range(0, len(records), self.process_batch_size):
+                await elements.put((doc, records[start:start + self.process_batch_size]))
+            doc.partitioned = True
+            if doc.ready():
+                doc.finalized = True
+                await self.finalize(doc)
+
+    async def _process_worker(self, elements, to_embed):
+        while True:
+            entry = await elements.get()
+            if entry is _DONE:
+                return
+            doc, records = entry
+            started = time.monotonic()
+            items = await self.process(doc, records)
+            self.stats["process"].record(len(records), time.monotonic() - started)
+            skipped = 0
+            for item in items:
+                if item is None:
+                    skipped += 1
+                    continue
+                doc.element_hashes[item["uuid"]] = item["content_hash"]
+                if item["data"] is None:
+                    doc.unchanged += 1
+                    skipped += 1
+                else:
+                    await to_embed.put((doc, item))
+            if skipped:
+                await self._complete(doc, skipped)
+
+    async def _next_batch(self, to_embed):
+        entry = await to_embed.get()
+        if entry is _DONE:
+            return None
+        batch = [entry]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(to_embed.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if entry is _DONE:
+                # Leave the sentinel for this worker's next call
+                to_embed.put_nowait(_DONE)
+                break
+            batch.append(entry)
+        return batch
+
+    async def _embed_worker(self, to_embed, to_write):
+        while True:
+            batch = await self._next_batch(to_embed)
+            if batch is None:
+                return
+            started = time.monotonic()
+            vectors = await self.embed([item for _, item in batch])
+            self.stats["embed"].record(len(batch), time.monotonic() - started)
+            await to_write.put((batch, vectors))
+
+    async def _write_worker(self, to_write):
+        while True:
+            entry = await to_write.get()
+            if entry is _DONE:
+                return
+            batch, vectors = entry
+            started = time.monotonic()
+            await asyncio.to_thread(self.write, [item for _, item in batch], vectors)
+            self.stats["write"].record(len(batch), time.monotonic() - started)
+            for doc, _ in batch:
+                doc.upserted += 1
+                await self._complete(doc)
+
+    async def _report_progress(self, queues):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self.log_stats(queues)
+
+    def log_stats(self, queues=None):
+        parts = [f"{name}: {stats.items} ({stats.summary()['items_per_second']}/s)" for name, stats in self.stats.items()]
+        if queues:
+            parts.append("queued " + ", ".join(f"{name}={queue.qsize()}" for name, queue in queues.items()))
+        logger.info("Ingest pipeline - " + "; ".join(parts))
+
+    async def run(self, documents):
+        documents_q = asyncio.Queue()
+        elements_q = asyncio.Queue(self.queue_size)
+        embed_q = asyncio.Queue(self.queue_size)
+        write_q = asyncio.Queue(max(2, self.embed_concurrency * 2))
+        for doc in documents:
+            documents_q.put_nowait(doc)
+        for _ in range(self.partition_workers):
+            documents_q.put_nowait(_DONE)
+
+        queues = {"elements": elements_q, "embed": embed_q, "write": write_q}
+        progress = asyncio.create_task(self._report_progress(queues))
+        # Shut down explicitly rather than with a with block: its shutdown(wait=True) would block the event
+        # loop on cancellation until every in-flight partition finished
+        pool = ProcessPoolExecutor(max_workers=self.partition_workers)
+        try:
+            # Each stage shuts down its consumers once all of its own workers have drained
+            async def stage(workers, downstream, consumers):
+                await asyncio.gather(*workers)
+                for _ in range(consumers):
+                    await downstream.put(_DONE)
+
+            async with asyncio.TaskGroup() as group:
+                group.create_task(stage(
+                    [self._partition_worker(pool, documents_q, elements_q) for _ in range(self.partition_workers)],
+                    elements_q, self.process_concurrency))
+                group.create_task(stage(
+                    [self._process_worker(elements_q, embed_q) for _ in range(self.process_concurrency)],
+                    embed_q, self.embed_concurrency))
+                group.create_task(stage(
+                    [self._embed_worker(embed_q, write_q) for _ in range(self.embed_concurrency)],
+                    write_q, 1))
+                group.create_task(self._write_worker(write_q))
+        except BaseException:
+            # Cancelled or failed: drop queued partitions and let running ones finish in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        else:
+            await asyncio.to_thread(pool.shutdown)
+        finally:
+            progress.cancel()
+        self.log_stats()
+        return {name: stats.summary() for name, stats in self.stats.items()}
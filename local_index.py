@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from retrieval import RetrievalBackend, SearchFilters, SEARCH_PROPERTIES
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Hybrid search scores this many candidates from each of the vector and keyword searches
+FUSION_CANDIDATES = 100
+
+# Object properties kept as columns for metadata prefilters
+FILTER_COLUMNS = ("source_document", "content_type", "category")
+
+
+def tokenize(text: str):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def searchable_text(properties) -> str:
+    return " ".join(str(properties.get(key) or "") for key in ("text", "description", "table_content"))
+
+
+# Min-max normalization used by Weaviate's relativeScoreFusion
+def _normalize_scores(scores):
+    if not scores:
+        return {}
+    values = np.fromiter(scores.values(), dtype=np.float32)
+    low, high = float(values.min()), float(values.max())
+    if high == low:
+        return {doc_id: 1.0 for doc_id in scores}
+    return {doc_id: (score - low) / (high - low) for doc_id, score in scores.items()}
+
+
+def fuse_scores(vector_hits, keyword_hits, alpha: float, limit: int):
+    vector_scores = _normalize_scores(vector_hits)
+    keyword_scores = _normalize_scores(keyword_hits)
+    fused = {}
+    for doc_id in set(vector_scores) | set(keyword_scores):
+        fused[doc_id] = alpha * vector_scores.get(doc_id, 0.0) + (1 - alpha) * keyword_scores.get(doc_id, 0.0)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+# Okapi BM25 over the text, description and table content of every object (k1/b match Weaviate's defaults)
+class BM25Index:
+    def __init__(self, documents, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(lambda: defaultdict(int))
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, text in enumerate(documents):
+            tokens = tokenize(text)
+            lengths[doc_id] = len(tokens)
+            for token in tokens:
+                postings[token][doc_id] += 1
+        self.count = len(documents)
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if self.count else 0.0
+        self.postings = {}
+        for token, counts in postings.items():
+            doc_ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            frequencies = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            idf = math.log(1 + (self.count - len(counts) + 0.5) / (len(counts) + 0.5))
+            self.postings[token] = (doc_ids, frequencies, idf)
+
+    # mask (a boolean array over documents) restricts the results to the documents it allows
+    def search(self, query: str, k: int, mask=None):
+        if not self.count:
+            return {}
+        scores = np.zeros(self.count, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / max(self.average_length, 1e-9))
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            doc_ids, frequencies, idf = posting
+            scores[doc_ids] += idf * frequencies * (self.k1 + 1) / (frequencies + norm[doc_ids])
+        if mask is not None:
+            scores[~mask] = 0
+        top = _top_k(scores, k)
+        return {int(doc_id): float(scores[doc_id]) for doc_id in top if scores[doc_id] > 0}
+
+
+# Inverted-file ANN: vectors are bucketed by their nearest k-means centroid and a query only
+# scores the buckets of its `nprobe` closest centroids
+class IVFIndex:
+    def __init__(self, centroids, assignments):
+        self.centroids = centroids
+        order = np.argsort(assignments, kind="stable")
+        boundaries = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        self.lists = [order[boundaries[i]:boundaries[i + 1]] for i in range(len(centroids))]
+        self.assignments = assignments
+
+    @classmethod
+    def build(cls, vectors, nlist: int = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        count = len(vectors)
+        nlist = nlist or max(1, int(math.sqrt(count)))
+        sample = np.asarray(vectors[rng.choice(count, size=min(sample_size, count), replace=False)])
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(len(centroids)):
+                members = sample[labels == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-9)
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, 65536):
+            assignments[start:start + 65536] = np.argmax(np.asarray(vectors[start:start + 65536]) @ centroids.T, axis=1)
+        return cls(centroids.astype(np.float32), assignments)
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, assignments=self.assignments)
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        return cls(data["centroids"], data["assignments"])
+
+    def candidates(self, query_vector, nprobe: int):
+        nearest = _top_k(self.centroids @ query_vector, nprobe)
+        return np.concatenate([self.lists[i] for i in nearest]) if len(nearest) else np.empty(0, dtype=np.int64)
+
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Bits set in every byte value, for Hamming distances on numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+# Matryoshka-style truncation: text-embedding-3 vectors stay useful when cut to a prefix and renormalized
+def truncate_vectors(vectors, dim: int):
+    vectors = np.asarray(vectors, dtype=np.float32)[..., :dim]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-9)
+
+
+# Compact copy of the vectors held in memory for the first-pass search. int8 keeps one byte per
+# dimension (scaled per dimension), binary one bit (the sign); scores approximate the cosine similarity.
+class QuantizedVectors:
+    def __init__(self, kind: str, codes, scale=None, dim: int = None):
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+        self.dim = dim or (codes.shape[1] * 8 if kind == "binary" else codes.shape[1])
+
+    @classmethod
+    def build(cls, kind: str, vectors, block: int = 65536):
+        if kind not in QUANTIZATIONS or kind == "none":
+            raise ValueError(f"Unknown quantization {kind!r}")
+        count, dim = vectors.shape
+        if kind == "binary":
+            codes = np.empty((count, (dim + 7) // 8), dtype=np.uint8)
+            for start in range(0, count, block):
+                codes[start:start + block] = np.packbits(np.asarray(vectors[start:start + block]) > 0, axis=1)
+            return cls(kind, codes, dim=dim)
+        scale = np.zeros(dim, dtype=np.float32)
+        for start in range(0, count, block):
+            scale = np.maximum(scale, np.abs(np.asarray(vectors[start:start + block])).max(axis=0))
+        scale = np.maximum(scale, 1e-9) / 127
+        codes = np.empty((count, dim), dtype=np.int8)
+        for start in range(0, count, block):
+            codes[start:start + block] = np.clip(np.rint(np.asarray(vectors[start:start + block]) / scale), -127, 127)
+        return cls(kind, codes, scale, dim)
+
+    def save(self, path: str):
+        np.savez(path, kind=self.kind, codes=self.codes, scale=self.scale if self.scale is not None else np.zeros(0),
+                 dim=self.dim)
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        return cls(str(data["kind"]), data["codes"], data["scale"] if len(data["scale"]) else None, int(data["dim"]))
+
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def scores(self, query_vector, rows=None, block: int = 65536):
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.kind == "binary":
+            query_code = np.packbits(query_vector > 0)
+            for start in range(0, len(codes), block):
+                different = np.bitwise_xor(codes[start:start + block], query_code)
+                if hasattr(np, "bitwise_count"):
+                    distance = np.bitwise_count(different).sum(axis=1, dtype=np.int32)
+                else:
+                    distance = _POPCOUNT[different].sum(axis=1, dtype=np.int32)
+                # The fraction of differing signs estimates the angle between the vectors
+                scores[start:start + block] = np.cos(np.pi * distance / self.dim)
+            return scores
+        scaled_query = query_vector * self.scale
+        # Codes are widened to float32 a block at a time, so keep blocks to a few million values
+        block = max(1, min(block, (1 << 22) // self.dim))
+        for start in range(0, len(codes), block):
+            scores[start:start + block] = codes[start:start + block].astype(np.float32) @ scaled_query
+        return scores
+
+
+# On-disk layout: meta.json, vectors.f32 (row-major float32, L2-normalized), objects.jsonl, optional ivf.npz
+# and quantized.npz. With quantized vectors the full-precision ones stay on disk and are only read to
+# re-score the best rescore_factor * k first-pass candidates (rescore_factor=0 returns the approximate scores).
+# Filtered searches only score the objects that pass the filters (an exact scan unless enough of them remain
+# for the IVF index to be worth it), so a selective filter never loses results to approximate search.
+class LocalIndex:
+    def __init__(self, path: str, nprobe: int = 8, ann_threshold: int = 50000, rescore_factor: int = 4):
+        self.path = path
+        self.nprobe = nprobe
+        self.ann_threshold = ann_threshold
+        self.rescore_factor = rescore_factor
+        with open(os.path.join(path, "meta.json"), 'r') as file:
+            self.meta = json.load(file)
+        self.dim = self.meta["dim"]
+        self.count = self.meta["count"]
+        self.vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode='r',
+                                 shape=(self.count, self.dim)) if self.count else np.zeros((0, self.dim), dtype=np.float32)
+        with open(os.path.join(path, "objects.jsonl"), 'r') as file:
+            self.objects = [json.loads(line) for line in file]
+        self.bm25 = BM25Index([searchable_text(obj) for obj in self.objects])
+        self.columns = {key: np.array([obj.get(key) or "" for obj in self.objects], dtype=object) for key in FILTER_COLUMNS}
+        self.pages = np.array([obj.get("page_number") or 0 for obj in self.objects], dtype=np.int64)
+        ivf_path = os.path.join(path, "ivf.npz")
+        self.ivf = IVFIndex.load(ivf_path) if os.path.exists(ivf_path) else None
+        quantized_path = os.path.join(path, "quantized.npz")
+        self.quantized = QuantizedVectors.load(quantized_path) if os.path.exists(quantized_path) else None
+
+    def _query_vector(self, query_vector):
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if query_vector.shape[0] < self.dim:
+            raise ValueError(f"Query vector has {query_vector.shape[0]} dimensions, the index has {self.dim}")
+        # Full-length query embeddings work against an index exported with fewer dimensions
+        return truncate_vectors(query_vector, self.dim)
+
+    # Boolean array of the objects passing the filters, or None when nothing is filtered
+    def filter_mask(self, filters: SearchFilters = None):
+        if filters is None or filters.is_empty():
+            return None
+        mask = np.ones(self.count, dtype=bool)
+        for key, values in (("source_document", filters.source_documents), ("content_type", filters.content_types),
+                            ("category", filters.categories)):
+            if values:
+                mask &= np.isin(self.columns[key], values)
+        if filters.page_from is not None or filters.page_to is not None:
+            # Objects without a page number (stored as 0) never match a page range
+            mask &= (self.pages >= (filters.page_from or 1)) & (self.pages <= (filters.page_to or np.iinfo(np.int64).max))
+        return mask
+
+    def vector_search(self, query_vector, k: int, mask=None):
+        query_vector = self._query_vector(query_vector)
+        candidates = None if mask is None else np.flatnonzero(mask)
+        if self.ivf is not None and (self.count if candidates is None else len(candidates)) >= self.ann_threshold:
+            probed = np.sort(self.ivf.candidates(query_vector, self.nprobe))
+            candidates = probed if mask is None else probed[mask[probed]]
+        if self.quantized is not None:
+            approximate = self.quantized.scores(query_vector, candidates)
+            shortlist = _top_k(approximate, k * self.rescore_factor if self.rescore_factor else k)
+            doc_ids = shortlist if candidates is None else candidates[shortlist]
+            if not self.rescore_factor:
+                return {int(doc_id): float(approximate[i]) for doc_id, i in zip(doc_ids, shortlist)}
+            doc_ids = np.sort(doc_ids)
+            scores = np.asarray(self.vectors[doc_ids]) @ query_vector
+            return {int(doc_ids[i]): float(scores[i]) for i in _top_k(scores, k)}
+        if candidates is not None:
+            scores = np.asarray(self.vectors[candidates]) @ query_vector
+            top = _top_k(scores, k)
+            return {int(candidates[i]): float(scores[i]) for i in top}
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, 65536):
+            scores[start:start + 65536] = np.asarray(self.vectors[start:start + 65536]) @ query_vector
+        return {int(doc_id): float(scores[doc_id]) for doc_id in _top_k(scores, k)}
+
+    # Same alpha/limit semantics as Weaviate hybrid search: alpha=1 is pure vector, alpha=0 pure BM25
+    def hybrid_search(self, query: str, query_vector, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None):
+        mask = self.filter_mask(filters)
+        if mask is not None and not mask.any():
+            return []
+        candidates = max(limit, FUSION_CANDIDATES)
+        vector_hits = self.vector_search(query_vector, candidates, mask) if alpha > 0 else {}
+        keyword_hits = self.bm25.search(query, candidates, mask) if alpha < 1 else {}
+        results = []
+        for doc_id, score in fuse_scores(vector_hits, keyword_hits, alpha, limit):
+            item = {key: self.objects[doc_id].get(key) for key in SEARCH_PROPERTIES}
+            item["_score"] = score
+            results.append(item)
+        return results
+
+
+# dimensions shortens every vector to that many leading dimensions (see truncate_vectors)
+class LocalIndexWriter:
+    def __init__(self, path: str, dim: int, dimensions: int = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.source_dim = dim
+        self.dim = min(dim, dimensions) if dimensions else dim
+        self.count = 0
+        self._vectors = open(os.path.join(path, "vectors.f32"), 'wb')
+        self._objects = open(os.path.join(path, "objects.jsonl"), 'w')
+
+    def add(self, properties, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        if vector.shape != (self.source_dim,):
+            raise ValueError(f"Expected a vector of dimension {self.source_dim}, got {vector.shape}")
+        self._vectors.write(truncate_vectors(vector, self.dim).tobytes())
+        self._objects.write(json.dumps({key: properties.get(key) for key in SEARCH_PROPERTIES}) + "\n")
+        self.count += 1
+
+    def finish(self, build_ivf: bool = False, nlist: int = None, quantization: str = "none"):
+        self._vectors.close()
+        self._objects.close()
+        with open(os.path.join(self.path, "meta.json"), 'w') as file:
+            json.dump({"dim": self.dim, "count": self.count, "quantization": quantization}, file)
+        vectors = None
+        if self.count:
+            vectors = np.memmap(os.path.join(self.path, "vectors.f32"), dtype=np.float32, mode='r', shape=(self.count, self.dim))
+        ivf_path = os.path.join(self.path, "ivf.npz")
+        if build_ivf and vectors is not None:
+            IVFIndex.build(vectors, nlist).save(ivf_path)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+        quantized_path = os.path.join(self.path, "quantized.npz")
+        if quantization != "none" and vectors is not None:
+            QuantizedVectors.build(quantization, vectors).save(quantized_path)
+        elif os.path.exists(quantized_path):
+            os.remove(quantized_path)
+
+
+# The index (objects, BM25 postings, quantized vectors) is loaded by start() or on the first search
+class LocalBackend(RetrievalBackend):
+    name = "local"
+
+    def __init__(self, index: LocalIndex = None, path: str = None, **options):
+        self._index = index
+        self.path = path
+        self.options = options
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str, **options):
+        return cls(path=path, **options)
+
+    def load(self):
+        with self._lock:
+            if self._index is None:
+                started = time.perf_counter()
+                self._index = LocalIndex(self.path, **self.options)
+                logger.info(f"Loaded local index {self.path} ({self._index.count} objects) in {time.perf_counter() - started:.2f}s")
+            return self._index
+
+    @property
+    def index(self):
+        return self._index if self._index is not None else self.load()
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+
+    async def search(self, query: str, query_vector, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None):
+        return await asyncio.to_thread(lambda: self.index.hybrid_search(query, query_vector, limit, alpha, filters))
+
+    def status(self):
+        if self._index is None:
+            return {"status": "Loading local index...", "color": "orange"}
+        quantization = self.index.meta.get("quantization", "none")
+        details = f"{self.index.count} objects, {self.index.dim} dimensions" + (f", {quantization}" if quantization != "none" else "")
+        return {"status": f"Connected (local index, {details})", "color": "green"}
+
+
+# Copy every object and its vector out of a Weaviate collection into a local index directory
+def export_collection(collection, path: str, build_ivf: bool = False, dimensions: int = None, quantization: str = "none"):
+    writer = None
+    for obj in collection.iterator(include_vector=True, return_properties=SEARCH_PROPERTIES):
+        vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+        if writer is None:
+            writer = LocalIndexWriter(path, len(vector), dimensions)
+        writer.add(obj.properties, vector)
+        if writer.count % 1000 == 0:
+            logger.info(f"Exported {writer.count} objects...")
+    if writer is None:
+        raise RuntimeError("Collection is empty, nothing to export")
+    writer.finish(build_ivf=build_ivf, quantization=quantization)
+    logger.info(f"Exported {writer.count} objects to {path}")
+    return writer.count
+
+
+if __name__ == "__main__":
+    import weaviate
+    from config import COLLECTION_NAME, LOCAL_INDEX_DIR, VECTOR_QUANTIZATION
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Export a Weaviate collection into a local retrieval index")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--out", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--ivf", action="store_true", help="Also build an IVF index for approximate search")
+    parser.add_argument("--dimensions", type=int, help="Keep only the leading dimensions of every vector")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default=VECTOR_QUANTIZATION,
+                        help="Quantized vectors for the first-pass search")
+    args = parser.parse_args()
+
+    client = weaviate.connect_to_wcs(
+        cluster_url=os.getenv('WCS_URL'),
+        auth_credentials=weaviate.auth.AuthApiKey(os.getenv('WCS_API_KEY')),
+        headers={"X-OpenAI-Api-Key": os.getenv('OPENAI_API_KEY')}
+    )
+    try:
+        export_collection(client.collections.get(args.collection), args.out, build_ivf=args.ivf,
+                          dimensions=args.dimensions, quantization=args.quantization)
+    finally:
+        client.close()
@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    pdf_path TEXT,
+    error TEXT,
+    updated_at REAL
+)
+"""
+
+
+# Persistent crawl state: every discovered article URL with its status and the HTTP validators of
+# the last successful download, so an interrupted crawl resumes where it stopped and unchanged
+# articles are revalidated with a conditional GET instead of being converted again
+class CrawlFrontier:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+
+    def add(self, url, category):
+        cursor = self.conn.execute("INSERT OR IGNORE INTO urls (url, category, updated_at) VALUES (?, ?, ?)",
+                                   (url, category, time.time()))
+        self.conn.commit()
+        return cursor.rowcount == 1
+
+    def get(self, url):
+        return self.conn.execute("SELECT * FROM urls WHERE url = ?", (url,)).fetchone()
+
+    # Pending URLs first, then failed ones with attempts left, then finished ones to revalidate
+    def due(self, max_attempts=3, revalidate=True):
+        statuses = "('pending', 'failed', 'done')" if revalidate else "('pending', 'failed')"
+        return self.conn.execute(
+            f"SELECT * FROM urls WHERE status IN {statuses} AND (status != 'failed' OR attempts < ?) "
+            "ORDER BY CASE status WHEN 'pending' THEN 0 WHEN 'failed' THEN 1 ELSE 2 END, url",
+            (max_attempts,)).fetchall()
+
+    def mark_done(self, url, pdf_path, etag, last_modified, content_hash):
+        self.conn.execute(
+            "UPDATE urls SET status = 'done', attempts = 0, pdf_path = ?, etag = ?, last_modified = ?, "
+            "content_hash = ?, error = NULL, updated_at = ? WHERE url = ?",
+            (pdf_path, etag, last_modified, content_hash, time.time(), url))
+        self.conn.commit()
+
+    def mark_failed(self, url, error):
+        self.conn.execute(
+            "UPDATE urls SET status = 'failed', attempts = attempts + 1, error = ?, updated_at = ? WHERE url = ?",
+            (error[:500], time.time(), url))
+        self.conn.commit()
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall())
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,109 @@
+import random
+import asyncio
+import hashlib
+import argparse
+from aiohttp import web
+
+# Local stand-in for the news site, for exercising the crawler without touching the real one:
+#   python fixture_site.py --articles 200 --latency 0.05 --failure-rate 0.05
+#   python webcrawler.py --base-url http://127.0.0.1:8901/news --static --frontier /tmp/frontier.sqlite3
+# /news renders every card server-side; /news?infinite=1 loads cards in batches on scroll, like the real
+# listing, for the browser path. Articles send ETag/Last-Modified and answer conditional GETs with 304.
+
+LAST_MODIFIED = "Mon, 01 Jul 2024 00:00:00 GMT"
+
+def card_html(index):
+    category = "Press Releases" if index % 3 == 0 else "News"
+    return (f'<div class="card"><a href="/news/article-{index}"><h3>Article {index}</h3></a>'
+            f'<div class="card-footer"><div class="label-grey">{category}</div></div></div>')
+
+def article_html(index, revision):
+    paragraphs = "".join(f"<p>Paragraph {p} of article {index}, revision {revision}. MaxLinear announced "
+                         f"new connectivity and access products.</p>" for p in range(8))
+    return (f"<html><head><title>Article {index}</title><link rel='stylesheet' href='/static/site.css'></head>"
+            f"<body><h1>Article {index}</h1>{paragraphs}</body></html>")
+
+class FixtureSite:
+    def __init__(self, articles=100, batch_size=12, latency=0.0, failure_rate=0.0, seed=0):
+        self.articles = articles
+        self.batch_size = batch_size
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        # Bump an article's revision to simulate an edit between crawls
+        self.revisions = {}
+        self.requests = {"listing": 0, "article": 0, "not_modified": 0, "failed": 0}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/news", self.listing)
+        app.router.add_get("/news/cards", self.cards)
+        app.router.add_get("/news/article-{index:\\d+}", self.article)
+        app.router.add_post("/news/article-{index:\\d+}/edit", self.edit)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def listing(self, request):
+        self.requests["listing"] += 1
+        if request.query.get("infinite"):
+            cards = "".join(card_html(i) for i in range(min(self.batch_size, self.articles)))
+            script = f"""
+<script>
+let page = 1, loading = false;
+window.addEventListener('scroll', async () => {{
+  if (loading || page * {self.batch_size} >= {self.articles}) return;
+  loading = true;
+  const html = await (await fetch('/news/cards?page=' + page)).text();
+  document.getElementById('cards').insertAdjacentHTML('beforeend', html);
+  page += 1;
+  loading = false;
+}});
+</script>"""
+        else:
+            cards = "".join(card_html(i) for i in range(self.articles))
+            script = ""
+        return web.Response(text=f"<html><body><div id='cards' style='min-height:120vh'>{cards}</div>{script}</body></html>",
+                            content_type="text/html")
+
+    async def cards(self, request):
+        page = int(request.query.get("page", 1))
+        await asyncio.sleep(self.latency * 10)
+        start = page * self.batch_size
+        html = "".join(card_html(i) for i in range(start, min(start + self.batch_size, self.articles)))
+        return web.Response(text=html, content_type="text/html")
+
+    async def article(self, request):
+        index = int(request.match_info["index"])
+        if index >= self.articles:
+            raise web.HTTPNotFound()
+        await asyncio.sleep(self.latency)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.requests["failed"] += 1
+            raise web.HTTPServiceUnavailable()
+        self.requests["article"] += 1
+        body = article_html(index, self.revisions.get(index, 0))
+        etag = '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            self.requests["not_modified"] += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=body, content_type="text/html", headers={"ETag": etag, "Last-Modified": LAST_MODIFIED})
+
+    async def edit(self, request):
+        index = int(request.match_info["index"])
+        self.revisions[index] = self.revisions.get(index, 0) + 1
+        return web.json_response({"index": index, "revision": self.revisions[index]})
+
+    async def stats(self, request):
+        return web.json_response(self.requests)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local fixture news site for the crawler")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--articles", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    site = FixtureSite(args.articles, latency=args.latency, failure_rate=args.failure_rate)
+    web.run_app(site.app(), host=args.host, port=args.port, access_log=None)
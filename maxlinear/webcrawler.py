@@ -1,15 +1,32 @@
 import os
 import re
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import aiohttp
 import pdfkit
-from urllib.parse import urljoin
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-import time
+
+from crawl_frontier import CrawlFrontier
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORY_DIRS = {
+    'Press Releases': "./Press_Releases",
+    'News Releases': "./News_Releases",
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
 
 def setup_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
     options = Options()
     options.add_argument('--headless')
     options.add_argument('--no-sandbox')
@@ -19,20 +36,34 @@ def setup_driver():
     driver.maximize_window()
     return driver
 
-def get_all_article_links(base_url, driver):
-    driver.get(base_url)
+# Scrolls until the page stops growing. Instead of a fixed sleep per scroll it polls the page height,
+# learns how long a batch of cards typically takes to load, and gives up once the page has not
+# grown within a few multiples of that
+def scroll_to_end(driver, min_wait=0.5, max_wait=10, poll_interval=0.1):
     last_height = driver.execute_script("return document.body.scrollHeight")
-    
+    typical_load = None
+    scrolls = 0
+
     while True:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)  # Wait for new content to load
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        
-        if new_height == last_height:
+        timeout = max_wait if typical_load is None else min(max_wait, max(min_wait, 3 * typical_load))
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            time.sleep(poll_interval)
+            new_height = driver.execute_script("return document.body.scrollHeight")
+            if new_height != last_height:
+                break
+        else:
             break
+        elapsed = time.monotonic() - started
+        typical_load = elapsed if typical_load is None else 0.7 * typical_load + 0.3 * elapsed
         last_height = new_height
+        scrolls += 1
 
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
+    print(f"Listing fully loaded after {scrolls} scrolls")
+
+def parse_article_links(html, base_url):
+    soup = BeautifulSoup(html, 'html.parser')
     links = []
     for card in soup.find_all('div', class_='card-footer'):
         label = card.find('div', class_='label-grey')
@@ -45,32 +76,199 @@ def get_all_article_links(base_url, driver):
                 links.append((full_url, 'News Releases'))
     return links
 
-def download_and_convert_to_pdf(article_url, output_dir):
+def get_all_article_links(base_url, driver):
+    driver.get(base_url)
+    scroll_to_end(driver)
+    return parse_article_links(driver.page_source, base_url)
+
+# Listing pages that render without JavaScript (such as the local fixture site) skip the browser
+async def get_article_links_static(base_url, session):
+    async with session.get(base_url) as response:
+        response.raise_for_status()
+        return parse_article_links(await response.text(), base_url)
+
+def pdf_path_for(article_url, output_dir):
+    name = os.path.basename(urlparse(article_url).path.rstrip('/')) or hashlib.sha256(article_url.encode()).hexdigest()[:16]
+    return os.path.join(output_dir, f"{re.sub(r'[^A-Za-z0-9._-]', '_', name)}.pdf")
+
+# Converts the HTML that was already downloaded instead of letting wkhtmltopdf fetch the page again;
+# the <base> tag keeps relative stylesheet and image URLs resolvable
+def convert_html_to_pdf(html, article_url, pdf_path):
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    base_tag = f'<base href="{article_url}">'
+    if re.search(r'<head[^>]*>', html, re.I):
+        html = re.sub(r'(<head[^>]*>)', lambda match: match.group(1) + base_tag, html, count=1, flags=re.I)
+    else:
+        html = base_tag + html
+    tmp_path = pdf_path + ".part"
+    pdfkit.from_string(html, tmp_path, options={"enable-local-file-access": None, "quiet": None})
+    os.replace(tmp_path, pdf_path)
+
+class Crawler:
+    def __init__(self, frontier, category_dirs=CATEGORY_DIRS, workers=8, convert_workers=2, max_attempts=3,
+                 revalidate=True, convert=convert_html_to_pdf):
+        self.frontier = frontier
+        self.category_dirs = category_dirs
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.revalidate = revalidate
+        self.convert = convert
+        # wkhtmltopdf is a CPU-heavy subprocess, so conversions are bounded separately from fetches
+        self._convert_slots = asyncio.Semaphore(convert_workers)
+        self.results = {"converted": 0, "not_modified": 0, "unchanged": 0, "failed": 0}
+        self.completed = 0
+        self.new_pdfs = []
+
+    async def _fetch(self, session, url, headers):
+        for attempt in range(self.max_attempts):
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status in RETRYABLE_STATUSES and attempt < self.max_attempts - 1:
+                        raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+                    if response.status == 304:
+                        return response.status, None, response.headers
+                    response.raise_for_status()
+                    return response.status, await response.text(), response.headers
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = getattr(e, "status", None)
+                if attempt == self.max_attempts - 1 or (status is not None and status not in RETRYABLE_STATUSES):
+                    raise
+                await asyncio.sleep(min(30, 2 ** attempt))
+
+    async def process(self, session, entry):
+        url = entry["url"]
+        pdf_path = pdf_path_for(url, self.category_dirs[entry["category"]])
+        have_pdf = entry["status"] == "done" and entry["pdf_path"] and os.path.exists(entry["pdf_path"])
+        headers = {}
+        if have_pdf:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            status, html, response_headers = await self._fetch(session, url, headers)
+            if status == 304:
+                self.results["not_modified"] += 1
+                return
+            content_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+            etag, last_modified = response_headers.get("ETag"), response_headers.get("Last-Modified")
+            if have_pdf and content_hash == entry["content_hash"]:
+                # Server ignored the validators but the page is identical
+                self.frontier.mark_done(url, entry["pdf_path"], etag, last_modified, content_hash)
+                self.results["unchanged"] += 1
+                return
+            async with self._convert_slots:
+                await asyncio.to_thread(self.convert, html, url, pdf_path)
+            self.frontier.mark_done(url, pdf_path, etag, last_modified, content_hash)
+            self.results["converted"] += 1
+            self.new_pdfs.append(pdf_path)
+            print(f"PDF saved: {pdf_path}")
+        except Exception as e:
+            self.frontier.mark_failed(url, str(e) or type(e).__name__)
+            self.results["failed"] += 1
+            print(f"Error converting {url} to PDF: {str(e)}")
+
+    async def run(self, session):
+        queue = asyncio.Queue()
+        for entry in self.frontier.due(self.max_attempts, self.revalidate):
+            queue.put_nowait(entry)
+        total = queue.qsize()
+        print(f"Crawling {total} articles with {self.workers} workers...")
+
+        async def worker():
+            while True:
+                try:
+                    entry = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self.process(session, entry)
+                self.completed += 1
+                if self.completed % 50 == 0:
+                    print(f"Progress: {self.completed}/{total} {self.results}")
+
+        await asyncio.gather(*(worker() for _ in range(self.workers)))
+        return self.new_pdfs
+
+# Ingestion state the app reads too (the manifest, job queue, blobs, description cache and the collection
+# version that invalidates its answer cache); with the config defaults relative to the working directory,
+# running from maxlinear/ would write them to maxlinear/data where the app never looks
+REPO_DATA_PATHS = {
+    "COLLECTION_VERSION_PATH": "data/collection_version",
+    "INGEST_MANIFEST_PATH": "data/ingest_manifest.json",
+    "INGEST_JOBS_PATH": "data/ingest_jobs.sqlite3",
+    "IMAGE_DESCRIPTION_CACHE_PATH": "data/cache/image_descriptions.sqlite3",
+    "BLOB_STORE_DIR": "data/blobs",
+}
+
+# Resolves those paths (defaults and relative overrides alike) against the repo root; must run before
+# config is imported, since it reads the environment at import time
+def use_repo_data_paths():
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(REPO_ROOT, ".env"))
+    for name, default in REPO_DATA_PATHS.items():
+        value = os.getenv(name, default)
+        # An empty value disables the optional stores (e.g. the description cache)
+        if value and not os.path.isabs(value):
+            os.environ[name] = os.path.normpath(os.path.join(REPO_ROOT, value))
+
+# Runs the incremental ingestion over each directory that received new or changed PDFs;
+# the ingest manifest takes care of skipping everything else
+async def ingest_directories(directories, collection_name=None):
+    sys.path.insert(0, REPO_ROOT)
+    use_repo_data_paths()
+    import process_PDF_and_ingest as ingest
+    from config import COLLECTION_NAME
+
+    # Objects are tagged with the category of the directory they were crawled into, for filtered search
+    categories = {os.path.normpath(path): category for category, path in CATEGORY_DIRS.items()}
+    print(f"Ingesting new PDFs from {', '.join(directories)}")
+    # Each directory becomes a durable job, so an interrupted ingestion resumes on the next run
+    await ingest.ingest_jobs([(pdf_dir, categories.get(os.path.normpath(pdf_dir))) for pdf_dir in directories],
+                             os.path.join(REPO_ROOT, "data", "images"), collection_name or COLLECTION_NAME or "RAGESGDocuments3",
+                             os.path.join(REPO_ROOT, "image_prompt.txt"))
+
+async def crawl(base_url, frontier_path, static=False, workers=8, convert_workers=2, revalidate=True, ingest=False):
+    frontier = CrawlFrontier(frontier_path)
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit_per_host=workers)
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        pdf_filename = os.path.join(output_dir, f"{os.path.basename(article_url)}.pdf")
-        pdfkit.from_url(article_url, pdf_filename, options={"enable-local-file-access": None})
-        print(f"PDF saved: {pdf_filename}")
-    except Exception as e:
-        print(f"Error converting {article_url} to PDF: {str(e)}")
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector,
+                                         headers={"User-Agent": "Mozilla/5.0 (compatible; rag-crawler)"}) as session:
+            if static:
+                article_links = await get_article_links_static(base_url, session)
+            else:
+                driver = await asyncio.to_thread(setup_driver)
+                try:
+                    article_links = await asyncio.to_thread(get_all_article_links, base_url, driver)
+                finally:
+                    driver.quit()
 
-def process_articles():
-    base_url = "https://www.maxlinear.com/news"
-    news_dir = "./News_Releases"
-    press_dir = "./Press_Releases"
+            added = sum(frontier.add(url, category) for url, category in article_links)
+            print(f"Found {len(article_links)} articles, {added} new.")
 
-    driver = setup_driver()
-    article_links = get_all_article_links(base_url, driver)
-    driver.quit()
+            crawler = Crawler(frontier, workers=workers, convert_workers=convert_workers, revalidate=revalidate)
+            new_pdfs = await crawler.run(session)
+            print(f"Crawl finished: {crawler.results}; frontier: {frontier.counts()}")
+    finally:
+        frontier.close()
 
-    print(f"Found {len(article_links)} articles.")
+    if ingest and new_pdfs:
+        await ingest_directories(sorted({os.path.dirname(path) for path in new_pdfs}))
+    return new_pdfs
 
-    for index, (article_url, category) in enumerate(article_links):
-        print(f"Processing article {index + 1}: {article_url} - Category: {category}")
-        if category == 'Press Releases':
-            download_and_convert_to_pdf(article_url, press_dir)
-        else:
-            download_and_convert_to_pdf(article_url, news_dir)
+def process_articles():
+    parser = argparse.ArgumentParser(description="Crawl MaxLinear news articles into PDFs")
+    parser.add_argument("--base-url", default="https://www.maxlinear.com/news")
+    parser.add_argument("--frontier", default="./crawl_frontier.sqlite3", help="Crawl state, kept across runs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--convert-workers", type=int, default=2)
+    parser.add_argument("--static", action="store_true", help="Fetch the listing without a browser")
+    parser.add_argument("--no-revalidate", action="store_true", help="Skip articles that were already downloaded")
+    parser.add_argument("--ingest", action="store_true", help="Ingest new PDFs once the crawl finishes")
+    args = parser.parse_args()
+
+    asyncio.run(crawl(args.base_url, args.frontier, static=args.static, workers=args.workers,
+                      convert_workers=args.convert_workers, revalidate=not args.no_revalidate, ingest=args.ingest))
 
 if __name__ == "__main__":
-    process_articles()
\ No newline at end of file
+    process_articles()
@@ -0,0 +1,241 @@
+import contextvars
+import functools
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series["counts"]):
+                    samples.append((f"{self.name}_bucket", key + (("le", bound),), count))
+                samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series["count"]))
+                samples.append((f"{self.name}_sum", key, series["sum"]))
+                samples.append((f"{self.name}_count", key, series["count"]))
+        return samples
+
+
+# Minimal Prometheus text-format registry; collectors are callables returning
+# (name, kind, help, [(labels_dict, value), ...]) for values read at scrape time (e.g. cache stats)
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        # Several collectors may report the same metric name with different labels
+        collected = {}
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help_text, samples in families:
+                collected.setdefault(name, (kind, help_text, []))[2].extend(samples)
+        for name, (kind, help_text, samples) in collected.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram("rag_stage_duration_seconds", "Time spent in each stage of answering a question")
+REQUEST_SECONDS = registry.histogram("rag_request_duration_seconds", "End-to-end time to answer a question")
+REQUESTS = registry.counter("rag_requests_total", "Questions answered, by outcome")
+TOKENS = registry.counter("rag_llm_tokens_total", "LLM tokens used, by model and kind")
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+# Per-request record of stage timings and attributes. Tasks created while a trace is active
+# (e.g. speculative follow-ups) inherit it through the context, so their spans land here too.
+class RequestTrace:
+    def __init__(self, route: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.attributes = {}
+
+    def record(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def start_trace(route: str) -> RequestTrace:
+    trace = RequestTrace(route)
+    _current_trace.set(trace)
+    return trace
+
+
+# Records totals and writes one JSON trace line for a sample of requests (every failed one is logged)
+def finish_trace(trace: RequestTrace, outcome: str, sample_rate: float = 0.1):
+    total = time.perf_counter() - trace.started
+    REQUEST_SECONDS.observe(total, route=trace.route, outcome=outcome)
+    REQUESTS.inc(route=trace.route, outcome=outcome)
+    if outcome == "error" or random.random() < sample_rate:
+        trace_logger.info(json.dumps({
+            "trace_id": trace.id,
+            "route": trace.route,
+            "outcome": outcome,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in trace.stages.items()},
+            **trace.attributes
+        }))
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(stage, seconds)
+        else:
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def timed(stage: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_tokens(model: str, usage):
+    if usage is None:
+        return
+    # Embedding responses only report prompt tokens
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    TOKENS.inc(usage.prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        TOKENS.inc(completion_tokens, model=model, kind="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add("prompt_tokens", usage.prompt_tokens)
+        trace.add("completion_tokens", completion_tokens)
+
+
+# Exposes a component's stats() dict as labelled gauges, e.g. rag_cache_hit_rate{cache="embedding"};
+# the keys listed in counters only ever grow and are exported as counters, e.g. rag_cache_hits_total
+def stats_collector(prefix: str, label: str, name: str, source, counters=()):
+    def collect():
+        stats = source.stats()
+        families = []
+        for key, value in stats.items():
+            if not isinstance(value, (int, float)):
+                continue
+            help_text = f"{prefix.replace('rag_', '').capitalize()} {key.replace('_', ' ')}"
+            if key in counters:
+                families.append((f"{prefix}_{key}_total", "counter", help_text, [({label: name}, value)]))
+            else:
+                families.append((f"{prefix}_{key}", "gauge", help_text, [({label: name}, value)]))
+        return families
+    return collect
+
+
+CACHE_COUNTERS = ("hits", "disk_hits", "misses", "coalesced", "evictions")
+
+
+def cache_collector(name: str, cache):
+    return stats_collector("rag_cache", "cache", name, cache, counters=CACHE_COUNTERS)
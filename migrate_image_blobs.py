@@ -0,0 +1,55 @@
+import os
+import sys
+import base64
+import logging
+
+import weaviate
+from dotenv import load_dotenv
+
+from blob_store import BlobStore
+from config import BLOB_STORE_DIR
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load environment variables
+load_dotenv()
+
+
+# One-shot migration: move inline base64_encoding payloads into the blob store and keep only a reference
+def migrate_collection(collection, blob_store, dry_run=False):
+    migrated = 0
+    skipped = 0
+    for obj in collection.iterator(return_properties=["base64_encoding", "image_path"]):
+        encoded = obj.properties.get("base64_encoding")
+        if not encoded:
+            skipped += 1
+            continue
+
+        extension = os.path.splitext(obj.properties.get("image_path") or "")[1].lower() or ".jpg"
+        if dry_run:
+            migrated += 1
+            continue
+        blob_id = blob_store.put_bytes(base64.b64decode(encoded), extension)
+        # Weaviate cannot drop a property from existing objects, so the payload is blanked instead
+        collection.data.update(uuid=obj.uuid, properties={"image_blob": blob_id, "base64_encoding": ""})
+        migrated += 1
+        if migrated % 100 == 0:
+            logging.info(f"Migrated {migrated} images...")
+
+    logging.info(f"Migration complete: {migrated} images {'would be ' if dry_run else ''}moved to the blob store, {skipped} objects without inline images")
+    return migrated
+
+
+if __name__ == "__main__":
+    collection_name = os.getenv('WEAVIATE_COLLECTION_NAME', "RAGESGDocuments3")
+    dry_run = "--dry-run" in sys.argv
+    client = weaviate.connect_to_wcs(
+        cluster_url=os.getenv('WCS_URL'),
+        auth_credentials=weaviate.auth.AuthApiKey(os.getenv('WCS_API_KEY')),
+        headers={"X-OpenAI-Api-Key": os.getenv('OPENAI_API_KEY')}
+    )
+    try:
+        migrate_collection(client.collections.get(collection_name), BlobStore(BLOB_STORE_DIR), dry_run=dry_run)
+    finally:
+        client.close()
@@ -0,0 +1,30 @@
+import os
+
+from chunking import chunk_elements
+
+
+# Runs in a worker process: partition one PDF and reduce the elements to plain, picklable chunk records
+def partition_document(pdf_path, output_dir, max_chunk_tokens=400):
+    from unstructured.partition.pdf import partition_pdf
+
+    pdf_name = os.path.basename(pdf_path)
+    pdf_output_dir = os.path.join(output_dir, pdf_name.replace('.pdf', ''))
+    os.makedirs(pdf_output_dir, exist_ok=True)
+
+    elements = partition_pdf(
+        filename=pdf_path,
+        extract_images_in_pdf=False,
+        # Table structure comes from the text layer as HTML, so tables no longer need a vision call
+        infer_table_structure=True,
+        strategy="hi_res",
+        #extract_image_block_types=["Image", "Table"],
+        extract_image_block_output_dir=pdf_output_dir
+    )
+
+    return chunk_elements([{
+        "category": element.category,
+        "text": element.text,
+        "page_number": getattr(element.metadata, 'page_number', None),
+        "image_path": getattr(element.metadata, 'image_path', None),
+        "table_html": getattr(element.metadata, 'text_as_html', None),
+    } for element in elements], max_chunk_tokens)
@@ -1,19 +1,30 @@
 import os
+import sys
+import json
 import base64
 import asyncio
-import aiohttp
-from tqdm import tqdm
-import weaviate
+import threading
+from functools import partial
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
-import anthropic
-from unstructured.partition.pdf import partition_pdf
-from unstructured.documents.elements import NarrativeText, Table, Image as UnstructuredImage
-from weaviate.util import generate_uuid5
-import nltk
 import logging
 
-import weaviate.classes.config as wc
+from answer_cache import bump_collection_version
+from embedding_batches import embed_texts, embedding_signature
+from ingest_manifest import IngestManifest, file_sha256, content_hash
+from ingest_pipeline import IngestPipeline, DocumentState
+from ingest_jobs import IngestJobStore, IngestJobRunner
+from pdf_partition import partition_document
+from chunking import CHUNKER_VERSION
+from image_summarizer import ImageSummarizer, DescriptionCache, media_type_for
+from blob_store import BlobStore
+from config import (INGEST_MANIFEST_PATH, INGEST_JOBS_PATH, INGEST_JOB_WORKERS, INGEST_JOB_MAX_ATTEMPTS,
+                    INGEST_JOB_STALE_SECONDS, COLLECTION_VERSION_PATH, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS,
+                    VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR, INGEST_WRITE_BATCH_SIZE, INGEST_EMBEDDING_BATCH_TOKENS,
+                    INGEST_EMBEDDING_BATCH_SIZE, INGEST_EMBEDDING_CONCURRENCY, INGEST_EMBEDDING_MAX_RETRIES,
+                    INGEST_PARTITION_WORKERS, INGEST_PROCESS_CONCURRENCY, INGEST_PROCESS_BATCH_SIZE, INGEST_QUEUE_SIZE,
+                    CHUNK_MAX_TOKENS, IMAGE_SUMMARY_MODEL,
+                    IMAGE_SUMMARY_CONCURRENCY, IMAGE_SUMMARY_REQUESTS_PER_MINUTE, IMAGE_SUMMARY_INPUT_TOKENS_PER_MINUTE,
+                    IMAGE_SUMMARY_MAX_RETRIES, IMAGE_DESCRIPTION_CACHE_PATH, BLOB_STORE_DIR)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,23 +32,79 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables
 load_dotenv()
 
-# Download NLTK data
-nltk.download('punkt', quiet=True)
-
 # Set up environment variables and API keys
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
 WCS_URL = os.getenv('WCS_URL')
 WCS_API_KEY = os.getenv('WCS_API_KEY')
 
-# Initialize clients
-openai_client = AsyncOpenAI()
-anthropic_client = anthropic.Anthropic()
-weaviate_client = weaviate.connect_to_wcs(
-    cluster_url=WCS_URL,
-    auth_credentials=weaviate.auth.AuthApiKey(WCS_API_KEY),
-    headers={"X-OpenAI-Api-Key": OPENAI_API_KEY}
-)
+# API clients are created on first use, so importing this module (from the crawler, the benchmark or a
+# partitioning worker process) loads neither the SDKs nor the Weaviate client library
+openai_client = None
+anthropic_client = None
+weaviate_client = None
+weaviate_client_lock = threading.Lock()
+image_summarizer = None
+blob_store = BlobStore(BLOB_STORE_DIR)
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        from openai import AsyncOpenAI
+        openai_client = AsyncOpenAI()
+    return openai_client
+
+def get_image_summarizer():
+    global anthropic_client, image_summarizer
+    if image_summarizer is None:
+        import anthropic
+        anthropic_client = anthropic.AsyncAnthropic()
+        image_summarizer = ImageSummarizer(
+            anthropic_client,
+            IMAGE_SUMMARY_MODEL,
+            concurrency=IMAGE_SUMMARY_CONCURRENCY,
+            requests_per_minute=IMAGE_SUMMARY_REQUESTS_PER_MINUTE,
+            input_tokens_per_minute=IMAGE_SUMMARY_INPUT_TOKENS_PER_MINUTE,
+            max_retries=IMAGE_SUMMARY_MAX_RETRIES,
+            cache=DescriptionCache(IMAGE_DESCRIPTION_CACHE_PATH) if IMAGE_DESCRIPTION_CACHE_PATH else None
+        )
+    return image_summarizer
+
+# Closed once by whoever runs the jobs (ingest_jobs, the --worker loop, the app), never by a single job,
+# since concurrent jobs in the same process share these clients
+async def close_clients():
+    global openai_client, anthropic_client, image_summarizer, weaviate_client
+    if openai_client is not None:
+        await openai_client.close()
+    if anthropic_client is not None:
+        await anthropic_client.close()
+    if weaviate_client is not None:
+        await asyncio.to_thread(weaviate_client.close)
+    openai_client = anthropic_client = image_summarizer = weaviate_client = None
+
+# One manifest per path for the whole process: jobs running side by side update the same instance, so
+# one job's save cannot overwrite documents another job recorded
+manifests = {}
+manifests_lock = threading.Lock()
+
+def get_manifest(path=INGEST_MANIFEST_PATH):
+    with manifests_lock:
+        key = os.path.abspath(path)
+        if key not in manifests:
+            manifests[key] = IngestManifest(path)
+        return manifests[key]
+
+# unstructured's sentence tokenizer needs the punkt data; fetched once per ingest run instead of on import
+def ensure_nltk_data():
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt', quiet=True)
+
+# Recorded in the manifest; changing the embedding dimensions, chunker or chunk size re-ingests every document
+EMBEDDING = embedding_signature(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+CHUNKING = f"{CHUNKER_VERSION}:{CHUNK_MAX_TOKENS}"
 
 def load_prompt(file_path):
     with open(file_path, 'r') as file:
@@ -47,143 +114,200 @@ def encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
-async def get_embedding(text):
-    response = await openai_client.embeddings.create(
-        input=text,
-        model="text-embedding-3-large"
-    )
-    return response.data[0].embedding
-
-async def summarize_image(img_base64, prompt):
-    message = anthropic_client.messages.create(
-        model="claude-3-sonnet-20240229",
-        max_tokens=1000,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "image/jpeg",
-                            "data": img_base64
-                        }
-                    }
-                ]
-            }
-        ]
-    )
-    return message.content[0].text
+async def summarize_image(img_base64, prompt, image_hash=None, media_type="image/jpeg"):
+    return await get_image_summarizer().summarize(img_base64, prompt, image_hash=image_hash, media_type=media_type)
+
+# Deterministic object UUID, unchanged from earlier ingests so existing objects are overwritten in place
+def object_uuid(item, data_type):
+    from weaviate.util import generate_uuid5
+    return generate_uuid5(f"{item['source_document']}_{item['page_number']}_{data_type}_{item.get('paragraph_number', '') or item.get('image_path', '')}")
+
+# category is the crawler's news/press release category, used as a query-time filter
+def object_properties(item, data_type, category=None):
+    properties = {
+        "source_document": item['source_document'],
+        "page_number": item['page_number'],
+        "content_type": data_type
+    }
+    if category:
+        properties["category"] = category
+    
+    if data_type == 'text':
+        properties.update({
+            "paragraph_number": item['paragraph_number'],
+            "page_end": item['page_end'],
+            "section": item['section'],
+            "text": item['text']
+        })
+    elif data_type == 'table':
+        properties.update({
+            "paragraph_number": item['paragraph_number'],
+            "section": item['section'],
+            "table_content": item['table_content']
+        })
+    elif data_type == 'image':
+        properties.update({
+            "image_path": item['image_path'],
+            "description": item['description'],
+            "image_blob": item['image_blob']
+        })
+    return properties
 
-async def process_element(element, pdf_path, image_prompt, paragraph_number):
-    if isinstance(element, NarrativeText):
+# What gets embedded for a chunk: its text, prefixed with the section title when the chunk does not start with it
+def embedding_text(record):
+    section = record.get("section")
+    if section and not record["text"].startswith(section):
+        return f"{section}\n{record['text']}"
+    return record["text"]
+
+# Text chunks and tables extracted from the text layer need no model call, so they are turned into
+# items inline; returns its UUID and content hash, plus its data only when it is new or changed
+def text_item(record, pdf_path, previous_elements):
+    data_type = "table" if record["kind"] == "table" else "text"
+    data = {
+        "source_document": pdf_path,
+        "page_number": record["page_number"],
+        "paragraph_number": record["index"],
+        "section": record.get("section"),
+        "embedding_text": embedding_text(record)
+    }
+    if data_type == "table":
+        data["table_content"] = record["text"]
+    else:
+        data["page_end"] = record.get("page_end", record["page_number"])
+        data["text"] = record["text"]
+    uuid = object_uuid(data, data_type)
+    element_hash = content_hash(data["embedding_text"])
+    return {
+        "type": data_type,
+        "uuid": uuid,
+        "content_hash": element_hash,
+        "data": None if previous_elements.get(uuid) == element_hash else data
+    }
+
+async def image_item(record, pdf_path, image_prompt, previous_elements):
+    page_number = record["page_number"]
+    image_path = record["image_path"]
+
+    if image_path and os.path.exists(image_path):
+        uuid = object_uuid({"source_document": pdf_path, "page_number": page_number, "image_path": image_path}, 'image')
+        element_hash = await asyncio.to_thread(file_sha256, image_path)
+        if previous_elements.get(uuid) == element_hash:
+            # Same figure as last run; skip the vision call entirely
+            return {"type": "image", "uuid": uuid, "content_hash": element_hash, "data": None}
+
+        base64_image = await asyncio.to_thread(encode_image, image_path)
+        description = await summarize_image(base64_image, image_prompt, image_hash=element_hash,
+                                            media_type=media_type_for(image_path))
+
+        image_blob = await asyncio.to_thread(blob_store.put_file, image_path, element_hash)
         return {
-            "type": "text",
+            "type": "image",
+            "uuid": uuid,
+            "content_hash": element_hash,
             "data": {
                 "source_document": pdf_path,
-                "page_number": element.metadata.page_number,
-                "paragraph_number": paragraph_number,
-                "text": element.text
+                "page_number": page_number,
+                "image_path": image_path,
+                "description": description,
+                "embedding_text": description,
+                # Only a reference is stored in the collection; the bytes live in the blob store
+                "image_blob": image_blob
             }
         }
-    elif isinstance(element, (UnstructuredImage, Table)):
-        page_number = element.metadata.page_number if hasattr(element.metadata, 'page_number') else None
-        image_path = element.metadata.image_path if hasattr(element.metadata, 'image_path') else None
-
-        if image_path and os.path.exists(image_path):
-            base64_image = encode_image(image_path)
-            description = await summarize_image(base64_image, image_prompt)
-
-            return {
-                "type": "image",
-                "data": {
-                    "source_document": pdf_path,
-                    "page_number": page_number,
-                    "image_path": image_path,
-                    "description": description,
-                    "base64_encoding": base64_image
-                }
-            }
-        else:
-            logging.warning(f"Image file not found or path not available for image on page {page_number}")
-            return None
+    else:
+        logging.warning(f"Image file not found or path not available for image on page {page_number}")
+        return None
 
+# Turns a batch of chunk records into pipeline items (None for records that are skipped). Only the
+# figures wait on the vision model, so only they are run concurrently.
+async def process_elements(records, pdf_path, image_prompt, previous_elements=None):
+    previous_elements = previous_elements or {}
+    items = [None if record["kind"] == "image" else text_item(record, pdf_path, previous_elements) for record in records]
+    figures = [i for i, record in enumerate(records) if record["kind"] == "image"]
+    if figures:
+        described = await asyncio.gather(*(image_item(records[i], pdf_path, image_prompt, previous_elements) for i in figures))
+        for i, item in zip(figures, described):
+            items[i] = item
+    return items
 
-async def process_pdf(pdf_path, output_dir, image_prompt):
-    pdf_name = os.path.basename(pdf_path)
-    pdf_output_dir = os.path.join(output_dir, pdf_name.replace('.pdf', ''))
-    os.makedirs(pdf_output_dir, exist_ok=True)
-    
-    elements = partition_pdf(
-        filename=pdf_path,
-        extract_images_in_pdf=False,
-        infer_table_structure=False,
-        strategy="hi_res",
-        #extract_image_block_types=["Image", "Table"],
-        extract_image_block_output_dir=pdf_output_dir
+async def embed_items(items):
+    # One embeddings request per token-bounded group of inputs instead of one per item
+    return await embed_texts(
+        get_openai_client(),
+        [item['data']['embedding_text'] for item in items],
+        EMBEDDING_MODEL,
+        max_batch_tokens=INGEST_EMBEDDING_BATCH_TOKENS,
+        max_batch_size=INGEST_EMBEDDING_BATCH_SIZE,
+        concurrency=INGEST_EMBEDDING_CONCURRENCY,
+        max_retries=INGEST_EMBEDDING_MAX_RETRIES,
+        dimensions=EMBEDDING_DIMENSIONS
     )
-    
-    tasks = [process_element(element, pdf_path, image_prompt, idx) for idx, element in enumerate(elements)]
-    results = await asyncio.gather(*tasks)
-    results = [result for result in results if result is not None]
-    
-    text_data = [item['data'] for item in results if item['type'] == 'text']
-    image_data = [item['data'] for item in results if item['type'] == 'image']
-    
-    return text_data, image_data
-
-async def batch_ingest_data(collection, data, data_type, batch_size=100):
-    total_batches = (len(data) + batch_size - 1) // batch_size
-    for i in tqdm(range(0, len(data), batch_size), desc=f"Ingesting {data_type} data", total=total_batches):
-        batch = data[i:i+batch_size]
-        with collection.batch.dynamic() as batch_writer:
-            for item in batch:
-                vector = await get_embedding(item['text'] if data_type == 'text' else item['description'])
-                properties = {
-                    "source_document": item['source_document'],
-                    "page_number": item['page_number'],
-                    "content_type": data_type
-                }
-                
-                if data_type == 'text':
-                    properties.update({
-                        "paragraph_number": item['paragraph_number'],
-                        "text": item['text']
-                    })
-                elif data_type == 'image':
-                    properties.update({
-                        "image_path": item['image_path'],
-                        "description": item['description'],
-                        "base64_encoding": item['base64_encoding']
-                    })
-                
-                uuid = generate_uuid5(f"{item['source_document']}_{item['page_number']}_{data_type}_{item.get('paragraph_number', '') or item.get('image_path', '')}")
-                batch_writer.add_object(properties=properties, uuid=uuid, vector=vector)
-
-async def process_pdf_directory(pdf_dir, output_dir, image_prompt):
-    all_text_data = []
-    all_image_data = []
-    
-    for filename in os.listdir(pdf_dir):
-        if filename.endswith('.pdf'):
-            pdf_path = os.path.join(pdf_dir, filename)
-            logging.info(f"Processing {filename}...")
-            text_data, image_data = await process_pdf(pdf_path, output_dir, image_prompt)
-            all_text_data.extend(text_data)
-            all_image_data.extend(image_data)
-    
-    return all_text_data, all_image_data
 
-async def main(pdf_dir, output_dir, collection_name, prompt_file):
-    image_prompt = load_prompt(prompt_file)
-    
-    text_data, image_data = await process_pdf_directory(pdf_dir, output_dir, image_prompt)
-    
+def write_items(collection, items, vectors, category=None):
+    with collection.batch.dynamic() as batch_writer:
+        for item, vector in zip(items, vectors):
+            batch_writer.add_object(
+                properties=object_properties(item['data'], item['type'], category),
+                uuid=item['uuid'],
+                vector=vector
+            )
+
+def delete_objects(collection, uuids, batch_size=100):
+    from weaviate.classes.query import Filter
+    uuids = list(uuids)
+    for i in range(0, len(uuids), batch_size):
+        collection.data.delete_many(where=Filter.by_id().contains_any(uuids[i:i+batch_size]))
+
+# Connected on first use, so the pipeline can also run against a stand-in collection (see benchmark.py)
+def get_weaviate_client():
+    global weaviate_client
+    # Concurrent jobs connect from their own threads; only the first one creates the client
+    with weaviate_client_lock:
+        if weaviate_client is None:
+            import weaviate
+            weaviate_client = weaviate.connect_to_wcs(
+                cluster_url=WCS_URL,
+                auth_credentials=weaviate.auth.AuthApiKey(WCS_API_KEY),
+                headers={"X-OpenAI-Api-Key": OPENAI_API_KEY}
+            )
+        return weaviate_client
+
+# HNSW with scalar (int8) or binary quantization keeps compressed vectors in memory for the first pass
+# and re-scores the best rescore_limit candidates against the full vectors on disk (Weaviate's default
+# rescore limit applies when rescore_factor is 0)
+def vector_index_config(quantization, rescore_factor=VECTOR_RESCORE_FACTOR, limit=30):
+    import weaviate.classes.config as wc
+    rescore_limit = rescore_factor * limit if rescore_factor else None
+    if quantization == "int8":
+        return wc.Configure.VectorIndex.hnsw(quantizer=wc.Configure.VectorIndex.Quantizer.sq(rescore_limit=rescore_limit))
+    if quantization == "binary":
+        return wc.Configure.VectorIndex.hnsw(quantizer=wc.Configure.VectorIndex.Quantizer.bq(rescore_limit=rescore_limit))
+    if quantization != "none":
+        logging.warning(f"Unknown vector quantization {quantization!r}, storing full-precision vectors")
+    return None
+
+# Properties introduced after the first collections were created; search returns and filters on them,
+# so they are added to existing collections (objects ingested before simply have no value)
+ADDED_PROPERTIES = {"page_end": "INT", "section": "TEXT", "category": "TEXT", "table_content": "TEXT"}
+
+def ensure_properties(collection):
+    import weaviate.classes.config as wc
+    existing = {prop.name for prop in collection.config.get().properties}
+    for name, data_type in ADDED_PROPERTIES.items():
+        if name not in existing:
+            logging.info(f"Adding property {name} to collection {collection.name}")
+            collection.config.add_property(wc.Property(name=name, data_type=getattr(wc.DataType, data_type)))
+    return collection
+
+# Quantization is chosen per collection when it is created; existing collections keep their index settings
+def get_or_create_collection(collection_name, quantization=VECTOR_QUANTIZATION):
+    import weaviate.classes.config as wc
+    weaviate_client = get_weaviate_client()
     if not weaviate_client.collections.exists(collection_name):
-        collection = weaviate_client.collections.create(
+        return ensure_properties(weaviate_client.collections.create(
             name=collection_name,
+            vector_index_config=vector_index_config(quantization),
             properties=[
                 {"name": "content", "data_type": wc.DataType.TEXT},
                 {"name": "page_number", "data_type": wc.DataType.INT},
@@ -195,18 +319,157 @@ async def main(pdf_dir, output_dir, collection_name, prompt_file):
                 {"name": "image_embedding", "data_type": wc.DataType.TEXT},
                 {"name": "metadata", "data_type": wc.DataType.TEXT}
             ]
+        ))
+    return ensure_properties(weaviate_client.collections.get(collection_name))
+
+# Ingests only what changed since the manifest was written: unchanged PDFs are skipped without
+# partitioning, changed ones are diffed per element, and vanished PDFs are removed from the collection.
+# Changed PDFs stream through the staged pipeline, so memory stays flat regardless of corpus size.
+# With a job (ingest_jobs.JobProgress), elements it already wrote and documents it already finished
+# count as unchanged, so a resumed job continues where it stopped, even with force.
+# Returns the number of documents whose objects were modified.
+async def process_pdf_directory(pdf_dir, output_dir, image_prompt, collection, manifest, force=False,
+                                partition=partition_document, category=None, job=None):
+    documents = []
+    seen = set()
+    skipped = []
+    completed = await asyncio.to_thread(job.completed_documents) if job is not None else set()
+    
+    for filename in sorted(os.listdir(pdf_dir)):
+        if filename.endswith('.pdf'):
+            pdf_path = os.path.join(pdf_dir, filename)
+            seen.add(pdf_path)
+            if pdf_path in completed:
+                logging.info(f"Skipping {filename}, already ingested by this job")
+                continue
+            unchanged, sha256 = await asyncio.to_thread(manifest.check, pdf_path, EMBEDDING, CHUNKING)
+            if unchanged and not force:
+                logging.info(f"Skipping unchanged {filename}")
+                continue
+            previous_elements = {} if force else manifest.previous_elements(pdf_path, EMBEDDING, CHUNKING)
+            if job is not None:
+                previous_elements.update(await asyncio.to_thread(job.written, pdf_path))
+            documents.append(DocumentState(pdf_path, sha256, previous_elements))
+    if job is not None:
+        await asyncio.to_thread(job.start, [doc.path for doc in documents])
+
+    async def process(doc, records):
+        if job is not None:
+            await asyncio.to_thread(job.processed, len(records))
+        return await process_elements(records, doc.path, image_prompt, doc.previous_elements)
+
+    def write(items, vectors):
+        write_items(collection, items, vectors, category=category)
+        if job is not None:
+            job.record_written(items)
+
+    async def finalize(doc):
+        recorded = (manifest.get(doc.path) or {}).get("elements", {})
+        removed = [uuid for uuid in recorded if uuid not in doc.element_hashes]
+        await asyncio.to_thread(delete_objects, collection, removed)
+        logging.info(f"{os.path.basename(doc.path)}: {doc.upserted} objects upserted, "
+                     f"{doc.unchanged} unchanged, {len(removed)} removed")
+        # Saved per document so an interrupted run resumes after the last finished PDF
+        await asyncio.to_thread(manifest.update, doc.path, doc.sha256, EMBEDDING, doc.element_hashes, CHUNKING)
+        await asyncio.to_thread(manifest.save)
+        if job is not None:
+            await asyncio.to_thread(job.document_done, doc.path, doc.upserted, doc.unchanged, len(removed))
+
+    async def failed(doc, error):
+        if job is not None:
+            await asyncio.to_thread(job.document_failed, doc.path, error)
+
+    if documents:
+        logging.info(f"Processing {len(documents)} new or changed documents...")
+        pipeline = IngestPipeline(
+            partial(partition, output_dir=output_dir, max_chunk_tokens=CHUNK_MAX_TOKENS),
+            process,
+            embed_items,
+            write,
+            finalize,
+            partition_workers=INGEST_PARTITION_WORKERS,
+            process_concurrency=INGEST_PROCESS_CONCURRENCY,
+            process_batch_size=INGEST_PROCESS_BATCH_SIZE,
+            queue_size=INGEST_QUEUE_SIZE,
+            batch_size=INGEST_WRITE_BATCH_SIZE,
+            on_error=failed
         )
-    else:
-        collection = weaviate_client.collections.get(collection_name)
+        await pipeline.run(documents)
+        skipped = pipeline.failed
+        if skipped:
+            logging.warning(f"Skipped {len(skipped)} documents that could not be partitioned: "
+                            f"{', '.join(os.path.basename(path) for path in skipped)}")
+
+    changed_documents = len(documents) - len(skipped)
+    for pdf_path, entry in manifest.items():
+        if os.path.normpath(os.path.dirname(pdf_path)) == os.path.normpath(pdf_dir) and pdf_path not in seen:
+            logging.info(f"Removing deleted document {pdf_path}")
+            await asyncio.to_thread(delete_objects, collection, entry.get("elements", {}).keys())
+            manifest.remove(pdf_path)
+            changed_documents += 1
+
+    await asyncio.to_thread(manifest.save)
+    return changed_documents
+
+# Ingests one directory. Everything that blocks (connecting to Weaviate, hashing and reading files,
+# manifest and checkpoint writes) runs in threads, so jobs can share an event loop with the app.
+# The API clients stay open for the next job; the caller closes them with close_clients().
+async def main(pdf_dir, output_dir, collection_name, prompt_file, manifest_path=INGEST_MANIFEST_PATH, force=False,
+               category=None, job=None):
+    image_prompt = await asyncio.to_thread(load_prompt, prompt_file)
+    await asyncio.to_thread(ensure_nltk_data)
+    collection = await asyncio.to_thread(get_or_create_collection, collection_name)
+    manifest = await asyncio.to_thread(get_manifest, manifest_path)
     
-    await batch_ingest_data(collection, text_data, 'text')
-    await batch_ingest_data(collection, image_data, 'image')
+    changed_documents = await process_pdf_directory(pdf_dir, output_dir, image_prompt, collection, manifest, force,
+                                                  category=category, job=job)
+
+    if changed_documents:
+        # Invalidate answers cached by the app against the previous collection contents
+        await asyncio.to_thread(bump_collection_version, COLLECTION_VERSION_PATH)
     
-    logging.info("Data ingestion complete.")
+    logging.info(f"Data ingestion complete. {changed_documents} documents changed.")
+
+# Runs one queued ingestion job; progress holds its checkpoints
+async def run_job(job, progress):
+    await main(job["pdf_dir"], job["output_dir"], job["collection"], job["prompt_file"], force=bool(job["force"]),
+               category=job["category"], job=progress)
+
+def job_runner(store, workers=INGEST_JOB_WORKERS):
+    return IngestJobRunner(store, run_job, workers=workers, stale_after=INGEST_JOB_STALE_SECONDS,
+                           max_attempts=INGEST_JOB_MAX_ATTEMPTS)
+
+# Runs queued jobs (until the queue is drained with until_idle) and closes the shared API clients
+# once every job of this runner has stopped
+async def run_jobs(store, workers=INGEST_JOB_WORKERS, until_idle=False):
+    try:
+        await job_runner(store, workers).run(until_idle=until_idle)
+    finally:
+        await close_clients()
+
+# Queues the ingestion of each directory as a durable job (an identical unfinished job is reused, so
+# rerunning after a crash resumes it) and runs the queue until it is drained.
+# directories is a list of (pdf_dir, category) pairs.
+async def ingest_jobs(directories, output_dir, collection_name, prompt_file, force=False, jobs_path=INGEST_JOBS_PATH):
+    store = IngestJobStore(jobs_path)
+    try:
+        for pdf_dir, category in directories:
+            job_id, created = store.submit(pdf_dir, output_dir, collection_name, prompt_file, category, force)
+            logging.info(f"{'Queued' if created else 'Resuming'} ingestion job {job_id} for {pdf_dir}")
+        await run_jobs(store, until_idle=True)
+    finally:
+        store.close()
 
 if __name__ == "__main__":
     pdf_dir = "./data/pdfs" # Directory containing the PDFs to be processed
     output_dir = "./data/images"
     collection_name = "RAGESGDocuments3"
     prompt_file = "./image_prompt.txt"
-    asyncio.run(main(pdf_dir, output_dir, collection_name, prompt_file))
\ No newline at end of file
+    force = "--full" in sys.argv  # Re-ingest everything, ignoring the manifest
+    if "--status" in sys.argv:
+        print(json.dumps(IngestJobStore(INGEST_JOBS_PATH).summary(), indent=2))
+    elif "--worker" in sys.argv:
+        # Long-running worker for jobs queued by the app or other scripts
+        asyncio.run(run_jobs(IngestJobStore(INGEST_JOBS_PATH)))
+    else:
+        asyncio.run(ingest_jobs([(pdf_dir, None)], output_dir, collection_name, prompt_file, force=force))
\ No newline at end of file
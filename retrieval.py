@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PROPERTIES = ["content_type", "source_document", "page_number", "page_end", "paragraph_number",
+                     "section", "category", "text", "image_path", "description", "table_content"]
+
+CONTENT_TYPES = ("text", "table", "image")
+
+# Rank offset of reciprocal rank fusion across collections; 60 is the usual choice
+RRF_K = 60
+
+
+def _string_list(value, field):
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) and item for item in value):
+        raise ValueError(f"{field} must be a string or a list of strings")
+    return tuple(sorted(set(value)))
+
+
+def _page(value, field):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{field} must be a positive integer")
+    return value
+
+
+# Query-time metadata prefilters. Every field is optional and the set fields are combined with AND;
+# a list matches any of its values. The page range applies to the page a chunk starts on.
+class SearchFilters:
+    FIELDS = ("source_documents", "content_types", "categories", "page_from", "page_to")
+
+    def __init__(self, source_documents=(), content_types=(), categories=(), page_from: int = None, page_to: int = None):
+        self.source_documents = tuple(source_documents)
+        self.content_types = tuple(content_types)
+        self.categories = tuple(categories)
+        self.page_from = page_from
+        self.page_to = page_to
+
+    # Validates the "filters" object of an /ask request body; raises ValueError on bad input
+    @classmethod
+    def from_request(cls, data):
+        if data is None:
+            return cls()
+        if not isinstance(data, dict):
+            raise ValueError("filters must be an object")
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+        content_types = _string_list(data.get("content_types"), "content_types")
+        invalid = set(content_types) - set(CONTENT_TYPES)
+        if invalid:
+            raise ValueError(f"content_types must be among {', '.join(CONTENT_TYPES)}")
+        filters = cls(
+            source_documents=_string_list(data.get("source_documents"), "source_documents"),
+            content_types=content_types,
+            categories=_string_list(data.get("categories"), "categories"),
+            page_from=_page(data.get("page_from"), "page_from"),
+            page_to=_page(data.get("page_to"), "page_to"),
+        )
+        if filters.page_from and filters.page_to and filters.page_from > filters.page_to:
+            raise ValueError("page_from must not be greater than page_to")
+        return filters
+
+    def is_empty(self) -> bool:
+        return not (self.source_documents or self.content_types or self.categories
+                    or self.page_from is not None or self.page_to is not None)
+
+    # Stable and hashable, for coalescing and cache keys
+    def key(self):
+        return (self.source_documents, self.content_types, self.categories, self.page_from, self.page_to)
+
+    def matches(self, properties) -> bool:
+        if self.source_documents and properties.get("source_document") not in self.source_documents:
+            return False
+        if self.content_types and properties.get("content_type") not in self.content_types:
+            return False
+        if self.categories and properties.get("category") not in self.categories:
+            return False
+        if self.page_from is not None or self.page_to is not None:
+            page = properties.get("page_number")
+            if page is None:
+                return False
+            if self.page_from is not None and page < self.page_from:
+                return False
+            if self.page_to is not None and page > self.page_to:
+                return False
+        return True
+
+    # The equivalent Weaviate filter, or None when nothing is filtered
+    def to_weaviate(self):
+        from weaviate.classes.query import Filter
+
+        conditions = []
+        if self.source_documents:
+            conditions.append(Filter.by_property("source_document").contains_any(list(self.source_documents)))
+        if self.content_types:
+            conditions.append(Filter.by_property("content_type").contains_any(list(self.content_types)))
+        if self.categories:
+            conditions.append(Filter.by_property("category").contains_any(list(self.categories)))
+        if self.page_from is not None:
+            conditions.append(Filter.by_property("page_number").greater_or_equal(self.page_from))
+        if self.page_to is not None:
+            conditions.append(Filter.by_property("page_number").less_or_equal(self.page_to))
+        if not conditions:
+            return None
+        return Filter.all_of(conditions) if len(conditions) > 1 else conditions[0]
+
+    def __repr__(self):
+        return f"SearchFilters({', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDS if getattr(self, field))})"
+
+
+# Interface shared by every retrieval backend: hybrid search returning property dicts
+# (one per hit, with every key in SEARCH_PROPERTIES) ordered by fused score. Constructing a backend
+# is cheap; connections and indexes are opened by start() on the worker's event loop, and wait_ready()
+# waits until usable.
+class RetrievalBackend:
+    name = "base"
+
+    async def start(self):
+        pass
+
+    async def wait_ready(self, timeout: float = None) -> bool:
+        return True
+
+    async def search(self, query: str, query_vector, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None):
+        raise NotImplementedError
+
+    def status(self):
+        return {"status": "Connected", "color": "green"}
+
+    async def close(self):
+        pass
+
+
+class WeaviateBackend(RetrievalBackend):
+    name = "weaviate"
+
+    # One manager (and connection) can back several collections and tenants of the same cluster
+    def __init__(self, manager, collection_name: str = None, tenant: str = None, owns_manager: bool = True):
+        self.manager = manager
+        self.collection_name = collection_name
+        self.tenant = tenant
+        self.owns_manager = owns_manager
+
+    async def start(self):
+        self.manager.start()
+
+    async def wait_ready(self, timeout: float = None) -> bool:
+        return await self.manager.wait_until_connected(timeout)
+
+    async def search(self, query: str, query_vector, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None):
+        weaviate_filters = filters.to_weaviate() if filters is not None else None
+        return await self.manager.hybrid_search(query, query_vector, limit, alpha, SEARCH_PROPERTIES,
+                                                collection_name=self.collection_name, tenant=self.tenant,
+                                                filters=weaviate_filters)
+
+    def status(self):
+        return self.manager.status()
+
+    async def close(self):
+        if self.owns_manager:
+            await self.manager.stop()
+
+
+# Searches several collections (or tenants, or local indexes) concurrently and merges the hits by
+# fused score. Each route is named, and a request may restrict the search to some of them.
+# A failing route is logged and skipped as long as at least one route answered.
+class RoutedBackend(RetrievalBackend):
+    name = "routed"
+
+    def __init__(self, routes):
+        self.routes = dict(routes)
+
+    async def start(self):
+        await asyncio.gather(*(backend.start() for backend in self.routes.values()))
+
+    async def wait_ready(self, timeout: float = None) -> bool:
+        return all(await asyncio.gather(*(backend.wait_ready(timeout) for backend in self.routes.values())))
+
+    def select(self, names=None):
+        if not names:
+            return self.routes
+        unknown = set(names) - set(self.routes)
+        if unknown:
+            raise ValueError(f"Unknown collections: {', '.join(sorted(unknown))}")
+        return {name: self.routes[name] for name in names}
+
+    async def search(self, query: str, query_vector, limit: int = 30, alpha: float = 0.6, filters: SearchFilters = None,
+                     collections=None):
+        routes = self.select(collections)
+        responses = await asyncio.gather(
+            *(backend.search(query, query_vector, limit, alpha, filters) for backend in routes.values()),
+            return_exceptions=True)
+        ranked = []
+        for name, response in zip(routes, responses):
+            if isinstance(response, BaseException):
+                logger.error(f"Search in {name} failed: {str(response)}")
+                continue
+            for item in response:
+                item["collection"] = name
+            ranked.append(response)
+        if not ranked:
+            raise responses[0]
+        if len(ranked) == 1:
+            return ranked[0][:limit]
+        # Hybrid scores of different collections are not on the same scale (BM25 spread and
+        # normalization depend on each collection), so routes are merged by reciprocal rank fusion
+        merged = []
+        for response in ranked:
+            for rank, item in enumerate(response):
+                item["_score"] = 1.0 / (RRF_K + rank + 1)
+                merged.append(item)
+        merged.sort(key=lambda item: item["_score"], reverse=True)
+        return merged[:limit]
+
+    def status(self):
+        statuses = {name: backend.status() for name, backend in self.routes.items()}
+        if len(statuses) == 1:
+            return next(iter(statuses.values()))
+        down = [name for name, status in statuses.items() if status["color"] != "green"]
+        if not down:
+            return {"status": f"Connected ({len(statuses)} collections)", "color": "green"}
+        color = "red" if len(down) == len(statuses) else "orange"
+        details = ", ".join(f"{name}: {statuses[name]['status']}" for name in down)
+        return {"status": f"Degraded ({details})", "color": color}
+
+    async def close(self):
+        await asyncio.gather(*(backend.close() for backend in self.routes.values()))
+
+
+# "Collection" or "Collection/tenant" entries, comma-separated
+def parse_routes(spec: str):
+    routes = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if entry:
+            collection, _, tenant = entry.partition("/")
+            routes.append((entry, collection, tenant or None))
+    return routes
+
+
+# collection_name and local_index_dir may list several comma-separated collections (with an optional
+# "/tenant") or index directories; every backend is wrapped in a RoutedBackend named after its route
+def create_retrieval_backend(kind: str, collection_name: str = None, local_index_dir: str = None,
+                             weaviate_options=None, **local_options):
+    if kind == "local":
+        from local_index import LocalBackend
+        paths = [path.strip() for path in (local_index_dir or "").split(",") if path.strip()]
+        return RoutedBackend((os.path.basename(os.path.normpath(path)), LocalBackend.open(path, **local_options))
+                             for path in paths)
+    if kind != "weaviate":
+        logger.warning(f"Unknown retrieval backend {kind!r}, using Weaviate")
+    from weaviate_manager import WeaviateClientManager
+    routes = parse_routes(collection_name)
+    manager = WeaviateClientManager.from_env(routes[0][1] if routes else collection_name, **(weaviate_options or {}))
+    if not routes:
+        return RoutedBackend([(collection_name or "default", WeaviateBackend(manager))])
+    # The routes share the manager, so only the first one stops it
+    return RoutedBackend((name, WeaviateBackend(manager, collection, tenant, owns_manager=index == 0))
+                         for index, (name, collection, tenant) in enumerate(routes))
@@ -47,6 +47,32 @@ document.addEventListener('DOMContentLoaded', function() {
                 statusIndicator.title = data.status;
                 statusBulb.style.backgroundColor = data.status.includes("Connected") ? "green" : "red";
             });
+        updateIngestStatus();
+    }
+
+    // Progress of background ingestion jobs, shown next to the status bulb while any are queued or running
+    function updateIngestStatus() {
+        const ingestStatus = document.getElementById('ingest-status');
+        fetch('/ingest/status')
+            .then(response => response.json())
+            .then(data => {
+                const running = data.jobs.filter(job => job.status === 'running');
+                if (running.length) {
+                    const done = running.reduce((sum, job) => sum + job.documents_done, 0);
+                    const total = running.reduce((sum, job) => sum + job.documents_total, 0);
+                    const written = running.reduce((sum, job) => sum + job.elements_written, 0);
+                    const failed = running.reduce((sum, job) => sum + job.documents_failed, 0);
+                    ingestStatus.textContent = `Ingesting ${done}/${total} documents`;
+                    ingestStatus.title = `${written} elements written; ${failed} documents failed; ${data.counts.pending || 0} jobs queued`;
+                } else if (data.active) {
+                    ingestStatus.textContent = 'Ingestion queued';
+                    ingestStatus.title = `${data.active} jobs queued`;
+                } else {
+                    ingestStatus.textContent = '';
+                    ingestStatus.title = '';
+                }
+            })
+            .catch(() => { ingestStatus.textContent = ''; });
     }
 
     function sendMessage() {
@@ -57,21 +83,42 @@ document.addEventListener('DOMContentLoaded', function() {
             clearFollowUpQuestions();
             showSearchingIndicator();
 
-            fetch('/ask', {
+            let botElement = null;
+
+            fetch('/ask/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ question: question }),
             })
-            .then(response => response.json())
-            .then(data => {
-                removeSearchingIndicator();
-                addMessage('bot', data.response);
-                addSources(data.sources);
-                if (data.follow_up_questions) {
-                    setTimeout(() => {
-                        addFollowUpQuestions(data.follow_up_questions);
-                    }, 1000);
+            .then(response => {
+                if (response.status === 429) {
+                    removeSearchingIndicator();
+                    addMessage('bot', 'The service is busy right now. Please try again in a moment.');
+                    return;
+                }
+                if (!response.ok || !response.body) {
+                    throw new Error(`Request failed with status ${response.status}`);
                 }
+                return readEventStream(response.body, event => {
+                    if (event.type === 'token') {
+                        if (!botElement) {
+                            removeSearchingIndicator();
+                            botElement = addMessage('bot', '');
+                        }
+                        botElement.textContent += event.content;
+                        scrollToBottom();
+                    } else if (event.type === 'sources') {
+                        removeSearchingIndicator();
+                        if (botElement) {
+                            botElement.textContent = botElement.textContent.trim();
+                        }
+                        addSources(event.sources);
+                    } else if (event.type === 'follow_up_questions') {
+                        addFollowUpQuestions(event.follow_up_questions);
+                    } else if (event.type === 'error') {
+                        throw new Error(event.error);
+                    }
+                });
             })
             .catch(error => {
                 console.error('Error:', error);
@@ -81,12 +128,40 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Read a newline-delimited JSON stream, calling onEvent for every complete line
+    async function readEventStream(body, onEvent) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) !== -1) {
+                const line = buffer.slice(0, newlineIndex).trim();
+                buffer = buffer.slice(newlineIndex + 1);
+                if (line) {
+                    onEvent(JSON.parse(line));
+                }
+            }
+        }
+
+        buffer += decoder.decode();
+        if (buffer.trim()) {
+            onEvent(JSON.parse(buffer));
+        }
+    }
+
     function addMessage(sender, message) {
         const messageElement = document.createElement('div');
         messageElement.className = `${sender}-message message`;
         messageElement.textContent = message;
         chatContainer.appendChild(messageElement);
         scrollToBottom();
+        return messageElement;
     }
 
     function showSearchingIndicator() {
@@ -112,7 +187,7 @@ document.addEventListener('DOMContentLoaded', function() {
             sourcesElement.className = 'sources';
             sourcesElement.innerHTML = '<strong>Sources:</strong><br>';
             
-            const sourcesList = sources.split(/(?=\d+\.\s+(?:Text|Image Description) from)/).filter(Boolean);
+            const sourcesList = sources.split(/(?=\d+\.\s+(?:Text|Image Description|Table) from)/).filter(Boolean);
             console.log("Split sources:", sourcesList);  // Log the split sources
             
             sourcesList.forEach((source) => {
@@ -121,6 +196,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     const sourceLink = document.createElement('a');
                     sourceLink.href = '#';
                     sourceLink.textContent = `${sourceInfo.index}. ${sourceInfo.type} from ${sourceInfo.fileName} (Page ${sourceInfo.page})`;
+                    // Preview of the cited page; dropped when the server cannot render pages
+                    const thumbnail = document.createElement('img');
+                    thumbnail.className = 'source-thumbnail';
+                    thumbnail.loading = 'lazy';
+                    thumbnail.alt = '';
+                    thumbnail.src = `/thumbnails/${sourceInfo.page}/${encodeURIComponent(sourceInfo.fileName)}`;
+                    thumbnail.onerror = () => thumbnail.remove();
+                    sourceLink.prepend(thumbnail);
                     sourceLink.onclick = function(e) {
                         e.preventDefault();
                         openSource(sourceInfo);
@@ -164,7 +247,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function parseSourceInfo(source) {
         console.log("parseSourceInfo input:", source);
 
-        const regex = /(\d+)\.\s+(Text|Image Description) from ((?:\.\/)?(?:data\/)?.*\.pdf) \(Page (\d+)(?:,\s*(.+))?\)/;
+        const regex = /(\d+)\.\s+(Text|Image Description|Table) from ((?:\.\/)?(?:data\/)?.*\.pdf) \(Page (\d+)(?:,\s*(.+))?\)/;
         const match = source.match(regex);
 
         if (match) {
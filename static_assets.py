@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Only documents and images under the data directory are served; manifests, caches and indexes are not
+SERVED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".gif", ".webp"}
+
+# Same shape as the sources block the UI parses: "Text from ./data/x.pdf (Page 3, ...)"
+_CITATION_PATTERN = re.compile(r"from ((?:\./)?(?:data/)?[^\n]*?\.pdf) \(Page (\d+)")
+
+
+class PageRenderingUnavailable(RuntimeError):
+    pass
+
+
+def cited_pages(sources: str):
+    pages = []
+    for match in _CITATION_PATTERN.finditer(sources or ""):
+        relative = re.sub(r"^(\./)?(data/)?", "", match.group(1))
+        if (relative, int(match.group(2))) not in pages:
+            pages.append((relative, int(match.group(2))))
+    return pages
+
+
+# Files under ./data with safe path resolution, strong content-hash ETags and a disk cache of
+# rendered page thumbnails and single-page PDFs (rendering needs the optional PyMuPDF package)
+class DataAssets:
+    def __init__(self, root: str, page_cache_dir: str, max_etags: int = 4096):
+        self.root = os.path.realpath(root)
+        self.page_cache_dir = page_cache_dir
+        self.max_etags = max_etags
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+        self._warming = set()
+
+    def resolve(self, relative: str):
+        if not relative or "\x00" in relative or os.path.isabs(relative):
+            return None
+        parts = relative.replace("\\", "/").split("/")
+        if any(part in ("", ".", "..") or part.startswith(".") for part in parts):
+            return None
+        if os.path.splitext(relative)[1].lower() not in SERVED_EXTENSIONS:
+            return None
+        path = os.path.realpath(os.path.join(self.root, *parts))
+        # Also rejects symlinks that point outside the data directory
+        if os.path.commonpath([path, self.root]) != self.root or not os.path.isfile(path):
+            return None
+        return path
+
+    # sha256 of the content, remembered per (path, mtime, size) so each file is hashed once
+    def etag_for(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            etag = self._etags.get(key)
+            if etag is not None:
+                self._etags.move_to_end(key)
+                return etag
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        etag = digest.hexdigest()
+        with self._lock:
+            self._etags[key] = etag
+            while len(self._etags) > self.max_etags:
+                self._etags.popitem(last=False)
+        return etag
+
+    def _page_cache_path(self, pdf_path: str, page: int, suffix: str) -> str:
+        # Keyed by the PDF's content hash, so a replaced datasheet never serves stale pages
+        return os.path.join(self.page_cache_dir, f"{self.etag_for(pdf_path)}-{page}{suffix}")
+
+    def _open_pdf(self, pdf_path: str, page: int):
+        try:
+            import fitz
+        except ImportError:
+            raise PageRenderingUnavailable("PyMuPDF is not installed")
+        document = fitz.open(pdf_path)
+        if not 1 <= page <= document.page_count:
+            document.close()
+            raise IndexError(f"{pdf_path} has no page {page}")
+        return fitz, document
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(self.page_cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def page_thumbnail(self, pdf_path: str, page: int, width: int = 320) -> str:
+        path = self._page_cache_path(pdf_path, page, f"-w{width}.png")
+        if os.path.exists(path):
+            return path
+        fitz, document = self._open_pdf(pdf_path, page)
+        try:
+            pdf_page = document[page - 1]
+            zoom = width / pdf_page.rect.width
+            self._write_atomic(path, pdf_page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png"))
+        finally:
+            document.close()
+        return path
+
+    def page_slice(self, pdf_path: str, page: int) -> str:
+        path = self._page_cache_path(pdf_path, page, ".pdf")
+        if os.path.exists(path):
+            return path
+        fitz, document = self._open_pdf(pdf_path, page)
+        try:
+            single = fitz.open()
+            single.insert_pdf(document, from_page=page - 1, to_page=page - 1)
+            self._write_atomic(path, single.tobytes(garbage=3, deflate=True))
+            single.close()
+        finally:
+            document.close()
+        return path
+
+    # Renders thumbnails and slices for pages an answer cited, ahead of the user opening them
+    def warm(self, pages, width: int = 320):
+        for relative, page in pages:
+            pdf_path = self.resolve(relative)
+            if pdf_path is None or (pdf_path, page) in self._warming:
+                continue
+            self._warming.add((pdf_path, page))
+            try:
+                self.page_thumbnail(pdf_path, page, width)
+                self.page_slice(pdf_path, page)
+            except PageRenderingUnavailable:
+                return
+            except Exception as e:
+                logger.warning(f"Could not prerender page {page} of {relative}: {str(e)}")
+            finally:
+                self._warming.discard((pdf_path, page))
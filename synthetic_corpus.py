@@ -0,0 +1,196 @@
+import os
+import re
+import random
+import struct
+import zlib
+
+from chunking import chunk_elements
+
+# Synthetic PDFs for benchmarks: plain-text pages plus optional raster figures, written by a tiny
+# PDF writer with no dependencies so a corpus of any size can be generated offline
+
+VOCABULARY = (
+    "fpga soc microcontroller transceiver latency throughput bandwidth dsp slice lut register pipeline "
+    "clock domain pll serdes pcie ddr4 lpddr5 hbm cache coherent interconnect noc axi bus power rail "
+    "thermal envelope process node 7nm 5nm finfet yield wafer package interposer chiplet die memory "
+    "controller firmware bitstream configuration adaptive engine ai vector scalar processor core arm "
+    "cortex risc-v accelerator inference training tensor matrix multiply gigabit ethernet lane protocol "
+    "jitter voltage current leakage dynamic static timing closure routing placement synthesis "
+    "verification validation datasheet specification revision errata automotive industrial aerospace"
+).split()
+
+DOCUMENT_TOPICS = ("Versal Adaptive SoC", "Zynq UltraScale+ MPSoC", "Kintex FPGA Family", "Artix Transceivers",
+                   "Alveo Accelerator Card", "Spartan Cost-Optimized FPGA", "RFSoC Data Converter")
+
+
+def paragraph(rng, min_words=40, max_words=120):
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _escape_pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def png_bytes(pixels: bytes, width: int, height: int) -> bytes:
+    raw = b"".join(b"\x00" + pixels[y * width * 3:(y + 1) * width * 3] for y in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + _chunk(b"IDAT", zlib.compress(raw)) + _chunk(b"IEND", b""))
+
+
+def figure_pixels(rng, width: int, height: int) -> bytes:
+    # A few random bars on a gradient: compresses like a chart rather than like noise
+    bars = [(rng.randrange(width), rng.randrange(8, 40), rng.randrange(height // 4, height)) for _ in range(6)]
+    colors = [bytes(rng.randrange(256) for _ in range(3)) for _ in bars]
+    rows = []
+    for y in range(height):
+        row = bytearray()
+        for x in range(width):
+            pixel = bytes((255 - y * 64 // height, 255 - x * 64 // width, 240))
+            for (bar_x, bar_width, bar_height), color in zip(bars, colors):
+                if bar_x <= x < bar_x + bar_width and y >= height - bar_height:
+                    pixel = color
+            row += pixel
+        rows.append(bytes(row))
+    return b"".join(rows)
+
+
+class PDFWriter:
+    def __init__(self):
+        self.objects = []
+
+    def add(self, body: bytes) -> int:
+        self.objects.append(body)
+        return len(self.objects)
+
+    def stream(self, dictionary: str, data: bytes) -> int:
+        return self.add(f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode() + data + b"\nendstream")
+
+    def save(self, path: str, root: int):
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        xref = len(out)
+        out += f"xref\n0 {len(self.objects) + 1}\n0000000000 65535 f \n".encode()
+        out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+        out += f"trailer\n<< /Size {len(self.objects) + 1} /Root {root} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        with open(path, "wb") as file:
+            file.write(out)
+
+
+# pages: list of (paragraphs, figures) where figures are (width, height, rgb_bytes)
+def write_pdf(path: str, pages):
+    writer = PDFWriter()
+    font = writer.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # Page tree is object 2 once written; reserve it now and fill it in at the end
+    tree = writer.add(b"")
+    page_ids = []
+    for page_number, (paragraphs, figures) in enumerate(pages, start=1):
+        content = [f"% page {page_number}"]
+        y = 760
+        for paragraph_text in paragraphs:
+            content.append(f"BT /F1 10 Tf 12 TL 50 {y} Td")
+            for line in _wrap(paragraph_text):
+                content.append(f"({_escape_pdf_text(line)}) Tj T*")
+                y -= 12
+            content.append("ET")
+            y -= 10
+        images = {}
+        for index, (width, height, pixels) in enumerate(figures):
+            name = f"Im{page_number}_{index}"
+            images[name] = writer.stream(
+                f"/Type /XObject /Subtype /Image /Name /{name} /Width {width} /Height {height} "
+                f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode", zlib.compress(pixels))
+            content.append(f"q {width} 0 0 {height} 50 {max(40, y - height)} cm /{name} Do Q")
+            y -= height + 10
+        stream = writer.stream("", "\n".join(content).encode("latin-1"))
+        xobjects = " ".join(f"/{name} {number} 0 R" for name, number in images.items())
+        page_ids.append(writer.add(
+            f"<< /Type /Page /Parent {tree} 0 R /MediaBox [0 0 612 792] /Contents {stream} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> /XObject << {xobjects} >> >> >>".encode()))
+    writer.objects[tree - 1] = (f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] "
+                                f"/Count {len(page_ids)} >>").encode()
+    root = writer.add(f"<< /Type /Catalog /Pages {tree} 0 R >>".encode())
+    writer.save(path, root)
+
+
+def generate_corpus(directory: str, documents: int = 10, pages: int = 10, paragraphs_per_page: int = 4,
+                    figures_per_page: float = 0.5, figure_size=(160, 120), seed: int = 0):
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for doc_index in range(documents):
+        doc_pages = []
+        for _ in range(pages):
+            paragraphs = [paragraph(rng) for _ in range(paragraphs_per_page)]
+            count = int(figures_per_page) + (rng.random() < figures_per_page % 1)
+            figures = [(*figure_size, figure_pixels(rng, *figure_size)) for _ in range(count)]
+            doc_pages.append((paragraphs, figures))
+        topic = DOCUMENT_TOPICS[doc_index % len(DOCUMENT_TOPICS)]
+        path = os.path.join(directory, f"{doc_index:04d} - {topic} - Data Sheet.pdf")
+        write_pdf(path, doc_pages)
+        paths.append(path)
+    return paths
+
+
+# Stream dictionaries are written on a single line, so a header never spans objects
+_OBJECT_PATTERN = re.compile(rb"(\d+) 0 obj\n<< ([^\n]*) /Length (\d+) >>\nstream\n")
+_TEXT_PATTERN = re.compile(r"\(((?:\\.|[^\\)])*)\) Tj")
+
+
+def _unescape_pdf_text(text: str) -> str:
+    return re.sub(r"\\(.)", r"\1", text)
+
+
+# Stand-in for partition_document on PDFs written by write_pdf: same record format, no unstructured/OCR.
+# Runs in a worker process, so it must stay a picklable module-level function.
+def partition_synthetic(pdf_path, output_dir, max_chunk_tokens=400):
+    with open(pdf_path, "rb") as file:
+        data = file.read()
+    pdf_output_dir = os.path.join(output_dir, os.path.basename(pdf_path).replace('.pdf', ''))
+    os.makedirs(pdf_output_dir, exist_ok=True)
+
+    images = {}
+    pages = []
+    for match in _OBJECT_PATTERN.finditer(data):
+        dictionary = match.group(2).decode("latin-1")
+        body = data[match.end():match.end() + int(match.group(3))]
+        if "/Subtype /Image" in dictionary:
+            name = re.search(r"/Name /(\S+)", dictionary).group(1)
+            width = int(re.search(r"/Width (\d+)", dictionary).group(1))
+            height = int(re.search(r"/Height (\d+)", dictionary).group(1))
+            images[name] = (width, height, zlib.decompress(body))
+        elif body.startswith(b"% page "):
+            pages.append(body.decode("latin-1"))
+
+    elements = []
+    for page_number, content in enumerate(pages, start=1):
+        for block in re.findall(r"BT(.*?)ET", content, re.S):
+            text = " ".join(_unescape_pdf_text(line) for line in _TEXT_PATTERN.findall(block))
+            elements.append({"category": "NarrativeText", "text": text, "page_number": page_number})
+        for name in re.findall(r"/(\S+) Do", content):
+            width, height, pixels = images[name]
+            image_path = os.path.join(pdf_output_dir, f"figure-{page_number}-{name}.png")
+            with open(image_path, "wb") as file:
+                file.write(png_bytes(pixels, width, height))
+            elements.append({"category": "Image", "text": "", "page_number": page_number, "image_path": image_path})
+    return chunk_elements(elements, max_chunk_tokens)
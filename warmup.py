@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def load_warmup_queries(path: str, limit: int = 100):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        queries = [line.strip() for line in file if line.strip() and not line.startswith("#")]
+    return queries[:limit]
+
+
+# Fills the query embedding cache with frequent questions, from its disk store when they are already
+# there; returns how many were primed
+async def prime_embeddings(get_embedding, queries, concurrency: int = 4):
+    semaphore = asyncio.Semaphore(concurrency)
+    primed = 0
+
+    async def prime(query):
+        nonlocal primed
+        async with semaphore:
+            try:
+                await get_embedding(query)
+                primed += 1
+            except Exception as e:
+                logger.warning(f"Could not prime embedding for {query!r}: {str(e)}")
+
+    await asyncio.gather(*(prime(query) for query in queries))
+    return primed
+
+
+# Start-up timeline of one worker: module import, then warm-up until it reports ready.
+# Exposed on /ready and /metrics so slow-starting workers show up when autoscaling.
+class StartupState:
+    def __init__(self, import_started: float, target_seconds: float):
+        self.import_started = import_started
+        self.target_seconds = target_seconds
+        self.import_seconds = None
+        self.ready_seconds = None
+        self.primed_queries = 0
+        self.ready = False
+
+    def imported(self):
+        self.import_seconds = time.perf_counter() - self.import_started
+
+    def mark_ready(self, primed_queries: int = 0):
+        self.ready_seconds = time.perf_counter() - self.import_started
+        self.primed_queries = primed_queries
+        self.ready = True
+        message = (f"Worker ready in {self.ready_seconds:.2f}s (import {self.import_seconds or 0:.2f}s, "
+                   f"{primed_queries} embeddings primed)")
+        if self.target_seconds and self.ready_seconds > self.target_seconds:
+            logger.warning(f"{message}, above the {self.target_seconds:.1f}s start-up target")
+        else:
+            logger.info(message)
+
+    def stats(self):
+        return {
+            "ready": int(self.ready),
+            "import_seconds": round(self.import_seconds, 3) if self.import_seconds is not None else None,
+            "ready_seconds": round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+            "target_seconds": self.target_seconds,
+            "primed_queries": self.primed_queries,
+        }
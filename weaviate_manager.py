@@ -0,0 +1,279 @@
+import asyncio
+import importlib
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+# Fails fast after repeated errors instead of letting every request wait on a dead cluster;
+# after reset_timeout one trial request is let through (half-open) to probe recovery
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    # A trial that ended without an outcome (cancelled) frees the slot, so the next request can probe
+    def release_trial(self):
+        self._trial_in_flight = False
+
+
+# gRPC status codes that mean the cluster or the path to it is failing, rather than the request being wrong
+FAILURE_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "UNKNOWN", "RESOURCE_EXHAUSTED", "ABORTED"}
+
+
+# Whether an error should count toward opening the circuit: transport errors, timeouts and 5xx responses.
+# Errors the cluster answered with (a bad filter, a missing property or tenant) say nothing about its health.
+def is_cluster_failure(error) -> bool:
+    import httpx
+    from weaviate.exceptions import (UnexpectedStatusCodeError, WeaviateClosedClientError, WeaviateConnectionError,
+                                     WeaviateGRPCUnavailableError, WeaviateRetryError, WeaviateTimeoutError)
+
+    # The client re-raises gRPC and retry errors as WeaviateQueryError, so the original is found on the chain
+    while error is not None:
+        if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError, WeaviateClosedClientError,
+                              WeaviateConnectionError, WeaviateGRPCUnavailableError, WeaviateRetryError,
+                              WeaviateTimeoutError)):
+            return True
+        if isinstance(error, UnexpectedStatusCodeError):
+            return (getattr(error, "status_code", None) or 0) >= 500
+        code = getattr(error, "code", None)
+        if callable(code):
+            try:
+                return code().name in FAILURE_GRPC_CODES
+            except Exception:
+                pass
+        error = error.__cause__ or error.__context__
+    return False
+
+
+# Owns one long-lived WeaviateAsyncClient (pooled HTTP connections plus a multiplexed gRPC channel)
+# on the event loop of the worker that starts it, so a query is a plain await on the request's own loop.
+# A background task connects on start, health-checks periodically and reconnects with backoff.
+class WeaviateClientManager:
+    def __init__(self, cluster_url: str, api_key: str, headers=None, collection_name: str = None,
+                 health_interval: float = 15, query_timeout: float = 10, pool_connections: int = 20,
+                 pool_maxsize: int = 100, failure_threshold: int = 5, reset_timeout: float = 30,
+                 max_backoff: float = 60):
+        self.cluster_url = cluster_url
+        self.api_key = api_key
+        self.headers = headers or {}
+        self.collection_name = collection_name
+        self.health_interval = health_interval
+        self.query_timeout = query_timeout
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_backoff = max_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.client = None
+        self.connection_status = {"status": "Disconnected", "color": "red"}
+        self._connected = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._supervisor = None
+
+    @classmethod
+    def from_env(cls, collection_name: str, **options):
+        return cls(
+            os.getenv('WCS_URL'),
+            os.getenv('WCS_API_KEY'),
+            headers={"X-OpenAI-Api-Key": os.getenv('OPENAI_API_KEY')},
+            collection_name=collection_name,
+            **options
+        )
+
+    # Must be called from the event loop that will run the queries
+    def start(self):
+        if self._supervisor is not None and not self._supervisor.done():
+            return
+        self._supervisor = asyncio.get_running_loop().create_task(self._supervise())
+
+    async def stop(self):
+        if self._supervisor is None:
+            return
+        self._supervisor.cancel()
+        await asyncio.gather(self._supervisor, return_exceptions=True)
+        self._supervisor = None
+        await self._close_client()
+
+    # Waits until the first connection is up (for warm-up before a worker reports ready)
+    async def wait_until_connected(self, timeout: float = None) -> bool:
+        self.start()
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except TimeoutError:
+            return False
+
+    def status(self):
+        if self.breaker.state == "open" and self.connection_status["color"] == "green":
+            return {"status": "Degraded (circuit open)", "color": "orange"}
+        return dict(self.connection_status)
+
+    async def _connect(self):
+        # The client library is imported in a thread, on first connect, so it never delays app startup
+        # or blocks the loop serving requests
+        weaviate = await asyncio.to_thread(importlib.import_module, "weaviate")
+        from weaviate.classes.init import AdditionalConfig, Timeout
+        from weaviate.config import ConnectionConfig
+
+        self.connection_status = {"status": "Connecting...", "color": "orange"}
+        client = weaviate.use_async_with_weaviate_cloud(
+            cluster_url=self.cluster_url,
+            auth_credentials=weaviate.auth.AuthApiKey(self.api_key),
+            headers=self.headers,
+            additional_config=AdditionalConfig(
+                connection=ConnectionConfig(
+                    session_pool_connections=self.pool_connections,
+                    session_pool_maxsize=self.pool_maxsize
+                ),
+                timeout=Timeout(init=self.query_timeout, query=self.query_timeout, insert=self.query_timeout * 6)
+            )
+        )
+        await client.connect()
+        if not await client.is_ready():
+            await client.close()
+            raise ConnectionError("Weaviate cluster is not ready")
+        self.client = client
+        self._connected.set()
+        self.breaker.record_success()
+        self.connection_status = {"status": "Connected", "color": "green"}
+        logger.info("Successfully connected to Weaviate")
+
+    async def _close_client(self):
+        client, self.client = self.client, None
+        self._connected.clear()
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing Weaviate client: {str(e)}")
+
+    async def _healthy(self) -> bool:
+        try:
+            return await asyncio.wait_for(self.client.is_ready(), self.query_timeout)
+        except Exception as e:
+            logger.warning(f"Weaviate health check failed: {str(e)}")
+            return False
+
+    async def _supervise(self):
+        attempt = 0
+        while True:
+            if self.client is None:
+                try:
+                    logger.info(f"Attempting to connect to Weaviate (attempt {attempt + 1})")
+                    await self._connect()
+                    attempt = 0
+                except Exception as e:
+                    attempt += 1
+                    delay = min(self.max_backoff, 2 ** attempt) * random.uniform(0.5, 1.0)
+                    logger.error(f"Error connecting to Weaviate: {str(e)}; retrying in {delay:.1f}s")
+                    self.connection_status = {"status": f"Error: {str(e)}", "color": "red"}
+                    await asyncio.sleep(delay)
+                    continue
+            elif not await self._healthy():
+                self.breaker.record_failure()
+                self.connection_status = {"status": "Reconnecting...", "color": "orange"}
+                await self._close_client()
+                continue
+            else:
+                # A passing health check closes a half-open circuit; while open, the reset timeout is kept
+                if self.breaker.state == "half_open":
+                    logger.info("Weaviate health check passed, closing the circuit")
+                    self.breaker.record_success()
+                self.connection_status = {"status": "Connected", "color": "green"}
+
+            self._wake.clear()
+            try:
+                # Sleep until the next health check, or earlier if a query reported a failure
+                await asyncio.wait_for(self._wake.wait(), self.health_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _hybrid(self, query, query_vector, limit, alpha, properties, collection_name=None, tenant=None,
+                      filters=None):
+        from weaviate.classes.query import MetadataQuery
+
+        if self.client is None:
+            raise ConnectionError("Weaviate client is not connected")
+        collection = self.client.collections.get(collection_name or self.collection_name)
+        if tenant:
+            collection = collection.with_tenant(tenant)
+        response = await collection.query.hybrid(
+            query=query,
+            vector=query_vector,
+            alpha=alpha,
+            limit=limit,
+            filters=filters,
+            return_properties=properties,
+            return_metadata=MetadataQuery(score=True)
+        )
+        results = []
+        for obj in response.objects:
+            item = {key: obj.properties.get(key) for key in properties}
+            item["_score"] = obj.metadata.score
+            results.append(item)
+        return results
+
+    # collection_name and tenant default to the manager's collection; filters is a Weaviate filter (prefilter)
+    async def hybrid_search(self, query, query_vector, limit, alpha, properties, collection_name=None, tenant=None,
+                            filters=None):
+        self.start()
+        if not self.breaker.allow():
+            raise CircuitOpenError("Weaviate circuit is open; failing fast until it recovers")
+        try:
+            result = await asyncio.wait_for(
+                self._hybrid(query, query_vector, limit, alpha, properties, collection_name, tenant, filters),
+                self.query_timeout)
+        except Exception as e:
+            if is_cluster_failure(e):
+                self.breaker.record_failure()
+                # Have the supervisor health-check now rather than at the next interval
+                self._wake.set()
+            else:
+                # The cluster answered, so a rejected request (e.g. an invalid filter) counts as a success
+                self.breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled (client gone, request timeout): no verdict on the cluster, but a half-open
+            # trial must not keep the circuit shut for good
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        return result